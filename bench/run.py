@@ -0,0 +1,261 @@
+"""
+End-to-end benchmark suite, run from the repository root:
+
+    python -m bench.run --sizes 1000 10000 100000 1000000
+    python -m bench.run --sizes 1000 10000 --compare bench/results/<previous>.json
+
+Synthetic archives are generated once per size in a temporary directory. Parsing, filtering and chunking of every size
+run in a fresh process so that its peak RSS is measured on its own. The /get-coords flow runs as a job on the offline
+mock provider, once per worker count, to measure throughput and concurrency scaling. Results are written to
+bench/results/ as JSON and can be compared with an earlier run.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from .synthetic import write_archive
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+FILTER_QUERIES = 200
+PERIOD_DAYS = 100
+# Changes smaller than this fraction are reported as noise when comparing runs.
+REGRESSION_THRESHOLD = 0.10
+
+
+def _peak_rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _measure_archive(path: str) -> Dict:
+    """
+    Parses, filters and chunks one archive. Runs in its own process.
+    """
+    from src.data import ArchiveParser, ARCHIVE_BLOCK_SIZE, get_tweets_by_date, divide_tweets_by_period_text
+    from src.metric import Model
+    from src.preprocess import TextPreprocessor, TextRules
+    from src.store import TweetStoreBuilder
+
+    baseline_rss = _peak_rss_bytes()
+    started = time.perf_counter()
+    parser = ArchiveParser()
+    builder = TweetStoreBuilder()
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(ARCHIVE_BLOCK_SIZE)
+            if not block:
+                break
+            builder.extend(parser.feed(block))
+    builder.extend(parser.close())
+    tweets = builder.build()
+    parse_seconds = time.perf_counter() - started
+    parse_rss = _peak_rss_bytes()
+
+    rng = random.Random(0)
+    first, last = tweets.timestamps[0], tweets.timestamps[-1]
+    windows = []
+    for _ in range(FILTER_QUERIES):
+        a, b = sorted(rng.randrange(first, last + 1) for _ in range(2))
+        windows.append((datetime.fromtimestamp(a, tz=timezone.utc).isoformat(), datetime.fromtimestamp(b, tz=timezone.utc).isoformat()))
+    started = time.perf_counter()
+    selected = 0
+    for start, end in windows:
+        selected += len(get_tweets_by_date(tweets, start, end))
+    filter_seconds = (time.perf_counter() - started) / FILTER_QUERIES
+
+    model = Model(llama_workers=1)
+    model.provider = "mock"
+    model.load_model()
+    started = time.perf_counter()
+    texts = divide_tweets_by_period_text(tweets, PERIOD_DAYS)
+    system, prompt = model._rating_messages("benchmark", *(["aspect"] * 6))
+    budget = model.chunk_budget(system, prompt)
+    chunks = [model.chunk_text(text, budget) for text in texts]
+    chunk_seconds = time.perf_counter() - started
+
+    # Same flow with the default text rules of the API.
+    started = time.perf_counter()
+    preprocessor = TextPreprocessor(TextRules(), lambda text: model.count_tokens(text, cache=False))
+    preprocessed = divide_tweets_by_period_text(tweets, PERIOD_DAYS, preprocessor=preprocessor)
+    preprocessed_chunks = sum(len(model.chunk_text(text, budget)) for text in preprocessed)
+    preprocess_seconds = time.perf_counter() - started
+    model.unload_model()
+
+    return {
+        "tweets": len(tweets),
+        "parse_seconds": parse_seconds,
+        "parse_tweets_per_second": len(tweets) / parse_seconds,
+        "parse_megabytes_per_second": os.path.getsize(path) / parse_seconds / 1e6,
+        "store_bytes": tweets.nbytes,
+        "peak_rss_bytes": parse_rss,
+        "parse_rss_increase_bytes": parse_rss - baseline_rss,
+        "filter_seconds": filter_seconds,
+        "filter_mean_selected": selected / FILTER_QUERIES,
+        "periods": len(texts),
+        "chunks": sum(len(text_chunks) for text_chunks in chunks),
+        "chunk_budget_tokens": budget,
+        "chunk_seconds": chunk_seconds,
+        "preprocess_seconds": preprocess_seconds,
+        "preprocessed_chunks": preprocessed_chunks,
+        "preprocess_tokens_saved": preprocessor.tokens_in - preprocessor.tokens_out,
+    }
+
+
+async def _run_job(path: str, workers: int, latency: float) -> Dict:
+    from src.app import CoordinateRequest, _compute_coordinates
+    from src.data import load_archive
+    from src.jobs import Job, JobManager
+    from src.metric import Model
+
+    tweets = load_archive(path)
+    model = Model(llama_workers=workers)
+    model.provider = "mock"
+    model.load_model()
+    for instance in list(model._llama_pool.queue):
+        instance.latency = latency
+
+    manager = JobManager()
+    request = CoordinateRequest(word="benchmark", provider="mock")
+    started = time.perf_counter()
+    job = manager.submit(Job(request.word, model.combine_ratings), lambda job: _compute_coordinates(model, tweets, request, job))
+    await job.task
+    seconds = time.perf_counter() - started
+    calls = sum(instance.calls for instance in list(model._llama_pool.queue))
+    model.unload_model()
+    if job.error:
+        raise RuntimeError(job.error)
+    return {
+        "workers": workers,
+        "seconds": seconds,
+        "chunks": job.total,
+        "model_calls": calls,
+        "chunks_per_second": job.total / seconds,
+    }
+
+
+def _measure_job(path: str, workers: int, latency: float) -> Dict:
+    return asyncio.run(_run_job(path, workers, latency))
+
+
+def _in_subprocess(function, *args) -> Dict:
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(1) as pool:
+        return pool.apply(function, args)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes: List[int], workers: List[int], latency: float, job_max_size: int, seed: int) -> Dict:
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "mock_latency": latency,
+        "archives": {},
+        "jobs": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        # Keep the benchmark away from the user's caches, and measure rating rather than cache hits.
+        os.environ["XCOMPASS_CACHE_DIR"] = directory
+        os.environ["RATING_CACHE"] = "0"
+        for size in sizes:
+            path = os.path.join(directory, f"tweets-{size}.js")
+            started = time.perf_counter()
+            file_bytes = write_archive(path, size, seed)
+            print(f"[{size}] generated {file_bytes / 1e6:.1f} MB in {time.perf_counter() - started:.1f}s", flush=True)
+
+            archive = _in_subprocess(_measure_archive, path)
+            archive["file_bytes"] = file_bytes
+            results["archives"][str(size)] = archive
+            print(f"[{size}] parse {archive['parse_seconds']:.2f}s, peak RSS {archive['peak_rss_bytes'] / 1e6:.0f} MB, "
+                  f"filter {archive['filter_seconds'] * 1e6:.0f}us, {archive['chunks']} chunks "
+                  f"({archive['preprocessed_chunks']} after text rules)", flush=True)
+
+            if size > job_max_size:
+                continue
+            results["jobs"][str(size)] = {}
+            for count in workers:
+                job = _in_subprocess(_measure_job, path, count, latency)
+                results["jobs"][str(size)][str(count)] = job
+                print(f"[{size}] job with {count} workers: {job['seconds']:.2f}s, {job['chunks_per_second']:.1f} chunks/s", flush=True)
+    return results
+
+
+def _flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(current: Dict, previous: Dict) -> List[str]:
+    """
+    Lists the metrics that changed by more than `REGRESSION_THRESHOLD` between two runs.
+    Rates ("..._per_second") are better when higher, every other timing or size is better when lower.
+    """
+    lines = []
+    before = _flatten({"archives": previous.get("archives", {}), "jobs": previous.get("jobs", {})})
+    after = _flatten({"archives": current.get("archives", {}), "jobs": current.get("jobs", {})})
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        if not old or abs(new - old) / abs(old) <= REGRESSION_THRESHOLD:
+            continue
+        higher_is_better = name.endswith("_per_second")
+        improved = (new > old) == higher_is_better
+        if name.endswith(("seconds", "bytes", "_per_second")):
+            verdict = "improved" if improved else "REGRESSED"
+        else:
+            verdict = "changed"
+        lines.append(f"{verdict:>9}  {name}: {old:.4g} -> {new:.4g} ({(new - old) / old:+.0%})")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark parsing, filtering, chunking and rating on synthetic archives.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000], help="Archive sizes, in tweets")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="Mock worker counts for the job benchmark")
+    parser.add_argument("--latency", type=float, default=0.02, help="Latency of every mock completion, in seconds")
+    parser.add_argument("--job-max-size", type=int, default=100000, help="Largest archive run through the job benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic archives")
+    parser.add_argument("--output", help="Results file, bench/results/<timestamp>.json by default")
+    parser.add_argument("--compare", help="Earlier results file to compare with")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.workers, args.latency, args.job_max_size, args.seed)
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ") + ".json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            lines = compare(results, json.load(f))
+        print("\n".join(lines) if lines else "No change above the threshold.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterator, Optional
+
+from src.store import CREATED_AT_FORMAT
+
+EXPORT_PREFIX = "window.YTD.tweet.part0 = "
+# Vocabulary of the generated tweets, with a few long-tail words so token counts vary like real text.
+VOCABULARY = (
+    "the a to and of in is it you that for on this with be are just so my me at was not have what like "
+    "lol ngl fr based cracked cooked ratio touch grass vibes bro deadass lowkey highkey mid goated "
+    "game stream shipping release benchmark latency throughput tokenizer gradient inference quantized "
+    "coffee morning weekend meeting deadline timeline thread reply quote retweet follow unfollow "
+    "🔥 😂 💀 🙏 ✨"
+).split()
+
+
+def generate_tweets(count: int, seed: int = 0, start: Optional[datetime] = None, span_days: int = 3650) -> Iterator[Dict]:
+    """
+    Yields `count` archive entries in the Twitter export layout, spread uniformly over `span_days` days and out of order,
+    like a real export. The same seed always yields the same archive.
+    """
+    rng = random.Random(seed)
+    start = start or datetime(2014, 1, 1, tzinfo=timezone.utc)
+    span_seconds = span_days * 86400
+    for i in range(count):
+        created_at = start + timedelta(seconds=rng.randrange(span_seconds))
+        words = rng.choices(VOCABULARY, k=rng.randint(3, 45))
+        if rng.random() < 0.2:
+            words.append(f"https://t.co/{rng.getrandbits(40):x}")
+        yield {"tweet": {
+            "id": str(10 ** 17 + i),
+            "full_text": " ".join(words),
+            "created_at": created_at.strftime(CREATED_AT_FORMAT),
+        }}
+
+
+def write_archive(path: str, count: int, seed: int = 0, export: bool = True) -> int:
+    """
+    Writes a synthetic archive to `path`, as a tweets.js export (with its assignment prefix) or as a bare JSON array.
+    Entries are streamed to disk, so archives of millions of tweets can be generated with little memory.
+    ----------
+    Returns:
+        int: The size of the file, in bytes
+    """
+    with open(path, "w", encoding="utf-8") as f:
+        if export:
+            f.write(EXPORT_PREFIX)
+        f.write("[")
+        for i, entry in enumerate(generate_tweets(count, seed)):
+            if i:
+                f.write(",\n")
+            f.write(json.dumps(entry, ensure_ascii=False))
+        f.write("]")
+        return f.tell()
@@ -1,23 +1,70 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, model_validator
 from dotenv import load_dotenv, set_key
+import asyncio
 import json
-from typing import Optional, List
+import logging
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, List, Tuple, Union
 import os
 
-app = FastAPI()
-from .metric import Model
-from .data import extract_info, get_tweets_by_date, divide_tweets_by_period_text
+from .metric import Model, Word, RatingProgress
+from .data import ARCHIVE_EXTENSIONS, find_archives, parse_archive, get_tweets_by_date, parse_date_range, period_sections
+from .store import TweetStore
+from .jobs import Job, JobManager, format_sse
+from .registry import ModelRegistry
+from .sessions import Session, SessionStore, DEFAULT_SESSION
+from .instrumentation import SNAPSHOT_HITS, TWEETS_PARSED, render_metrics, stage
+from .preprocess import TextPreprocessor, TextRules
+from .relevance import FACTOR_KEYS, RelevanceFilter, RelevanceSelector
+from .trajectory import Trajectory, TrajectoryRecorder
+from .snapshot import SnapshotStore, content_digest, load_archive_file
 
 
 # Request classes
-class CoordinateRequest(BaseModel):
-    word: str
-    provider: str
+class DateRangeRequest(BaseModel):
     start_date: Optional[str] = None
     end_date: Optional[str] = None
+    timezone: Optional[str] = None
+
+    @model_validator(mode="after")
+    def _check_date_range(self) -> "DateRangeRequest":
+        # A bad date or time zone is a client error (422), not a failure of the rating.
+        parse_date_range(self.start_date, self.end_date, self.timezone)
+        return self
+
+class CoordinateRequest(DateRangeRequest):
+    word: str
+    provider: str
+    # Approximate mode: rate a stratified sample of chunks until the confidence interval is narrow enough.
+    sample: bool = False
+    tolerance: float = 0.5
+    max_chunks: Optional[int] = None
+    max_tokens: Optional[int] = None
+    max_seconds: Optional[float] = None
+    seed: Optional[int] = None
+    # Normalization and deduplication of the tweets before rating. Off unless asked for, `{}` applies the recommended rules.
+    text_rules: TextRules = TextRules.off()
+    # Only rate the tweets of every period most relevant to the word and its factors.
+    relevance: Optional[RelevanceFilter] = None
+
+class BatchCoordinateRequest(DateRangeRequest):
+    words: List[str]
+    provider: str
+    text_rules: TextRules = TextRules.off()
+    relevance: Optional[RelevanceFilter] = None
+
+class CompareRequest(DateRangeRequest):
+    word: str
+    provider: str
+    labels: Optional[List[str]] = None
+    text_rules: TextRules = TextRules.off()
+    relevance: Optional[RelevanceFilter] = None
+
+class ArchiveDirectoryRequest(BaseModel):
+    path: str
 
 class ModelRequest(BaseModel):
     provider: str
@@ -26,59 +73,159 @@ class EnvUpdate(BaseModel):
     api_key: str
     provider: str
 
+class AxisPinRequest(BaseModel):
+    word: str
+    attributes: Optional[Word] = None
+    provider: Optional[str] = None
+
 
 # Global variables start
 
-llm = Model()
-tweets:List
-tweets = []
+registry = ModelRegistry()
+# Parsed archives are kept on disk by content hash, set SNAPSHOTS=0 to always parse uploads.
+snapshots = SnapshotStore() if os.getenv("SNAPSHOTS", "1") != "0" else None
+sessions = SessionStore(on_evict=lambda session: _evict_session(session), on_create=lambda session: _restore_session(session))
+jobs = JobManager()
+logger = logging.getLogger(__name__)
 
 # Global variables end
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Optionally loads a model before the first request (PRELOAD_PROVIDER, with LLAMA_MODEL_PATH pointing to a local
+    GGUF file for llama_cpp) and periodically unloads the models that have been idle for too long.
+    """
+    load_dotenv()
+    provider = os.getenv("PRELOAD_PROVIDER")
+    if provider:
+        await registry.preload(provider)
+    reaper = asyncio.create_task(registry.unload_idle_forever())
+    try:
+        yield
+    finally:
+        reaper.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+async def get_session(x_session_id: Optional[str] = Header(None), session_id: Optional[str] = None) -> Session:
+    """
+    Resolves the session of a request from the X-Session-Id header or the session_id query parameter.
+    Clients that send neither share the default session.
+    Async, so that creating, restoring and evicting sessions (and releasing their models) happens on the event loop,
+    never in the threadpool at the same time as the handlers using the sessions and the registry.
+    """
+    return sessions.get(x_session_id or session_id or DEFAULT_SESSION)
+
+def _restore_session(session: Session):
+    """
+    Maps back the archives last uploaded by a session before the server restarted.
+    """
+    if snapshots is None:
+        return
+    for label, digest in snapshots.bindings(session.id).items():
+        with stage("snapshot_load"):
+            tweets = snapshots.load(digest)
+        if tweets is None:
+            continue
+        try:
+            if label:
+                sessions.set_archive(session, label, tweets)
+            else:
+                sessions.set_tweets(session, tweets)
+        except MemoryError:
+            continue
+
+def _evict_session(session: Session):
+    """
+    Releases the model of a dropped session and forgets its archives, so sessions that never come back
+    do not stay in the snapshot bindings.
+    """
+    registry.release(session.provider)
+    if snapshots is not None:
+        snapshots.unbind(session.id)
+        SNAPSHOT_HITS.inc()
+
+def _snapshot(digest: Optional[str], tweets: TweetStore) -> TweetStore:
+    # Writing the snapshot and mapping it back frees the parsed copy of the archive.
+    if snapshots is None or digest is None:
+        return tweets
+    with stage("snapshot_save"):
+        return snapshots.save(digest, tweets)
+
+
 
 # The following functions are the endpoints for the API
 
 @app.post("/upload-tweets")
-async def upload_file(file: UploadFile = File(...)):
+async def upload_file(file: UploadFile = File(...), label: Optional[str] = Form(None), session: Session = Depends(get_session)):
     """
     Uploads a JSON file containing tweets and extracts the tweet content.
+    The file is parsed incrementally, block by block, into a TweetStore sorted by creation time.
+    Both JSON arrays and the raw tweets.js export (with its `window.YTD.tweet.part0 =` prefix) are accepted.
+    Parsed archives are snapshotted by content hash, so uploading the same file again maps its snapshot without parsing it.
+    The archive replaces the one of the calling session only. With a label, it is added to the archives compared by /compare instead.
     ----------
     Args:
         file: UploadFile - is a file object that contains the JSON file.
+        label: str - optional label of the archive in comparison mode.
+        session: Session - the session of the caller.
     Returns:
         JSONResponse - returns a JSON response with a message. The message is either a success message or an error message.
     """
 
-    global tweets
-    tweet_content = {}
-    if file.filename.endswith('.json'):
-        file_content = await file.read()
+    if file.filename.endswith(ARCHIVE_EXTENSIONS):
+        tweets, digest = None, None
+        if snapshots is not None:
+            # The upload is spooled by the server, so hashing it first costs one extra sequential read.
+            digest = await asyncio.to_thread(content_digest, file.file)
+            await file.seek(0)
+            with stage("snapshot_load"):
+                tweets = await asyncio.to_thread(snapshots.load, digest)
+            if tweets is not None:
+                SNAPSHOT_HITS.inc()
+        if tweets is None:
+            try:
+                # Parsing and sorting a large archive is CPU work, keep it off the event loop.
+                with stage("upload_parse"):
+                    tweets = await asyncio.to_thread(parse_archive, file.file)
+            except (ValueError, KeyError, AttributeError):
+                # json.JSONDecodeError is a ValueError
+                return JSONResponse(status_code=400, content={"message": "Invalid JSON File", "status": "error"})
+            TWEETS_PARSED.inc(len(tweets))
+            tweets = await asyncio.to_thread(_snapshot, digest, tweets)
         try:
-            file_content_json = json.loads(file_content)
-            tweet_content = file_content_json
-            tweets = extract_info(tweet_content)
-            return {"message": "JSON file uploaded successfully", "status": "success"}
-        except json.JSONDecodeError:
-            return JSONResponse(status_code=400, content={"message": "Invalid JSON File", "status": "error"})
+            if label:
+                sessions.set_archive(session, label, tweets)
+            else:
+                sessions.set_tweets(session, tweets)
+        except MemoryError as e:
+            return JSONResponse(status_code=413, content={"message": str(e), "status": "error"})
+        if digest is not None:
+            snapshots.bind(session.id, label, digest)
+        return {"message": "JSON file uploaded successfully", "status": "success", "session_id": session.id}
     else:
         return JSONResponse(status_code=400, content={"message": "Please upload a JSON File!", "status": "error"})
 
 @app.post("/load-model")
-async def load_model(request: ModelRequest):
+async def load_model(request: ModelRequest, session: Session = Depends(get_session)):
     """
     This function loads the model for the given provider in the request.
-    It uses the load_model function from the Model class to load the model.
+    The model comes from the shared registry, so sessions using the same provider share one loaded instance.
     ----------
     Args:
         request: ModelRequest - is a pydantic model that contains the provider name.
+        session: Session - the session of the caller.
     Returns:
         JSONResponse - returns a JSON response with a message. The message is either a success message or an error message.
     """
-    global llm
     try:
-        llm.provider = request.provider
-        llm.load_model()
+        await registry.acquire(request.provider)
+        registry.release(session.provider)
+        session.provider = request.provider
         return {"message": f"Model loaded successfully for provider: {request.provider}"}
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
@@ -86,79 +233,558 @@ async def load_model(request: ModelRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/model-status")
-async def get_model_status():
+async def get_model_status(session: Session = Depends(get_session)):
     """
     UNUSED. This function is not used in the current version of the application.
-    This function returns the status of the model.
+    This function returns the status of the model of the session, along with the shared model and session usage
+    and, for Groq, the utilisation of the requests and tokens per minute budgets.
     ----------
     Returns:
         dict - returns a dictionary with the provider name and whether the model is loaded or not.
     """
+    llm = registry.get(session.provider)
     return {
         "provider": llm.provider if llm else None,
-        "model_loaded": llm.model is not None if llm else False
+        "model_loaded": llm.model is not None if llm else False,
+        "rate_limit": llm.rate_limiter.status() if llm and llm.rate_limiter else None,
+        "models": registry.status(),
+        "sessions": len(sessions),
+        "session_bytes": sessions.nbytes,
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    This function returns the stage timings, LLM call latencies and token counts in the Prometheus text format.
+    ----------
+    Returns:
+        PlainTextResponse - returns the metrics of the server since it started.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+def _check_ready(session: Session, request: Union[CoordinateRequest, BatchCoordinateRequest]) -> Optional[JSONResponse]:
+    """
+    Returns an error response if coordinates cannot be computed yet for the session, None otherwise.
+    """
+    llm = registry.get(session.provider)
+    if not llm or not llm.model:
+        logger.warning("Model not loaded for provider %s", session.provider)
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Model not loaded. Please load the model first.", "status": "error"}
+        )
+
+    if not session.tweets:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "No tweets found. Please upload tweets first.", "status": "error"}
+        )
+
+    if not _select_tweets(session.tweets, request):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "No tweets found in the selected date range.", "status": "error"}
+        )
+    return None
+
+def _select_tweets(tweets: TweetStore, request: Union[CoordinateRequest, BatchCoordinateRequest]) -> TweetStore:
+    # Filtering returns a view, the uploaded archive stays intact for the next request.
+    if request.start_date and request.end_date:
+        return get_tweets_by_date(tweets, request.start_date, request.end_date, request.timezone)
+    return tweets
+
+def _preprocessor(llm: Model, request: Union[CoordinateRequest, BatchCoordinateRequest, CompareRequest]) -> Optional[TextPreprocessor]:
+    if not request.text_rules.active:
+        return None
+    return TextPreprocessor(request.text_rules, lambda text: llm.count_tokens(text, cache=False))
+
+def _selector(llm: Model, tweets: TweetStore, request: Union[CoordinateRequest, BatchCoordinateRequest, CompareRequest],
+              words: Dict[str, dict]) -> Optional[RelevanceSelector]:
+    """
+    Returns the relevance selector of the request, scoring the tweets against every word and its factors, or None.
+    """
+    if request.relevance is None:
+        return None
+    query = " ".join(" ".join([word, *(str(attributes.get(key, "")) for key in FACTOR_KEYS)]) for word, attributes in words.items())
+    return RelevanceSelector(tweets, query, request.relevance, llm.count_tokens)
+
+def _period_sections(tweets: TweetStore, request: Union[CoordinateRequest, BatchCoordinateRequest, CompareRequest],
+                     preprocessor: Optional[TextPreprocessor] = None, selector: Optional[RelevanceSelector] = None,
+                     period: int = 100, lines: bool = False) -> List[dict]:
+    with stage("date_filter"):
+        selected = _select_tweets(tweets, request)
+    select = selector.select if selector is not None else None
+    with stage("period_split" if preprocessor is None else "preprocess"):
+        return period_sections(selected, period, preprocessor=preprocessor, select=select, lines=lines)
+
+async def _preprocessed_sections(llm: Model, tweets: TweetStore, request: Union[CoordinateRequest, BatchCoordinateRequest],
+                                 words: Dict[str, dict], lines: bool = False) -> Tuple[List[dict], Dict]:
+    """
+    Returns the periods of the selected tweets after the relevance filter and the text rules of the request,
+    with the preprocessing and relevance reports. With `lines`, the periods keep the time span of every line of their text.
+    Indexing and normalizing the tweets is CPU work, so it runs off the event loop.
+    """
+    preprocessor = _preprocessor(llm, request)
+    selector = _selector(llm, tweets, request, words)
+    sections = await asyncio.to_thread(_period_sections, tweets, request, preprocessor, selector, 100, lines)
+    if not sections:
+        raise ValueError("No tweets left after applying the text rules.")
+    return sections, {
+        "preprocessing": preprocessor.report() if preprocessor else None,
+        "relevance": selector.report() if selector else None,
     }
 
+def _comparison_archives(session: Session, request: CompareRequest) -> dict:
+    """
+    Returns the labelled archives of the session selected by the request, all of them if no label is given.
+    """
+    labels = request.labels or list(session.archives)
+    missing = [label for label in labels if label not in session.archives]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Unknown archives: {', '.join(missing)}")
+    return {label: session.archives[label] for label in labels}
+
+async def _compute_comparison(llm: Model, archives: dict, request: CompareRequest, progress: Optional[RatingProgress] = None) -> dict:
+    """
+    Rates every archive against one shared set of axes and returns one point per archive.
+    The periods of all archives are rated in a single call, so chunks of different archives are interleaved on the model.
+    """
+    with stage("create_words"):
+        attributes = await llm.acreate_words(request.word)
+    preprocessor = _preprocessor(llm, request)
+    labels, texts, counts, relevance = [], [], [], {}
+    for label, tweets in archives.items():
+        # Every archive has its own index, built once and reused by later comparisons.
+        selector = _selector(llm, tweets, request, {request.word: attributes})
+        sections = await asyncio.to_thread(_period_sections, tweets, request, preprocessor, selector)
+        archive_text = [section["text"] for section in sections]
+        if selector is not None:
+            relevance[label] = selector.report()
+        if not archive_text:
+            continue
+        labels.append(label)
+        texts.extend(archive_text)
+        counts.append(len(archive_text))
+    if not texts:
+        raise ValueError("No tweets found in the selected date range.")
+
+    with stage("rating"):
+        ratings = await llm.rate_texts(texts, request.word, attributes, progress)
+
+    with stage("aggregation"):
+        points = []
+        offset = 0
+        for label, count in zip(labels, counts):
+            archive_ratings = ratings[offset:offset + count]
+            offset += count
+            mean_x = sum(rating[0] for rating in archive_ratings) / count
+            mean_y = sum(rating[1] for rating in archive_ratings) / count
+            points.append({"label": label, "coordinates": (mean_x, mean_y)})
+    return {
+        "points": points,
+        "attributes": attributes,
+        "preprocessing": preprocessor.report() if preprocessor else None,
+        "relevance": relevance or None,
+    }
+
+def _keep_trajectory(session: Optional[Session], tweets: TweetStore, trajectory: Trajectory):
+    # A session that uploaded another archive while the periods were rated keeps the trajectories of the new one only.
+    if session is not None and session.tweets is tweets:
+        session.trajectories[trajectory.word] = trajectory
+
+async def _compute_coordinates(llm: Model, tweets: TweetStore, request: CoordinateRequest, progress: Optional[RatingProgress] = None,
+                               session: Optional[Session] = None) -> dict:
+    """
+    Divides the selected tweets into periods, rates every period and returns the mean coordinate with the attributes.
+    The rating of every period and chunk is kept as the trajectory of the word in `session`, for /trajectory.
+    In sampled mode, returns the estimate of `Model.rate_texts_sampled` with its confidence interval instead.
+    """
+    with stage("create_words"):
+        attributes = await llm.acreate_words(request.word)
+    # The chunks of a trajectory are kept with the time span of their tweets, found from the lines of every period.
+    sections, reports = await _preprocessed_sections(llm, tweets, request, {request.word: attributes}, lines=not request.sample)
+    tweet_text = [section["text"] for section in sections]
+    if request.sample:
+        with stage("rating"):
+            estimate = await llm.rate_texts_sampled(
+                tweet_text, request.word, attributes, request.tolerance,
+                request.max_chunks, request.max_tokens, request.max_seconds, request.seed, progress,
+            )
+        return {**estimate, "attributes": attributes, **reports}
+    recorder = TrajectoryRecorder(progress)
+    with stage("rating"):
+        ratings = await llm.rate_texts(tweet_text, request.word, attributes, recorder)
+    _keep_trajectory(session, tweets, Trajectory(request.word, attributes, sections, ratings, recorder.chunks, recorder.lines))
+
+    with stage("aggregation"):
+        mean_x = sum(rating[0] for rating in ratings) / len(ratings)
+        mean_y = sum(rating[1] for rating in ratings) / len(ratings)
+        mean_rating = (mean_x, mean_y)
+
+    return {"coordinates": mean_rating, "attributes": attributes, **reports}
+
+async def _compute_batch_coordinates(llm: Model, tweets: TweetStore, request: BatchCoordinateRequest,
+                                     session: Optional[Session] = None) -> dict:
+    """
+    Same as `_compute_coordinates` for several words, rating the periods once for all of them.
+    Trajectories are kept per period only, chunks are rated on all the words at once.
+    """
+    words = list(dict.fromkeys(request.words))
+    with stage("create_words"):
+        attributes = await asyncio.gather(*(llm.acreate_words(word) for word in words))
+    # The periods are shared by every word, so the tweets are selected against all the words at once.
+    sections, reports = await _preprocessed_sections(llm, tweets, request, dict(zip(words, attributes)))
+    tweet_text = [section["text"] for section in sections]
+    with stage("rating"):
+        ratings = await llm.rate_texts_multi(tweet_text, dict(zip(words, attributes)))
+    for word, word_attributes in zip(words, attributes):
+        _keep_trajectory(session, tweets, Trajectory(word, word_attributes, sections, ratings[word]))
+
+    with stage("aggregation"):
+        results = {}
+        for word, word_attributes in zip(words, attributes):
+            word_ratings = ratings[word]
+            mean_x = sum(rating[0] for rating in word_ratings) / len(word_ratings)
+            mean_y = sum(rating[1] for rating in word_ratings) / len(word_ratings)
+            results[word] = {"coordinates": (mean_x, mean_y), "attributes": word_attributes}
+    return {"results": results, **reports}
+
 @app.post("/get-coords")
-async def get_coordinates(request: CoordinateRequest):
+async def get_coordinates(request: CoordinateRequest, session: Session = Depends(get_session)):
     """
     This function returns the coordinates for the given word.
     It divides the tweets into periods and calculates the coordinates for each period.
-    It uses the give_rating function from the Model class to calculate the coordinates for each period.
+    It uses the rate_texts function from the Model class to rate all periods concurrently.
     It then calculates the mean of the coordinates to get the final coordinates.
     ----------
     Args:
         request: CoordinateRequest - is a pydantic model that contains the word and the provider name.
+        session: Session - the session of the caller.
     Returns:
         JSONResponse - returns a JSON response with the coordinates and the attributes.
     Raises:
         HTTPException - raises an HTTPException if the model is not loaded or if there are no tweets.
     """
-    global llm, tweets
     try:
+        error = _check_ready(session, request)
+        if error is not None:
+            return error
+        # Hold the model so that a concurrent reset of the session does not unload it mid-request.
+        provider = session.provider
+        llm = registry.retain(provider)
+        try:
+            return await _compute_coordinates(llm, session.tweets, request, session=session)
+        finally:
+            registry.release(provider)
+    except Exception as e: 
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/get-coords/batch")
+async def get_batch_coordinates(request: BatchCoordinateRequest, session: Session = Depends(get_session)):
+    """
+    This function returns the coordinates for several words in a single pass over the tweets.
+    The archive is chunked once per batch of words and every chunk is rated on all the words of the batch in the same request.
+    ----------
+    Args:
+        request: BatchCoordinateRequest - is a pydantic model that contains the words and the provider name.
+        session: Session - the session of the caller.
+    Returns:
+        JSONResponse - returns a JSON response with the coordinates and the attributes of every word.
+    Raises:
+        HTTPException - raises an HTTPException if no word is given or the rating fails.
+    """
+    if not request.words:
+        raise HTTPException(status_code=400, detail="At least one word is required")
+    try:
+        error = _check_ready(session, request)
+        if error is not None:
+            return error
+        provider = session.provider
+        llm = registry.retain(provider)
+        try:
+            return await _compute_batch_coordinates(llm, session.tweets, request, session)
+        finally:
+            registry.release(provider)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/jobs")
+async def create_job(request: CoordinateRequest, session: Session = Depends(get_session)):
+    """
+    This function starts computing the coordinates for the given word in the background.
+    Progress can be followed on /jobs/{job_id}/events and the result fetched from /jobs/{job_id}.
+    ----------
+    Args:
+        request: CoordinateRequest - is a pydantic model that contains the word and the provider name.
+        session: Session - the session of the caller.
+    Returns:
+        dict - returns a dictionary with the job id and its status.
+    """
+    error = _check_ready(session, request)
+    if error is not None:
+        return error
+    # The job keeps its own references, so it finishes even if the session resets or uploads a new archive meanwhile.
+    provider, tweets = session.provider, session.tweets
+    llm = registry.retain(provider)
+    job = jobs.submit(Job(request.word, llm.combine_ratings, session.id), lambda job: _compute_coordinates(llm, tweets, request, job, session))
+    job.task.add_done_callback(lambda task: registry.release(provider))
+    return {"job_id": job.id, "status": job.status}
+
+@app.post("/compare")
+async def create_comparison_job(request: CompareRequest, session: Session = Depends(get_session)):
+    """
+    This function starts scoring several labelled archives against the same axes in the background.
+    The job is followed like any other job, and its result holds one point per archive.
+    ----------
+    Args:
+        request: CompareRequest - is a pydantic model that contains the word, the provider name and optionally the labels to compare.
+        session: Session - the session of the caller.
+    Returns:
+        dict - returns a dictionary with the job id and its status.
+    """
+    llm = registry.get(session.provider)
+    if not llm or not llm.model:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Model not loaded. Please load the model first.", "status": "error"}
+        )
+    archives = _comparison_archives(session, request)
+    if not archives:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "No archives to compare. Please upload labelled archives first.", "status": "error"}
+        )
+    provider = session.provider
+    llm = registry.retain(provider)
+    job = jobs.submit(Job(request.word, llm.combine_ratings, session.id), lambda job: _compute_comparison(llm, archives, request, job))
+    job.task.add_done_callback(lambda task: registry.release(provider))
+    return {"job_id": job.id, "status": job.status}
+
+@app.get("/trajectory")
+async def get_trajectory(word: str, start_date: Optional[str] = None, end_date: Optional[str] = None, timezone: Optional[str] = None,
+                         window: int = 3, weighted: bool = True, chunks: bool = False, session: Session = Depends(get_session)):
+    """
+    This function returns how the coordinates of a word moved over time, from the period ratings kept by the last
+    /get-coords, /jobs or /get-coords/batch request for that word. No model is called, so any date window can be queried.
+    ----------
+    Args:
+        word: str - the word rated on the archive of the session.
+        start_date: str - optional start of the window, 'YYYY-MM-DD' or an ISO 8601 timestamp.
+        end_date: str - optional end of the window, a plain date includes that whole day.
+        timezone: str - optional IANA time zone of the bounds, UTC if not given.
+        window: int - number of periods of the rolling mean.
+        weighted: bool - whether the rolling mean weighs every period by its number of tweets.
+        chunks: bool - whether to include the rating, time span and number of tweets of every chunk.
+        session: Session - the session of the caller.
+    Returns:
+        dict - returns the periods with their coordinates and tweet counts, the rolling mean, the mean and the tweet-weighted mean.
+    Raises:
+        HTTPException - raises an HTTPException if the word has not been rated or the window is invalid.
+    """
+    trajectory = session.trajectories.get(word)
+    if trajectory is None:
+        raise HTTPException(status_code=404, detail=f"No ratings kept for '{word}'. Please get its coordinates first.")
+    if window < 1:
+        raise HTTPException(status_code=400, detail="window must be a positive integer")
+    try:
+        start_ts, end_ts = parse_date_range(start_date, end_date, timezone)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return trajectory.summary(start_ts, end_ts, window, weighted, chunks)
+
+def _session_job(job_id: str, session: Session) -> Job:
+    """
+    Returns a job of the session. Jobs of other sessions are reported as not found.
+    """
+    job = jobs.get(job_id)
+    if job is None or job.session_id != session.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, session: Session = Depends(get_session)):
+    """
+    This function returns the status, progress and, once finished, the result of a job of the session.
+    ----------
+    Args:
+        job_id: str - the id returned by POST /jobs.
+        session: Session - the session of the caller.
+    Returns:
+        dict - returns the job summary.
+    """
+    return _session_job(job_id, session).summary()
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request, after: int = -1, session: Session = Depends(get_session)):
+    """
+    This function streams the events of a job as Server-Sent Events.
+    Events are "started", one "progress" per rated chunk with the running mean, and finally "done", "error" or "cancelled".
+    Reconnecting clients resume after the Last-Event-ID header or the `after` query parameter.
+    EventSource cannot send headers, so browsers pass their session in the session_id query parameter.
+    ----------
+    Args:
+        job_id: str - the id returned by POST /jobs.
+        after: int - only send events with a greater id.
+        session: Session - the session of the caller.
+    Returns:
+        StreamingResponse - the event stream.
+    """
+    job = _session_job(job_id, session)
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id is not None and last_event_id.isdigit():
+        after = max(after, int(last_event_id))
+
+    async def events():
+        async for event in job.stream(after):
+            yield format_sse(event)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str, session: Session = Depends(get_session)):
+    """
+    This function cancels a running job of the session.
+    ----------
+    Args:
+        job_id: str - the id returned by POST /jobs.
+        session: Session - the session of the caller.
+    Returns:
+        dict - returns a dictionary with whether the job was cancelled.
+    """
+    _session_job(job_id, session)
+    return {"cancelled": jobs.cancel(job_id)}
+
+
+@app.get("/archives")
+async def list_archives(session: Session = Depends(get_session)):
+    """
+    This function lists the labelled archives of the session.
+    ----------
+    Returns:
+        dict - returns a dictionary with the label, the number of tweets and the size of every archive.
+    """
+    return {"archives": [
+        {"label": label, "tweets": len(tweets), "bytes": tweets.nbytes}
+        for label, tweets in session.archives.items()
+    ]}
+
+@app.delete("/archives/{label}")
+async def delete_archive(label: str, session: Session = Depends(get_session)):
+    """
+    This function removes a labelled archive from the session.
+    ----------
+    Args:
+        label: str - the label of the archive.
+    Returns:
+        dict - returns a dictionary with whether the archive was removed.
+    """
+    if snapshots is not None:
+        snapshots.unbind(session.id, label)
+    return {"removed": session.archives.pop(label, None) is not None}
+
+@app.post("/archives/load-directory")
+async def load_archive_directory(request: ArchiveDirectoryRequest, session: Session = Depends(get_session)):
+    """
+    This function loads every archive of a local directory as labelled archives, for offline bulk comparisons.
+    The directory must be inside LOCAL_ARCHIVE_ROOT (the home directory by default).
+    ----------
+    Args:
+        request: ArchiveDirectoryRequest - is a pydantic model that contains the path of the directory.
+        session: Session - the session of the caller.
+    Returns:
+        dict - returns a dictionary with the loaded labels.
+    """
+    root = os.path.realpath(os.getenv("LOCAL_ARCHIVE_ROOT", os.path.expanduser("~")))
+    directory = os.path.realpath(request.path)
+    if os.path.commonpath([root, directory]) != root:
+        raise HTTPException(status_code=403, detail=f"The directory must be inside {root}")
+    if not os.path.isdir(directory):
+        raise HTTPException(status_code=404, detail="Directory not found")
+
+    loop = asyncio.get_running_loop()
+    loaded = []
+    for label, path in find_archives(directory).items():
+        try:
+            # Hashing and parsing are CPU and disk work, keep them off the event loop.
+            tweets, digest = await loop.run_in_executor(None, load_archive_file, path, snapshots)
+        except (ValueError, KeyError, AttributeError):
+            raise HTTPException(status_code=400, detail=f"Invalid JSON File: {path}")
+        try:
+            sessions.set_archive(session, label, tweets)
+        except MemoryError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        if digest is not None:
+            snapshots.bind(session.id, label, digest)
+        loaded.append(label)
+    return {"labels": loaded, "session_id": session.id}
+
+
+@app.post("/axes/pin")
+async def pin_axes(request: AxisPinRequest, session: Session = Depends(get_session)):
+    """
+    This function pins the axis attributes of a word so that every /get-coords call reuses them.
+    If no attributes are given, the attributes currently resolved for the word by the loaded model are pinned.
+    ----------
+    Args:
+        request: AxisPinRequest - is a pydantic model that contains the word, the optional attributes and the optional provider.
+    Returns:
+        dict - returns a dictionary with the pinned word and attributes.
+    """
+    attributes = request.attributes.model_dump() if request.attributes else None
+    if attributes is None:
+        provider = session.provider
+        llm = registry.get(provider)
         if not llm or not llm.model:
-            print("Model not loaded", type(llm), type(llm.model), llm.provider)
-            return JSONResponse(
-                status_code=400,
-                content={"error": "Model not loaded. Please load the model first.", "status": "error"}
-            )
-        
-        if not tweets:
             return JSONResponse(
                 status_code=400,
-                content={"error": "No tweets found. Please upload tweets first.", "status": "error"}
+                content={"error": "Model not loaded. Please load the model first or provide the attributes.", "status": "error"}
             )
+        # Keep the model loaded while the attributes are generated, even if the session switches provider meanwhile.
+        llm = registry.retain(provider)
+        try:
+            attributes = await llm.acreate_words(request.word)
+        finally:
+            registry.release(provider)
+    registry.axis_memo.pin(request.word, attributes, provider=request.provider)
+    return {"word": request.word, "attributes": attributes, "provider": request.provider}
 
-        if request.start_date and request.end_date:
-            tweets = get_tweets_by_date(tweets, request.start_date, request.end_date)
-        period = 100
-        tweet_text = divide_tweets_by_period_text(tweets, period)
-        attributes = llm.create_words(request.word)
-        ratings = []
-        for text in tweet_text:
-            ratings.append(llm.give_rating(text, request.word, attributes['x_aspect'], attributes['x_positive'], attributes['x_negative'], attributes['y_aspect'], attributes['y_positive'], attributes['y_negative']))
-        
-        mean_x = sum(rating[0] for rating in ratings) / len(ratings)
-        mean_y = sum(rating[1] for rating in ratings) / len(ratings)
-        mean_rating = (mean_x, mean_y)
+@app.delete("/axes/pin")
+async def unpin_axes(word: str, provider: Optional[str] = None):
+    """
+    This function removes a pinned set of axis attributes.
+    ----------
+    Args:
+        word: str - the pinned word.
+        provider: Optional[str] - the provider the pin was restricted to, if any.
+    Returns:
+        dict - returns a dictionary with whether a pin was removed.
+    """
+    return {"removed": registry.axis_memo.unpin(word, provider=provider)}
 
-        return {"coordinates": mean_rating, "attributes": attributes}
-    except Exception as e: 
-        raise HTTPException(status_code=500, detail=str(e))
+@app.get("/axes/pins")
+async def list_pinned_axes():
+    """
+    This function lists all pinned axis attributes.
+    ----------
+    Returns:
+        dict - returns a dictionary with the list of pins.
+    """
+    return {"pins": registry.axis_memo.pins()}
 
 
 @app.post("/reset")
-async def reset_state():
+async def reset_state(session: Session = Depends(get_session)):
     """
-    This function resets the state of the application.
-    It unloads the model and resets the tweets list.
+    This function resets the state of the calling session.
+    It releases the session's model and drops its tweets, which are no longer restored after a restart.
+    Other sessions are not affected.
     ----------
     Returns:
         dict - returns a dictionary with a message that the state has been reset.
     """
-    global llm, tweets
-    llm.unload_model()
-    tweets = [] 
+    sessions.drop(session.id)
     return {"message": "State has been reset"}
 
 app.add_middleware(
@@ -0,0 +1,280 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "xcompass")
+
+
+def default_cache_path(filename: str) -> str:
+    """
+    Returns the path of a cache file inside the cache directory.
+    The directory can be changed with the XCOMPASS_CACHE_DIR environment variable.
+    """
+    return os.path.join(os.getenv("XCOMPASS_CACHE_DIR", DEFAULT_CACHE_DIR), filename)
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class RatingCache:
+    """
+    Content-addressed, on-disk cache of chunk ratings and of the combined ratings of whole periods.
+    Entries are keyed on the chunk text hash, the word, the six axis attributes, the provider, the model name and the
+    version of the rating prompt, and are evicted least-recently-used first once the stored size exceeds `max_bytes`.
+    """
+
+    # Fixed per-row overhead used when accounting the size of an entry.
+    ROW_OVERHEAD = 48
+
+    def __init__(self, path: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.path = path or os.getenv("RATING_CACHE_PATH") or default_cache_path("ratings.db")
+        self.max_bytes = max_bytes or int(os.getenv("RATING_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+        self._lock = threading.Lock()
+        self._conn = _connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ratings ("
+            " key TEXT PRIMARY KEY,"
+            " x_value INTEGER NOT NULL,"
+            " y_value INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ratings_last_access ON ratings (last_access)")
+        self._bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ratings").fetchone()[0]
+
+    @staticmethod
+    def make_key(chunk: str, word: str, attributes: Iterable[str], provider: str, model_name: str, prompt_version: str) -> str:
+        """
+        Builds the cache key for a chunk rating.
+        ----------
+        Args:
+            chunk (str): The chunk of compiled tweets
+            word (str): The main factor for the ratings
+            attributes (Iterable[str]): The six axis attributes, in `ATTRIBUTE_KEYS` order
+            provider (str): The provider name
+            model_name (str): The model name
+            prompt_version (str): Identifies the rating prompts and reply schemas, so that ratings made with older
+                prompts are not served after the prompts change
+        Returns:
+            str: A hex digest identifying the rating request
+        """
+        h = hashlib.sha256()
+        h.update(hashlib.sha256(chunk.encode("utf-8")).digest())
+        for part in (word, *attributes, provider, model_name, prompt_version):
+            h.update(b"\x00")
+            h.update(part.encode("utf-8"))
+        return h.hexdigest()
+
+    @classmethod
+    def make_period_key(cls, text: str, word: str, attributes: Iterable[str], provider: str, model_name: str, prompt_version: str) -> str:
+        """
+        Builds the cache key for the combined rating of a whole period, kept apart from the chunk keys
+        so that a period made of a single chunk does not collide with the rating of that chunk.
+        """
+        return cls.make_key(text, word, (*attributes, "period"), provider, model_name, prompt_version)
+
+    def get_many(self, keys: List[str]) -> Dict[str, Tuple[int, int]]:
+        """
+        Looks up several keys at once and marks the hits as recently used.
+        ----------
+        Returns:
+            Dict[str, Tuple[int, int]]: The cached (x_value, y_value) for every key that was found
+        """
+        if not keys:
+            return {}
+        found = {}
+        now = time.time()
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit.
+            for i in range(0, len(keys), 500):
+                batch = keys[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, x_value, y_value FROM ratings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, x_value, y_value in rows:
+                    found[key] = (x_value, y_value)
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE ratings SET last_access = ? WHERE key = ?",
+                        [(now, row[0]) for row in rows],
+                    )
+        return found
+
+    def get(self, key: str) -> Optional[Tuple[int, int]]:
+        return self.get_many([key]).get(key)
+
+    def put(self, key: str, rating: Tuple[int, int]):
+        """
+        Stores a rating and evicts the least recently used entries if the cache grew past `max_bytes`.
+        """
+        size = len(key) + self.ROW_OVERHEAD
+        with self._lock:
+            existing = self._conn.execute("SELECT size FROM ratings WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ratings (key, x_value, y_value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, int(rating[0]), int(rating[1]), size, time.time()),
+            )
+            self._bytes += size - (existing[0] if existing else 0)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Evict down to 90% of the budget so that eviction does not run on every insert.
+        target = int(self.max_bytes * 0.9)
+        while self._bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM ratings ORDER BY last_access LIMIT 256"
+            ).fetchall()
+            if not rows:
+                self._bytes = 0
+                break
+            freed = []
+            for key, size in rows:
+                freed.append((key,))
+                self._bytes -= size
+                if self._bytes <= target:
+                    break
+            self._conn.executemany("DELETE FROM ratings WHERE key = ?", freed)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM ratings")
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM ratings").fetchone()[0]
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AxisMemo:
+    """
+    Bounded, on-disk memo of the axis attributes generated by `Model.create_words`.
+    Entries are stored per word, provider and model name. Pinned entries are never evicted and are
+    returned in place of generated axes; a pin made without a provider applies to every provider.
+    """
+
+    ANY = "*"
+
+    def __init__(self, path: Optional[str] = None, max_entries: Optional[int] = None):
+        self.path = path or os.getenv("AXIS_MEMO_PATH") or default_cache_path("axes.db")
+        self.max_entries = max_entries or int(os.getenv("AXIS_MEMO_MAX_ENTRIES", 10000))
+        self._lock = threading.Lock()
+        self._conn = _connect(self.path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS axes ("
+            " word TEXT NOT NULL,"
+            " provider TEXT NOT NULL,"
+            " model_name TEXT NOT NULL,"
+            " attributes TEXT NOT NULL,"
+            " pinned INTEGER NOT NULL DEFAULT 0,"
+            " last_access REAL NOT NULL,"
+            " PRIMARY KEY (word, provider, model_name))"
+        )
+
+    @staticmethod
+    def normalize_word(word: str) -> str:
+        return " ".join(word.lower().split())
+
+    def get(self, word: str, provider: str, model_name: str) -> Optional[Dict[str, str]]:
+        """
+        Returns the memoized attributes for a word, or None if it has not been resolved yet.
+        The most specific pin wins, and any pin wins over a generated entry.
+        """
+        word = self.normalize_word(word)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT provider, model_name, attributes FROM axes"
+                " WHERE word = ? AND ((provider = ? AND model_name = ?)"
+                " OR (pinned = 1 AND provider IN (?, ?) AND model_name IN (?, ?)))"
+                " ORDER BY pinned DESC, provider = ? DESC, model_name = ? DESC LIMIT 1",
+                (word, provider, model_name, provider, self.ANY, model_name, self.ANY, provider, model_name),
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE axes SET last_access = ? WHERE word = ? AND provider = ? AND model_name = ?",
+                (time.time(), word, row[0], row[1]),
+            )
+        return json.loads(row[2])
+
+    def put(self, word: str, provider: str, model_name: str, attributes: Dict[str, str], pinned: bool = False):
+        """
+        Stores the attributes for a word. Generated entries never replace a pinned one.
+        """
+        word = self.normalize_word(word)
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT pinned FROM axes WHERE word = ? AND provider = ? AND model_name = ?",
+                (word, provider, model_name),
+            ).fetchone()
+            if existing and existing[0] and not pinned:
+                return
+            self._conn.execute(
+                "INSERT OR REPLACE INTO axes (word, provider, model_name, attributes, pinned, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (word, provider, model_name, json.dumps(attributes), int(pinned), time.time()),
+            )
+            self._evict()
+
+    def pin(self, word: str, attributes: Dict[str, str], provider: Optional[str] = None, model_name: Optional[str] = None):
+        """
+        Fixes the attributes of a word so they are reused instead of generated.
+        ----------
+        Args:
+            word (str): The word to pin
+            attributes (Dict[str, str]): The six axis attributes
+            provider (Optional[str]): Restrict the pin to one provider. Applies to all providers if None.
+            model_name (Optional[str]): Restrict the pin to one model of the provider.
+        """
+        self.put(word, provider or self.ANY, model_name or self.ANY, attributes, pinned=True)
+
+    def unpin(self, word: str, provider: Optional[str] = None, model_name: Optional[str] = None) -> bool:
+        """
+        Removes a pin. Returns True if a pin was removed.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM axes WHERE word = ? AND provider = ? AND model_name = ? AND pinned = 1",
+                (self.normalize_word(word), provider or self.ANY, model_name or self.ANY),
+            )
+            return cursor.rowcount > 0
+
+    def pins(self) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT word, provider, model_name, attributes FROM axes WHERE pinned = 1 ORDER BY word"
+            ).fetchall()
+        return [
+            {"word": word, "provider": provider, "model_name": model_name, "attributes": json.loads(attributes)}
+            for word, provider, model_name, attributes in rows
+        ]
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM axes WHERE pinned = 0").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM axes WHERE rowid IN (SELECT rowid FROM axes WHERE pinned = 0 ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,292 @@
+"""
+Headless batch scoring of many archives against a list of words, run from the repository root:
+
+    python -m src.cli archives/ --words freedom money --provider groq --output scores.csv
+    python -m src.cli alice.js bob.js --words-file words.txt --workers 8 --output scores.jsonl
+
+Archives are scored in a pool of worker processes. Every worker loads one model and scores whole archives with it,
+rating every chunk on all the words at once. Finished archives are appended to a checkpoint file, so an interrupted
+run started again with the same options only scores the archives that are left. The output (CSV or JSONL, one row
+per archive and word) is written from the checkpoint once every archive is done.
+"""
+import argparse
+import asyncio
+import csv
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from .data import ARCHIVE_EXTENSIONS, divide_tweets_by_period_text, find_archives, get_tweets_by_date
+from .metric import ATTRIBUTE_KEYS, Model
+from .preprocess import TextPreprocessor, TextRules
+from .ratelimit import RateLimiter
+from .snapshot import SnapshotStore, load_archive_file
+
+PERIOD_DAYS = 100
+CSV_FIELDS = ("label", "archive", "word", "x", "y", "tweets", "periods", *ATTRIBUTE_KEYS)
+
+# State of a worker process, set up once by `_init_worker` and shared by every archive it scores.
+_model: Optional[Model] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_snapshots: Optional[SnapshotStore] = None
+
+
+def _init_worker(provider: str, workers: int, concurrency: Optional[int]):
+    global _model, _loop, _snapshots
+    load_dotenv()
+    model = Model(max_concurrency=concurrency)
+    model.provider = provider
+    model.load_model()
+    if model.rate_limiter is not None and workers > 1:
+        # The requests and tokens per minute budget of the account is split between the workers.
+        limiter = model.rate_limiter
+        model.rate_limiter = RateLimiter(max(1, limiter.rpm // workers), max(1, limiter.tpm // workers))
+    _model = model
+    # One loop for the life of the worker, so the async Groq client keeps its connections between archives.
+    _loop = asyncio.new_event_loop()
+    _snapshots = SnapshotStore() if os.getenv("SNAPSHOTS", "1") != "0" else None
+
+
+async def _ascore_archive(path: str, words: List[str], options: Dict) -> Dict:
+    tweets, _ = load_archive_file(path, _snapshots)
+    if options["start_date"]:
+        tweets = get_tweets_by_date(tweets, options["start_date"], options["end_date"], options["timezone"])
+    rules = TextRules(**options["text_rules"])
+    preprocessor = TextPreprocessor(rules) if rules.active else None
+    texts = divide_tweets_by_period_text(tweets, options["period_days"], preprocessor=preprocessor)
+    attributes = await asyncio.gather(*(_model.acreate_words(word) for word in words))
+    ratings = await _model.rate_texts_multi(texts, dict(zip(words, attributes))) if texts else {}
+
+    results = {}
+    for word, word_attributes in zip(words, attributes):
+        word_ratings = ratings.get(word)
+        coordinates = None
+        if word_ratings:
+            coordinates = (
+                sum(rating[0] for rating in word_ratings) / len(word_ratings),
+                sum(rating[1] for rating in word_ratings) / len(word_ratings),
+            )
+        results[word] = {"coordinates": coordinates, "attributes": word_attributes}
+    return {"tweets": len(tweets), "periods": len(texts), "results": results}
+
+
+def _score_archive(path: str, words: List[str], options: Dict) -> Dict:
+    """
+    Scores one archive on all the words with the model of the worker. Runs in a worker process.
+    """
+    started = time.perf_counter()
+    record = _loop.run_until_complete(_ascore_archive(path, words, options))
+    record["seconds"] = time.perf_counter() - started
+    return record
+
+
+def collect_archives(paths: List[str]) -> Dict[str, str]:
+    """
+    Returns the path of every archive to score, by label. Directories are searched with `find_archives`.
+    ----------
+    Raises:
+        ValueError: If a path is neither an archive file nor a directory, or two archives share a label.
+    """
+    archives = {}
+    for path in paths:
+        if os.path.isdir(path):
+            found = find_archives(path)
+        elif os.path.isfile(path) and path.endswith(ARCHIVE_EXTENSIONS):
+            found = {os.path.splitext(os.path.basename(path))[0]: path}
+        else:
+            raise ValueError(f"Not an archive file or directory: {path}")
+        for label, archive in found.items():
+            if label in archives and os.path.realpath(archives[label]) != os.path.realpath(archive):
+                raise ValueError(f"Two archives are labelled {label}: {archives[label]} and {archive}")
+            archives[label] = archive
+    return archives
+
+
+def archive_key(path: str) -> str:
+    """
+    Identifies the content of an archive file without reading it: its real path, size and modification time.
+    """
+    stat = os.stat(path)
+    return f"{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def run_key(provider: str, words: List[str], options: Dict) -> str:
+    """
+    Identifies the options of a run, so that a checkpoint is only resumed by a run that would compute the same results.
+    """
+    signature = json.dumps({"provider": provider, "words": words, **options}, sort_keys=True)
+    return hashlib.sha256(signature.encode("utf-8")).hexdigest()[:16]
+
+
+def read_checkpoint(path: str, run: str) -> Dict[str, Dict]:
+    """
+    Returns the archives already scored by runs with the same options, by archive key.
+    A line cut short by an interrupted run is ignored.
+    """
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get("run") == run:
+                done[record["key"]] = record
+    return done
+
+
+def _end_partial_line(path: str):
+    # A run killed while writing leaves half a line, the next record must not be appended to it.
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+
+def output_rows(records: List[Dict]) -> List[Dict]:
+    rows = []
+    for record in records:
+        for word, result in record["results"].items():
+            x, y = result["coordinates"] if result["coordinates"] is not None else (None, None)
+            rows.append({
+                "label": record["label"],
+                "archive": record["archive"],
+                "word": word,
+                "x": x,
+                "y": y,
+                "tweets": record["tweets"],
+                "periods": record["periods"],
+                **{key: result["attributes"].get(key) for key in ATTRIBUTE_KEYS},
+            })
+    return rows
+
+
+def write_output(path: str, rows: List[Dict], output_format: str):
+    """
+    Writes the rows as CSV or JSONL, under a temporary name first so a reader never sees half a file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as f:
+        if output_format == "csv":
+            writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+    os.replace(tmp_path, path)
+
+
+def run(archives: Dict[str, str], words: List[str], provider: str, output: str, output_format: str, checkpoint: str,
+        workers: int, concurrency: Optional[int], options: Dict) -> int:
+    """
+    Scores every archive not found in the checkpoint and writes the output.
+    ----------
+    Returns:
+        int: The number of archives that failed
+    """
+    run_id = run_key(provider, words, options)
+    done = read_checkpoint(checkpoint, run_id)
+    keys = {label: archive_key(path) for label, path in archives.items()}
+    pending = {label: path for label, path in archives.items() if keys[label] not in done}
+    print(f"{len(archives)} archives, {len(archives) - len(pending)} already scored, {len(words)} words", file=sys.stderr, flush=True)
+
+    failed = 0
+    if pending:
+        workers = max(1, min(workers, len(pending)))
+        context = multiprocessing.get_context("spawn")
+        _end_partial_line(checkpoint)
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker, initargs=(provider, workers, concurrency)) as pool, \
+                open(checkpoint, "a", encoding="utf-8") as f:
+            futures = {pool.submit(_score_archive, path, words, options): label for label, path in pending.items()}
+            for count, future in enumerate(as_completed(futures), 1):
+                label = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    # Failed archives are not checkpointed, so the next run tries them again.
+                    failed += 1
+                    print(f"[{count}/{len(pending)}] {label}: failed: {e}", file=sys.stderr, flush=True)
+                    continue
+                record.update(run=run_id, key=keys[label], label=label, archive=archives[label])
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+                done[record["key"]] = record
+                print(f"[{count}/{len(pending)}] {label}: {record['tweets']} tweets, {record['periods']} periods "
+                      f"in {record['seconds']:.1f}s", file=sys.stderr, flush=True)
+
+    records = [done[keys[label]] for label in archives if keys[label] in done]
+    write_output(output, output_rows(records), output_format)
+    print(f"Wrote {len(records)} archives to {output}", file=sys.stderr, flush=True)
+    return failed
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Score archives against a list of words without the web server.")
+    parser.add_argument("archives", nargs="+", help="Archive files (.json or tweets.js) or directories of archives")
+    parser.add_argument("--words", nargs="+", default=[], help="Words to score every archive on")
+    parser.add_argument("--words-file", help="File with one word per line, added to --words")
+    parser.add_argument("--provider", default="groq", choices=["groq", "llama_cpp", "mock"], help="Model provider")
+    parser.add_argument("--output", required=True, help="Output file, CSV or JSONL depending on its extension or --format")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Output format, by default from the extension of --output")
+    parser.add_argument("--checkpoint", help="Checkpoint file, <output>.checkpoint.jsonl by default")
+    parser.add_argument("--workers", type=int,
+                        help="Worker processes, each loading its own model (1 for llama_cpp, all cores otherwise by default)")
+    parser.add_argument("--concurrency", type=int, help="In-flight Groq requests per worker (GROQ_CONCURRENCY by default)")
+    parser.add_argument("--start-date", help="Only score the tweets from this date, 'YYYY-MM-DD' or ISO 8601, with --end-date")
+    parser.add_argument("--end-date", help="Only score the tweets up to this date, included")
+    parser.add_argument("--timezone", help="IANA time zone of the dates, UTC by default")
+    parser.add_argument("--period-days", type=int, default=PERIOD_DAYS, help="Length of the rated periods, in days")
+    parser.add_argument("--text-rules", action="store_true",
+                        help="Shorten links and mentions, collapse whitespace and count identical tweets once per period before rating")
+    args = parser.parse_args(argv)
+
+    words = list(args.words)
+    if args.words_file:
+        with open(args.words_file, encoding="utf-8") as f:
+            words.extend(line.strip() for line in f if line.strip())
+    words = list(dict.fromkeys(words))
+    if not words:
+        parser.error("at least one word is required (--words or --words-file)")
+    if bool(args.start_date) != bool(args.end_date):
+        parser.error("--start-date and --end-date go together")
+    try:
+        archives = collect_archives(args.archives)
+    except ValueError as e:
+        parser.error(str(e))
+    if not archives:
+        parser.error("no archives found")
+
+    output_format = args.format or ("csv" if args.output.endswith(".csv") else "jsonl")
+    options = {
+        "start_date": args.start_date,
+        "end_date": args.end_date,
+        "timezone": args.timezone,
+        "period_days": args.period_days,
+        "text_rules": (TextRules() if args.text_rules else TextRules.off()).model_dump(),
+    }
+    # Every llama_cpp worker loads its own copy of the model, so by default a single one does.
+    workers = args.workers
+    if workers is None:
+        workers = 1 if args.provider == "llama_cpp" else os.cpu_count() or 1
+    failed = run(archives, words, args.provider, args.output, output_format, args.checkpoint or f"{args.output}.checkpoint.jsonl",
+                 workers, args.concurrency, options)
+    if failed:
+        print(f"{failed} archives failed, run the same command again to retry them", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,22 @@
 import json
+import codecs
+from array import array
+import math
+import os
 from datetime import datetime, timedelta, timezone
-from typing import List, Dict
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import BinaryIO, Callable, List, Dict, Iterable, Iterator, Tuple, Union, Optional
+from .store import TweetStore, TweetStoreBuilder
+from .preprocess import TextPreprocessor
+
+# Size of the blocks read from an archive file while parsing it.
+ARCHIVE_BLOCK_SIZE = 1 << 16
+ARCHIVE_EXTENSIONS = ('.json', '.js')
+# Periods are aligned to this fixed epoch (Monday 1970-01-05 00:00 UTC), so that appending tweets or moving
+# the date window does not shift the boundaries of the other periods.
+PERIOD_EPOCH = 4 * 86400
+# Location of the tweets inside an unpacked Twitter export.
+EXPORT_TWEETS_PATH = os.path.join("data", "tweets.js")
 
 def load_tweets(tweet_path:str):
     """
@@ -16,6 +32,18 @@ def save_tweets(tweets, tweet_path:str):
     with open(tweet_path, 'w') as f:
         json.dump(tweets, f)
 
+def extract_tweet(tweet:Dict)->Dict:
+    """
+    This function extracts the tweet id, text, and creation date from a single archive entry.
+    Entries may be wrapped in a "tweet" key, as in the Twitter archive export, or be bare tweet objects.
+    """
+    tweet = tweet.get("tweet", tweet)
+    return {
+        "id": tweet["id"],
+        "text": tweet["full_text"],
+        "created_at": tweet["created_at"],
+    }
+
 def extract_info(tweets:List)->List:
     """
     This function extracts the tweet id, text, and creation date from a list of tweet dictionaries.
@@ -25,38 +53,232 @@ def extract_info(tweets:List)->List:
     Returns:
         extracted_tweets: List - List of dictionaries with 'id', 'text', and 'created_at' keys
     """
-    return [
-        {
-            "id": tweet["tweet"]["id"], 
-            "text": tweet["tweet"]["full_text"],
-            "created_at": tweet["tweet"]["created_at"],
-        } for tweet in tweets
-    ]
+    return [extract_tweet(tweet) for tweet in tweets]
+
+class ArchiveParser:
+    """
+    Incremental parser for Twitter archive exports.
+    Bytes are fed in blocks of any size and the extracted tweets are returned as soon as their array element
+    is complete, so only a single tweet is held in memory besides the current block. Both plain JSON arrays
+    and the raw tweets.js export (`window.YTD.tweet.part0 = [...]`) are accepted.
+    ----------
+    Raises:
+        json.JSONDecodeError: If the archive is not a valid JSON array of tweets.
+        ValueError: If the archive ends before the array is closed.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._buffer = ""
+        self._state = "prefix"
+        self.count = 0
+
+    def feed(self, block:bytes)->List[Dict]:
+        self._buffer += self._utf8.decode(block)
+        return self._drain(final=False)
+
+    def close(self)->List[Dict]:
+        self._buffer += self._utf8.decode(b"", final=True)
+        records = self._drain(final=True)
+        if self._state != "done":
+            raise ValueError("Archive ended before the tweet array was closed")
+        return records
+
+    def _drain(self, final:bool)->List[Dict]:
+        records = []
+        buffer = self._buffer
+        pos = 0
+        if self._state == "prefix":
+            # Skip the optional `window.YTD.tweet.part0 =` assignment in front of the array.
+            start = buffer.find("[")
+            if start < 0:
+                # Keep only a short tail, the prefix is a few dozen characters at most.
+                self._buffer = buffer[-256:]
+                return records
+            pos = start + 1
+            self._state = "items"
+
+        length = len(buffer)
+        while self._state == "items":
+            while pos < length and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= length:
+                break
+            if buffer[pos] == "]":
+                self._state = "done"
+                pos += 1
+                break
+            try:
+                entry, end = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # The element is split across blocks, wait for more data.
+                if final:
+                    raise
+                break
+            records.append(extract_tweet(entry))
+            self.count += 1
+            pos = end
+
+        self._buffer = buffer[pos:]
+        return records
+
+def iter_archive_stream(f:BinaryIO, block_size:int = ARCHIVE_BLOCK_SIZE)->Iterator[Dict]:
+    """
+    This function streams the extracted tweets of an open binary archive (tweets.js or JSON), reading it block by block.
+    ----------
+    Args:
+        f: BinaryIO - The archive, read from its current position
+        block_size: int - Number of bytes read at a time
+    Returns:
+        Iterator[Dict] - Dictionaries with 'id', 'text', and 'created_at' keys
+    """
+    parser = ArchiveParser()
+    while True:
+        block = f.read(block_size)
+        if not block:
+            break
+        yield from parser.feed(block)
+    yield from parser.close()
+
+def iter_archive(tweet_path:str, block_size:int = ARCHIVE_BLOCK_SIZE)->Iterator[Dict]:
+    """
+    This function streams the extracted tweets of an archive file (tweets.js or JSON) without loading it whole.
+    ----------
+    Args:
+        tweet_path: str - Path of the archive file
+        block_size: int - Number of bytes read at a time
+    Returns:
+        Iterator[Dict] - Dictionaries with 'id', 'text', and 'created_at' keys
+    """
+    with open(tweet_path, "rb") as f:
+        yield from iter_archive_stream(f, block_size)
+
+def parse_archive(f:BinaryIO)->TweetStore:
+    """
+    This function parses an open binary archive (tweets.js or JSON) into a TweetStore.
+    Parsing and sorting are CPU work, callers on the event loop run it in a thread.
+    ----------
+    Args:
+        f: BinaryIO - The archive, read from its current position
+    Returns:
+        TweetStore - The tweets of the archive, sorted by creation time
+    """
+    builder = TweetStoreBuilder()
+    builder.extend(iter_archive_stream(f))
+    return builder.build()
+
+def load_archive(tweet_path:str)->TweetStore:
+    """
+    This function parses an archive file (tweets.js or JSON) into a TweetStore.
+    ----------
+    Args:
+        tweet_path: str - Path of the archive file
+    Returns:
+        TweetStore - The tweets of the archive, sorted by creation time
+    """
+    with open(tweet_path, "rb") as f:
+        return parse_archive(f)
+
+def find_archives(directory:str)->Dict[str, str]:
+    """
+    This function finds the archives of a directory, labelled for comparison.
+    Archive files (.json or .js) are labelled with their file name without extension, and unpacked Twitter exports
+    (sub-directories holding data/tweets.js) with the name of the sub-directory.
+    ----------
+    Args:
+        directory: str - Directory holding the archives
+    Returns:
+        Dict[str, str] - Path of every archive, by label, sorted by label
+    """
+    archives = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            if os.path.isfile(os.path.join(path, EXPORT_TWEETS_PATH)):
+                archives[name] = os.path.join(path, EXPORT_TWEETS_PATH)
+        elif name.endswith(ARCHIVE_EXTENSIONS):
+            label = os.path.splitext(name)[0]
+            # Keep the full file name if two archives share a stem, e.g. alice.json and alice.js.
+            archives[name if label in archives else label] = path
+    return archives
+
 def parse_tweet_date(tweet):
     return datetime.strptime(tweet['created_at'], '%a %b %d %H:%M:%S %z %Y')
 
 def get_tweet_text(tweet):
     return tweet['text']
 
-def get_tweets_by_date(tweets:List, start_date, end_date=None)->List:
+def parse_date_bound(value:str, tz:Optional[str] = None, end:bool = False)->datetime:
+    """
+    This function parses a date range bound into an aware datetime.
+    Accepts 'YYYY-MM-DD' as well as ISO 8601 timestamps such as '2023-05-01T18:30' or '2023-05-01T18:30:00+02:00'.
+    ----------
+    Args:
+        value: str - The date or timestamp
+        tz: Optional[str] - IANA time zone for values without an offset, UTC if None
+        end: bool - If True, a plain date covers the whole day, i.e. it is moved to its last second
+    Returns:
+        datetime - The parsed bound
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=ZoneInfo(tz) if tz else timezone.utc)
+    if end and len(value.strip()) == 10:
+        parsed = parsed + timedelta(days=1) - timedelta(seconds=1)
+    return parsed
+
+def parse_date_range(start_date:Optional[str], end_date:Optional[str], tz:Optional[str] = None)->Tuple[Optional[int], Optional[int]]:
+    """
+    This function parses the bounds of a date range into timestamps, both inclusive, None for a missing bound.
+    ----------
+    Args:
+        start_date: Optional[str] - Start date in the format 'YYYY-MM-DD', or an ISO 8601 timestamp
+        end_date: Optional[str] - End date, a plain date includes that whole day
+        tz: Optional[str] - IANA time zone for dates without an offset, UTC if None
+    Returns:
+        Tuple[Optional[int], Optional[int]] - The first and last second of the range
+    Raises:
+        ValueError - If a bound is not a date or ISO 8601 timestamp, or the time zone is unknown
+    """
+    try:
+        if tz:
+            ZoneInfo(tz)
+    except (ValueError, ZoneInfoNotFoundError):
+        raise ValueError(f"Unknown time zone: {tz}")
+    try:
+        start_ts = math.ceil(parse_date_bound(start_date, tz).timestamp()) if start_date else None
+        end_ts = math.floor(parse_date_bound(end_date, tz, end=True).timestamp()) if end_date else None
+    except ValueError:
+        raise ValueError("Dates must be 'YYYY-MM-DD' or ISO 8601 timestamps")
+    return start_ts, end_ts
+
+def get_tweets_by_date(tweets:Union[List, TweetStore], start_date, end_date=None, tz:Optional[str] = None)->Union[List, TweetStore]:
     """
     This function filters tweets based on the start and end date.
     If no end date is provided, the function will filter tweets for the specified start date only.
+    Both bounds are inclusive, and an end given as a plain date includes that whole day.
+    The input is never modified. A TweetStore is filtered with two bisections on its sorted timestamps
+    and the result is a zero-copy view of it.
     ----------
     Args:
-        tweets: List - List of tweet dictionaries
-        start_date: str - Start date in the format 'YYYY-MM-DD'
-        end_date: str - End date in the format 'YYYY-MM-DD'
+        tweets: Union[List, TweetStore] - List of tweet dictionaries or a TweetStore
+        start_date: str - Start date in the format 'YYYY-MM-DD', or an ISO 8601 timestamp
+        end_date: str - End date in the format 'YYYY-MM-DD', or an ISO 8601 timestamp
+        tz: Optional[str] - IANA time zone for dates without an offset, UTC if None
     Returns:
-        filtered_tweets: List - List of filtered tweets
+        filtered_tweets: Union[List, TweetStore] - Filtered tweets, of the same type as `tweets`
     """
-    start_date = datetime.strptime(start_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
-        
+    start_date = parse_date_bound(start_date, tz)
+
     if end_date is None:
         end_date = start_date + timedelta(days=1)
     else:
-     end_date = datetime.strptime(end_date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
-    
+        end_date = parse_date_bound(end_date, tz, end=True)
+
+    if isinstance(tweets, TweetStore):
+        return tweets.between(math.ceil(start_date.timestamp()), math.floor(end_date.timestamp()))
+
     filtered_tweets = [
             tweet for tweet in tweets
             if start_date <=parse_tweet_date(tweet)<= end_date
@@ -99,15 +321,27 @@ def divide_tweets_by_period(tweets: List, period_days: int) -> List:
     return sections
     
 
-def divide_tweets_by_period_text(tweets: List[Dict], period_days: int) -> List[str]:
+def divide_tweet_texts_by_period(tweets: Union[List[Dict], TweetStore], period_days: int, epoch: Optional[int] = PERIOD_EPOCH,
+                                 select: Optional[Callable[[TweetStore, int, int], Iterable[int]]] = None) -> List[List[str]]:
     """
-    Divide tweets into sections by time period and return a list of strings.
+    Divide tweets into sections by time period and return the texts of the tweets of every section.
+    Periods are aligned to `epoch` as in `divide_tweets_by_period_text`.
 
-    :param tweets: List of tweet dictionaries
+    :param tweets: List of tweet dictionaries or a TweetStore
     :param period_days: Number of days for each period
-    :return: List of strings, each containing tweets for the specified period
+    :param epoch: Epoch seconds the periods are aligned to, or None
+    :param select: Called with the store and the [start, end) range of every section, returns the positions of the tweets to keep
+    :return: List of sections, each holding the texts of the tweets of the period in chronological order
     :raises ValueError: If tweets is not a list, period_days is not a positive integer, or tweets are improperly formatted
     """
+    if isinstance(tweets, TweetStore):
+        if not isinstance(period_days, int) or period_days <= 0:
+            raise ValueError("period_days must be a positive integer")
+        bounds = tweets.period_bounds(period_days * 86400, epoch)
+        select = select or (lambda store, start, end: range(start, end))
+        return [[tweets.text(i) for i in select(tweets, start, end)] for start, end in zip(bounds, bounds[1:])]
+    if select is not None:
+        raise ValueError("Selecting tweets requires a TweetStore")
     if not isinstance(tweets, list):
         raise ValueError("tweets must be a list")
     if not all(isinstance(tweet, dict) and 'created_at' in tweet and 'text' in tweet for tweet in tweets):
@@ -126,21 +360,106 @@ def divide_tweets_by_period_text(tweets: List[Dict], period_days: int) -> List[s
     # Initialize variables
     sections = []
     current_section = []
-    current_period_start = parse_tweet_date(sorted_tweets[0])
     period_timedelta = timedelta(days=period_days)
 
+    def period_start(tweet_date):
+        if epoch is None:
+            return tweet_date
+        epoch_date = datetime.fromtimestamp(epoch, tz=timezone.utc)
+        return tweet_date - (tweet_date - epoch_date) % period_timedelta
+
+    current_period_start = period_start(parse_tweet_date(sorted_tweets[0]))
+
     # Iterate through sorted tweets and divide them into sections
     for tweet in sorted_tweets:
         tweet_date = parse_tweet_date(tweet)
         if tweet_date < current_period_start + period_timedelta:
             current_section.append(tweet['text'])
         else:
-            sections.append("\n".join(current_section))
+            sections.append(current_section)
             current_section = [tweet['text']]
-            current_period_start = tweet_date
+            current_period_start = period_start(tweet_date)
 
     # Append the last section
     if current_section:
-        sections.append("\n".join(current_section))
+        sections.append(current_section)
+
+    return sections
+
+def divide_tweets_by_period_text(tweets: Union[List[Dict], TweetStore], period_days: int, epoch: Optional[int] = PERIOD_EPOCH,
+                                 preprocessor: Optional[TextPreprocessor] = None,
+                                 select: Optional[Callable[[TweetStore, int, int], Iterable[int]]] = None) -> List[str]:
+    """
+    Divide tweets into sections by time period and return a list of strings.
+    Periods are aligned to `epoch`, so the sections of unchanged periods keep the same text (and cached rating)
+    when tweets are appended or the date window moves. With `epoch=None`, each period starts at its first tweet.
+    A TweetStore is already sorted, so without a preprocessor each section is a single slice of its text arena.
+    With a preprocessor, the tweets of every section are normalized and deduplicated first, and sections left
+    without any tweet are skipped. With `select`, only the tweets it returns are kept in every section of a TweetStore.
+
+    :param tweets: List of tweet dictionaries or a TweetStore
+    :param period_days: Number of days for each period
+    :param epoch: Epoch seconds the periods are aligned to, or None
+    :param preprocessor: Rules applied to the tweets of every section, or None to keep them as exported
+    :param select: Called with the store and the [start, end) range of every section, returns the positions of the tweets to keep
+    :return: List of strings, each containing tweets for the specified period
+    :raises ValueError: If tweets is not a list, period_days is not a positive integer, or tweets are improperly formatted
+    """
+    if isinstance(tweets, TweetStore):
+        return [section["text"] for section in period_sections(tweets, period_days, epoch, preprocessor, select)]
+    if preprocessor is not None:
+        sections = (preprocessor.period_text(texts) for texts in divide_tweet_texts_by_period(tweets, period_days, epoch))
+        return [section for section in sections if section]
+    if select is not None:
+        raise ValueError("Selecting tweets requires a TweetStore")
+    return ["\n".join(section) for section in divide_tweet_texts_by_period(tweets, period_days, epoch)]
 
+def period_sections(tweets: TweetStore, period_days: int, epoch: Optional[int] = PERIOD_EPOCH,
+                    preprocessor: Optional[TextPreprocessor] = None,
+                    select: Optional[Callable[[TweetStore, int, int], Iterable[int]]] = None,
+                    lines: bool = False) -> List[Dict]:
+    """
+    Same as `divide_tweets_by_period_text` for a TweetStore, keeping the time span and the size of every section.
+
+    :param tweets: The tweets to divide
+    :param period_days: Number of days for each period
+    :param epoch: Epoch seconds the periods are aligned to, or None
+    :param preprocessor: Rules applied to the tweets of every section, or None to keep them as exported
+    :param select: Called with the store and the [start, end) range of every section, returns the positions of the tweets to keep
+    :param lines: Whether to also keep the time span and number of tweets of every line of the text of a section
+    :return: List of sections with their 'text', the timestamps of their first and last tweets ('start', 'end'),
+        and their number of tweets before selection and preprocessing ('tweets'). With `lines`, 'line_starts',
+        'line_ends' and 'line_tweets' hold the timestamps of the first and last tweets behind every line of the text
+        and their number (counted on the first line of a tweet that spans several lines)
+    :raises ValueError: If period_days is not a positive integer
+    """
+    if not isinstance(period_days, int) or period_days <= 0:
+        raise ValueError("period_days must be a positive integer")
+    bounds = tweets.period_bounds(period_days * 86400, epoch)
+    sections = []
+    for start, end in zip(bounds, bounds[1:]):
+        if not lines and preprocessor is None and select is None:
+            text = tweets.joined_text(start, end)
+            sections.append({"text": text, "start": tweets.timestamps[start], "end": tweets.timestamps[end - 1], "tweets": end - start})
+            continue
+        positions = list(select(tweets, start, end) if select else range(start, end))
+        texts = [tweets.text(i) for i in positions]
+        if preprocessor is not None:
+            entries = [(line, [positions[j] for j in sources]) for line, sources in preprocessor.period_lines(texts)]
+        else:
+            entries = [(text, [i]) for text, i in zip(texts, positions)]
+        text = "\n".join(line for line, _ in entries)
+        if not text and (preprocessor is not None or select is not None):
+            continue
+        section = {"text": text, "start": tweets.timestamps[start], "end": tweets.timestamps[end - 1], "tweets": end - start}
+        if lines:
+            line_starts, line_ends, line_tweets = array("q"), array("q"), array("q")
+            for line, sources in entries:
+                timestamps = [tweets.timestamps[i] for i in sources]
+                for k in range(line.count("\n") + 1):
+                    line_starts.append(min(timestamps))
+                    line_ends.append(max(timestamps))
+                    line_tweets.append(len(sources) if k == 0 else 0)
+            section.update(line_starts=line_starts, line_ends=line_ends, line_tweets=line_tweets)
+        sections.append(section)
     return sections
@@ -0,0 +1,236 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds of the histogram buckets, in seconds.
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(_labels(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        # Per label set: the count of every bucket (not cumulative), then the sum and count of the observations.
+        self._values: Dict[Labels, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = _labels(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("xcompass_stage_seconds", "Time spent in each processing stage.")
+LLM_QUEUE_WAIT_SECONDS = Histogram("xcompass_llm_queue_wait_seconds", "Time an LLM request waited for a slot, worker or rate-limit budget.")
+LLM_CALL_SECONDS = Histogram("xcompass_llm_call_seconds", "Latency of LLM calls.")
+LLM_CALLS = Counter("xcompass_llm_calls_total", "LLM calls by outcome.")
+LLM_PROMPT_TOKENS = Counter("xcompass_llm_prompt_tokens_total", "Prompt tokens sent to the LLM.")
+LLM_COMPLETION_TOKENS = Counter("xcompass_llm_completion_tokens_total", "Completion tokens returned by the LLM.")
+LLM_INVALID_REPLIES = Counter("xcompass_llm_invalid_replies_total", "LLM replies that could not be parsed or validated.")
+LLM_RETRIES = Counter("xcompass_llm_retries_total", "Rating requests sent again after an invalid or failed reply.")
+LLM_FALLBACKS = Counter("xcompass_llm_fallbacks_total", "Chunks that fell back to a (0, 0) rating after every attempt failed.")
+RATING_CACHE_HITS = Counter("xcompass_rating_cache_hits_total", "Chunk and period ratings served from the rating cache.")
+TWEETS_PARSED = Counter("xcompass_tweets_parsed_total", "Tweets parsed from uploaded or loaded archives.")
+SNAPSHOT_HITS = Counter("xcompass_snapshot_hits_total", "Uploaded or loaded archives mapped from a snapshot instead of parsed.")
+
+METRICS = (
+    STAGE_SECONDS, LLM_QUEUE_WAIT_SECONDS, LLM_CALL_SECONDS, LLM_CALLS, LLM_PROMPT_TOKENS, LLM_COMPLETION_TOKENS,
+    LLM_INVALID_REPLIES, LLM_RETRIES, LLM_FALLBACKS, RATING_CACHE_HITS, TWEETS_PARSED, SNAPSHOT_HITS,
+)
+
+
+def render_metrics() -> str:
+    """
+    Renders every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """
+    Summary of the work done for one job: time per stage and LLM usage.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, float] = {}
+        self.llm_calls = 0
+        self.llm_errors = 0
+        self.llm_seconds = 0.0
+        self.queue_wait_seconds = 0.0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.invalid_replies = 0
+        self.retries = 0
+        self.fallbacks = 0
+        self.cache_hits = 0
+
+    def add(self, **amounts: float):
+        with self._lock:
+            for name, amount in amounts.items():
+                setattr(self, name, getattr(self, name) + amount)
+
+    def add_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "stages": dict(self.stages),
+                "llm_calls": self.llm_calls,
+                "llm_errors": self.llm_errors,
+                "llm_seconds": self.llm_seconds,
+                "queue_wait_seconds": self.queue_wait_seconds,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "invalid_replies": self.invalid_replies,
+                "retries": self.retries,
+                "fallbacks": self.fallbacks,
+                "cache_hits": self.cache_hits,
+            }
+
+
+# Trace of the job being run in the current context, if any. Worker threads receive it through copied contexts.
+current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+
+def _trace_add(**amounts: float):
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(**amounts)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Times a processing stage, e.g. `with stage("chunking"): ...`.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        STAGE_SECONDS.observe(seconds, stage=name)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add_stage(name, seconds)
+
+
+class LLMCall:
+    """
+    Records one LLM call, from the moment it leaves the queue to the reply.
+    """
+
+    def __init__(self, provider: str, kind: str, queued: Optional[float] = None):
+        self.provider = provider
+        self.kind = kind
+        self.queued = queued
+        self.started = 0.0
+
+    def __enter__(self) -> "LLMCall":
+        self.started = time.perf_counter()
+        if self.queued is not None:
+            wait = self.started - self.queued
+            LLM_QUEUE_WAIT_SECONDS.observe(wait, provider=self.provider)
+            _trace_add(queue_wait_seconds=wait)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.started
+        outcome = "ok" if exc_type is None else "error"
+        LLM_CALL_SECONDS.observe(seconds, provider=self.provider, kind=self.kind)
+        LLM_CALLS.inc(provider=self.provider, kind=self.kind, outcome=outcome)
+        _trace_add(llm_calls=1, llm_seconds=seconds, llm_errors=int(exc_type is not None))
+        return False
+
+    def usage(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]):
+        if prompt_tokens:
+            LLM_PROMPT_TOKENS.inc(prompt_tokens, provider=self.provider, kind=self.kind)
+            _trace_add(prompt_tokens=prompt_tokens)
+        if completion_tokens:
+            LLM_COMPLETION_TOKENS.inc(completion_tokens, provider=self.provider, kind=self.kind)
+            _trace_add(completion_tokens=completion_tokens)
+
+
+def record_invalid_reply(provider: str, kind: str):
+    LLM_INVALID_REPLIES.inc(provider=provider, kind=kind)
+    _trace_add(invalid_replies=1)
+
+
+def record_retry(provider: str):
+    LLM_RETRIES.inc(provider=provider)
+    _trace_add(retries=1)
+
+
+def record_fallback(provider: str):
+    LLM_FALLBACKS.inc(provider=provider)
+    _trace_add(fallbacks=1)
+
+
+def record_cache_hits(count: int, level: str):
+    if count:
+        RATING_CACHE_HITS.inc(count, level=level)
+        _trace_add(cache_hits=count)
@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from .metric import RatingProgress
+from .instrumentation import Trace, current_trace
+
+# Job states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+CANCELLED = "cancelled"
+FINISHED = (DONE, ERROR, CANCELLED)
+
+
+class Job(RatingProgress):
+    """
+    A coordinate computation running in the background.
+    Every update is recorded as a numbered event so that clients can follow the job over Server-Sent Events,
+    reconnect without losing anything, and fetch the result after the job has finished.
+    """
+
+    def __init__(self, word: str, combine: Callable[[List[Tuple[int, int]]], List[int]], session_id: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.word = word
+        # Only the session that started the job can follow, fetch or cancel it.
+        self.session_id = session_id
+        self.status = PENDING
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.events: List[Dict] = []
+        self.task: Optional[asyncio.Task] = None
+        # Time per stage and LLM usage of the job, filled in by the instrumentation while it runs.
+        self.trace = Trace()
+        self._combine = combine
+        self._changed = asyncio.Event()
+        self._chunk_counts: List[int] = []
+        self._chunk_ratings: List[List[Tuple[int, int]]] = []
+        self._period_ratings: List[Optional[List[int]]] = []
+        self.done = 0
+        self.total = 0
+
+    def publish(self, event: str, data: Dict):
+        self.events.append({"id": len(self.events), "event": event, "data": data})
+        # Wake up every listener waiting on the current event, then arm a fresh one.
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def start(self, chunk_counts: List[int]):
+        self._chunk_counts = chunk_counts
+        self._chunk_ratings = [[] for _ in chunk_counts]
+        self._period_ratings = [None for _ in chunk_counts]
+        self.total = sum(chunk_counts)
+        self.publish("started", {"total": self.total, "periods": len(chunk_counts)})
+
+    def chunk_done(self, text_index: int, rating: Tuple[int, int], chunk_index: Optional[int] = None):
+        self.done += 1
+        self._chunk_ratings[text_index].append(rating)
+        # Provisional rating of the period from the chunks rated so far.
+        self._period_ratings[text_index] = self._combine(self._chunk_ratings[text_index])
+        self.publish("progress", {
+            "done": self.done,
+            "total": self.total,
+            "period": text_index,
+            "chunk": chunk_index,
+            "period_complete": len(self._chunk_ratings[text_index]) == self._chunk_counts[text_index],
+            "rating": list(rating),
+            "running_mean": self.running_mean(),
+        })
+
+    def text_cached(self, text_index: int, rating: List[int]):
+        self._period_ratings[text_index] = rating
+
+    def estimate(self, mean: List[float], half_width: Optional[List[float]], rated: int):
+        self.publish("estimate", {"mean": mean, "confidence_interval": half_width, "rated": rated})
+
+    def running_mean(self) -> Optional[List[float]]:
+        """
+        Mean of the (possibly provisional) ratings of every period with at least one rated chunk.
+        """
+        rated = [rating for rating in self._period_ratings if rating is not None]
+        if not rated:
+            return None
+        return [sum(r[0] for r in rated) / len(rated), sum(r[1] for r in rated) / len(rated)]
+
+    def summary(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "word": self.word,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "running_mean": self.running_mean(),
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "trace": self.trace.summary(),
+        }
+
+    async def stream(self, after: int = -1) -> AsyncIterator[Dict]:
+        """
+        Yields the events with an id greater than `after`, waiting for new ones until the job has finished.
+        """
+        position = after + 1
+        while True:
+            changed = self._changed
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.status in FINISHED:
+                return
+            await changed.wait()
+
+
+class JobManager:
+    """
+    Keeps track of the running jobs and of the last `max_finished` finished ones.
+    """
+
+    def __init__(self, max_finished: int = 100):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def submit(self, job: Job, work: Callable[[Job], Awaitable[Dict]]) -> Job:
+        """
+        Starts running `work(job)` in the background and registers the job.
+        """
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, work))
+        job.task.add_done_callback(lambda task: self._cancelled_before_start(job, task))
+        self._prune()
+        return job
+
+    @staticmethod
+    def _cancelled_before_start(job: Job, task: asyncio.Task):
+        # A task cancelled before its first step never enters _run, so record the cancellation here.
+        if task.cancelled() and job.status not in FINISHED:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            job.publish("cancelled", {})
+
+    async def _run(self, job: Job, work: Callable[[Job], Awaitable[Dict]]):
+        job.status = RUNNING
+        # The task runs in its own copy of the context, so the trace only collects the work of this job.
+        current_trace.set(job.trace)
+        try:
+            job.result = await work(job)
+            job.status = DONE
+            job.finished_at = time.time()
+            job.publish("done", job.result)
+        except asyncio.CancelledError:
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            job.publish("cancelled", {})
+        except Exception as e:
+            job.error = str(e)
+            job.status = ERROR
+            job.finished_at = time.time()
+            job.publish("error", {"error": job.error})
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.status in FINISHED or job.task is None:
+            return False
+        job.task.cancel()
+        return True
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job_id]
+
+
+def format_sse(event: Dict) -> str:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
@@ -1,11 +1,70 @@
-import llama_cpp
-import llama_cpp.llama_tokenizer
-from groq import Groq
-from typing import List, Union, Optional
-from pydantic import BaseModel
+from typing import List, Union, Optional, Dict, Tuple, TYPE_CHECKING
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
+import asyncio
+import contextvars
+import copy
+import hashlib
+import logging
+import queue
+import random
+import threading
+import time
 import os
 import json
+import math
+from functools import lru_cache
+from .cache import RatingCache, AxisMemo
+from .ratelimit import RateLimiter, parse_duration
+from .sampling import StratifiedSample
+from .instrumentation import LLMCall, stage, record_cache_hits, record_fallback, record_invalid_reply, record_retry
+
+if TYPE_CHECKING:
+    import llama_cpp
+    from groq import Groq, AsyncGroq
+
+logger = logging.getLogger(__name__)
+
+# Provider libraries are imported on first use, so starting the server does not pay for them.
+
+def _import_llama_cpp():
+    import llama_cpp
+    import llama_cpp.llama_tokenizer
+    return llama_cpp
+
+def _import_groq():
+    import groq
+    return groq
+
+# Local paths of the GGUF files already resolved from the hub, by (repo_id, filename).
+_resolved_model_paths: Dict[Tuple[str, str], str] = {}
+
+@lru_cache(maxsize=None)
+def _llama_hf_tokenizer(repo_id: str):
+    # Shared by every instance of the worker pool, and kept across reloads.
+    return _import_llama_cpp().llama_tokenizer.LlamaHFTokenizer.from_pretrained(repo_id)
+
+@lru_cache(maxsize=None)
+def _schema_grammar(schema: str) -> str:
+    # Converting a JSON schema to GBNF is slow Python code, so it is done once per schema. Every request still gets
+    # its own LlamaGrammar, since a grammar carries decoding state and the pool runs several requests at once.
+    return _import_llama_cpp().llama_grammar.json_schema_to_gbnf(schema)
+
+def _run_in_executor(executor: Optional[ThreadPoolExecutor], function, *args):
+    # Unlike asyncio.to_thread, run_in_executor does not copy the context, which carries the job's trace.
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(executor, contextvars.copy_context().run, function, *args)
+
+def _usage_tokens(usage) -> Tuple[Optional[int], Optional[int]]:
+    # llama_cpp returns the usage as a dict, Groq as an object.
+    if usage is None:
+        return None, None
+    if isinstance(usage, dict):
+        return usage.get("prompt_tokens"), usage.get("completion_tokens")
+    return getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None)
 
 class Slang(BaseModel):
     is_internet_slang: bool
@@ -19,16 +78,176 @@ class Word(BaseModel):
     y_negative: str
 
 
+RATING_MIN = -10
+RATING_MAX = 10
+
 class Rating(BaseModel):
-    x_value: int
-    y_value: int
+    x_value: int = Field(ge=RATING_MIN, le=RATING_MAX)
+    y_value: int = Field(ge=RATING_MIN, le=RATING_MAX)
+
+
+class MultiRating(BaseModel):
+    ratings: List[Rating]
+
+GROQ_MODEL = "llama3-8b-8192"
+LLAMA_REPO_ID = "bartowski/Llama-3-Instruct-8B-SPPO-Iter3-GGUF"
+LLAMA_FILENAME = "Llama-3-Instruct-8B-SPPO-Iter3-Q4_K_M.gguf"
+LLAMA_TOKENIZER_REPO_ID = "meta-llama/Meta-Llama-3-8B-Instruct"
+
+LLAMA_N_CTX = 4096
+GROQ_CONTEXT = 8192
+# Tokens reserved for the model's reply when packing chunks.
+RATING_OUTPUT_TOKENS = 256
+# Tokens added by the chat template around the system and user messages.
+CHAT_TEMPLATE_TOKENS = 32
+# Conservative characters-per-token estimate for providers without a local tokenizer.
+CHARS_PER_TOKEN = 3.0
+# Fraction of the chunk budget used, since per-tweet token counts can slightly undercount the joined text.
+TOKEN_MARGIN = 0.97
+TOKEN_COUNT_CACHE_SIZE = 200_000
+# Reply tokens allowed for a schema-constrained reply: a Rating object is about 20 tokens, a Word object about 80.
+RATING_REPLY_TOKENS = 32
+WORDS_REPLY_TOKENS = 256
+# Times a request rejected for rate limiting is queued again, after the retry-after the provider asked for.
+RATE_LIMIT_RETRIES = 5
+# Extra reply tokens reserved for every additional word rated in the same request.
+RATING_OUTPUT_TOKENS_PER_WORD = 24
+# Largest number of words rated together in one request; bigger batches are split.
+MAX_BATCH_WORDS = 8
+# Schemas enforced on the replies: a grammar for llama_cpp, a JSON schema response format for Groq.
+RATING_SCHEMA = Rating.model_json_schema()
+WORD_SCHEMA = Word.model_json_schema()
+
+@lru_cache(maxsize=None)
+def _multi_rating_schema(count: int) -> Dict:
+    # MultiRating with the number of ratings fixed, so the model cannot stop early or add planes.
+    schema = copy.deepcopy(MultiRating.model_json_schema())
+    schema["properties"]["ratings"].update(minItems=count, maxItems=count)
+    return schema
+
+ATTRIBUTE_KEYS = ("x_aspect", "x_positive", "x_negative", "y_aspect", "y_positive", "y_negative")
+# Part of every rating cache key together with the text of the rating prompts. Bump it when ratings change in a way the
+# prompts do not show, e.g. how chunk ratings are combined into the rating of a period.
+RATING_PROMPT_VERSION = 1
+# Returned for a chunk that could not be rated. Compared by identity, so a genuine (0, 0) rating is not mistaken for it.
+FALLBACK_RATING = (0, 0)
+
+class RatingProgress:
+    """
+    Receives progress updates from `Model.rate_texts`. The default implementation ignores them.
+    """
+
+    def start(self, chunk_counts: List[int]):
+        """Called once before rating starts, with the number of chunks of every text."""
+
+    def chunk_lines(self, lines: List[List[Tuple[int, int]]]):
+        """Called before `start` with the first and last line (both inclusive) of every chunk of every text."""
+
+    def chunk_done(self, text_index: int, rating: Tuple[int, int], chunk_index: Optional[int] = None):
+        """Called on the event loop each time chunk `chunk_index` of text `text_index` has been rated."""
+
+    def text_cached(self, text_index: int, rating: List[int]):
+        """Called before rating starts for every text whose combined rating was found in the rating cache."""
+
+    def estimate(self, mean: List[float], half_width: Optional[List[float]], rated: int):
+        """Called by `Model.rate_texts_sampled` after every wave with the current estimate and confidence interval."""
+
+
+class LlamaPrefixCache:
+    """
+    LRU of llama_cpp states evaluated up to the shared prefix of the rating prompt (system message and preamble).
+    llama_cpp only evaluates the tokens after the longest common prefix with what is already in its context,
+    so loading one of these states before a rating request skips re-evaluating the prefix. States are kept
+    across jobs, so jobs with the same word and axes reuse them too.
+    """
+
+    def __init__(self, capacity: Optional[int] = None):
+        self.capacity = capacity or int(os.getenv("LLAMA_PREFIX_STATES", 4))
+        self._states: "OrderedDict[str, 'llama_cpp.LlamaState']" = OrderedDict()
+        self._lock = threading.Lock()
+        # Prefix currently held in the context of each instance, by id(instance).
+        self._active: Dict[int, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(prefix_messages: List[Dict]) -> str:
+        return hashlib.sha256(json.dumps(prefix_messages, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def prepare(self, instance: "llama_cpp.Llama", prefix_messages: List[Dict]):
+        """
+        Makes sure the context of `instance` starts with the evaluated prefix. The instance must not be used
+        by another thread while this runs.
+        """
+        key = self.make_key(prefix_messages)
+        if self._active.get(id(instance)) == key:
+            return
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+        if state is None:
+            # Evaluate the prefix once, generating a single throwaway token.
+            instance.create_chat_completion(messages=prefix_messages, max_tokens=1, stream=False)
+            state = instance.save_state()
+            with self._lock:
+                self._states[key] = state
+                while len(self._states) > self.capacity:
+                    self._states.popitem(last=False)
+            self.misses += 1
+        else:
+            instance.load_state(state)
+            self.hits += 1
+        self._active[id(instance)] = key
+
+    def forget(self, instance: "llama_cpp.Llama"):
+        """
+        Marks the context of `instance` as overwritten by a request that does not share the prefix.
+        """
+        self._active.pop(id(instance), None)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+        self._active.clear()
+
 
 class Model:
-    def __init__(self):
-        self.model: Optional[Union[llama_cpp.Llama, Groq, None]] = None
+    def __init__(self, max_concurrency: Optional[int] = None, llama_workers: Optional[int] = None, rating_cache: Optional[RatingCache] = None, axis_memo: Optional[AxisMemo] = None):
+        self.model: Optional[Union["llama_cpp.Llama", "Groq", None]] = None
         self.provider: Optional[str] = None
+        self.model_name: Optional[str] = None
+        # Disk cache of chunk ratings, set RATING_CACHE=0 to disable it.
+        if rating_cache is None and os.getenv("RATING_CACHE", "1") != "0":
+            rating_cache = RatingCache()
+        self.rating_cache = rating_cache
+        self.axis_memo = axis_memo if axis_memo is not None else AxisMemo()
+        self.async_model: Optional["AsyncGroq"] = None
+        # Requests and tokens per minute budget shared by every Groq call of this model.
+        self.rate_limiter: Optional[RateLimiter] = None
+        # Number of in-flight Groq requests allowed at once.
+        self.max_concurrency = max_concurrency or int(os.getenv("GROQ_CONCURRENCY", 8))
+        # Number of llama_cpp instances (each with its own context) in the worker pool.
+        self.llama_workers = llama_workers or int(os.getenv("LLAMA_WORKERS", 1))
+        # Ask Groq for schema-enforced output. Turned off for the session if the model does not support it,
+        # or with GROQ_JSON_SCHEMA=0, in which case replies are only requested as JSON objects.
+        self.groq_json_schema = os.getenv("GROQ_JSON_SCHEMA", "1") != "0"
+        self._llama_pool: Optional[queue.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._token_counts: Dict[str, int] = {}
+        self.prefix_cache = LlamaPrefixCache()
+        self.prompt_version = self._prompt_version()
+        # Provider whose client is loaded in `model`.
+        self._backend: Optional[str] = None
+
+    def _is_llama(self) -> bool:
+        # The mock provider implements the llama_cpp.Llama interface and runs through the same code path.
+        return self.model is not None and self._backend in ("llama_cpp", "mock")
 
-    def load_model(self) -> Union[llama_cpp.Llama, Groq, None]:
+    def _is_groq(self) -> bool:
+        return self.model is not None and self._backend == "groq"
+
+    def load_model(self) -> Union["llama_cpp.Llama", "Groq", None]:
         """
         This function loads the model based on the provider specified.
         The model is stored in the class attribute `model`.
@@ -42,6 +261,12 @@ class Model:
         model_options = {
             "llama_cpp": self._load_llama_cpp,
             "groq": self._load_groq,
+            "mock": self._load_mock,
+        }
+        model_names = {
+            "llama_cpp": os.getenv("LLAMA_MODEL_PATH") or f"{LLAMA_REPO_ID}/{LLAMA_FILENAME}",
+            "groq": GROQ_MODEL,
+            "mock": "mock",
         }
 
         model_loader = model_options.get(self.provider)
@@ -49,58 +274,253 @@ class Model:
             raise ValueError(f"Unsupported provider: {self.provider}")
 
         self.model = model_loader()
+        self.model_name = model_names[self.provider]
+        self._backend = self.provider
+        self._start_workers()
         return self.model
 
+    async def aload_model(self) -> Union["llama_cpp.Llama", "Groq", None]:
+        """
+        Async counterpart of `load_model`. Downloading and loading the model runs in a worker thread,
+        so other requests are served in the meantime.
+        """
+        return await _run_in_executor(None, self.load_model)
+
+    def _start_workers(self):
+        """
+        Sets up the concurrency primitives for the loaded provider.
+        llama_cpp gets a pool of `llama_workers` instances, since a single Llama context can only decode one
+        request at a time. Groq gets an async client next to the sync one so chunks can be fanned out.
+        """
+        self._shutdown_workers()
+        if self._is_llama():
+            self._llama_pool = queue.Queue()
+            self._llama_pool.put(self.model)
+            load_instance = self._load_mock if self._backend == "mock" else self._load_llama_cpp
+            for _ in range(self.llama_workers - 1):
+                self._llama_pool.put(load_instance())
+            self._executor = ThreadPoolExecutor(max_workers=self.llama_workers, thread_name_prefix="llama")
+        elif self._is_groq():
+            # Rate limits are handled by the limiter, which queues requests instead of letting the client retry them.
+            self.async_model = _import_groq().AsyncGroq(api_key=self.model.api_key, base_url=os.getenv("GROQ_BASE_URL"), max_retries=0)
+            self.rate_limiter = RateLimiter()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="groq")
+
+    @contextmanager
+    def _llama_instance(self):
+        """
+        Checks a Llama instance out of the worker pool for exclusive use, since a context cannot decode two requests at once.
+        """
+        pool = self._llama_pool
+        if pool is None:
+            yield self.model
+            return
+        instance = pool.get()
+        try:
+            yield instance
+        finally:
+            pool.put(instance)
+
+    def _shutdown_workers(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self._executor = None
+        self._llama_pool = None
+        self.async_model = None
+        self.rate_limiter = None
+        self._token_counts = {}
+        self.prefix_cache.clear()
+
     def _load_llama_cpp(self):
-        return llama_cpp.Llama.from_pretrained(
-            repo_id="bartowski/Llama-3-Instruct-8B-SPPO-Iter3-GGUF",
-            filename="Llama-3-Instruct-8B-SPPO-Iter3-Q4_K_M.gguf",
-            tokenizer=llama_cpp.llama_tokenizer.LlamaHFTokenizer.from_pretrained("meta-llama/Meta-Llama-3-8B-Instruct"),
-            n_ctx=4096,
+        """
+        Loads the GGUF from LLAMA_MODEL_PATH if set, otherwise from the hub. The hub file is resolved once
+        per process and later loads open the downloaded file directly.
+        """
+        llama_cpp = _import_llama_cpp()
+        options = dict(
+            tokenizer=_llama_hf_tokenizer(LLAMA_TOKENIZER_REPO_ID),
+            n_ctx=LLAMA_N_CTX,
             n_gpu_layers=-1,
             verbose=False,
             temperature=0.2
         )
+        model_path = os.getenv("LLAMA_MODEL_PATH") or _resolved_model_paths.get((LLAMA_REPO_ID, LLAMA_FILENAME))
+        if model_path:
+            return llama_cpp.Llama(model_path=model_path, **options)
+        model = llama_cpp.Llama.from_pretrained(
+            repo_id=LLAMA_REPO_ID,
+            filename=LLAMA_FILENAME,
+            **options
+        )
+        _resolved_model_paths[(LLAMA_REPO_ID, LLAMA_FILENAME)] = model.model_path
+        return model
+
+    def _load_mock(self):
+        """
+        Deterministic offline model for benchmarks and development, configured with the MOCK_* environment variables.
+        """
+        from .mock import MockLlama
+        return MockLlama()
 
     def _load_groq(self):
         load_dotenv()
-        return Groq(api_key=os.getenv("API_KEY"), max_retries=5)
+        # GROQ_BASE_URL points the client at another server, e.g. a local stub.
+        return _import_groq().Groq(api_key=os.getenv("API_KEY"), base_url=os.getenv("GROQ_BASE_URL"), max_retries=0)
 
     def unload_model(self):
+        self._shutdown_workers()
         self.model = None
         self.provider = None
+        self.model_name = None
+        self._backend = None
 
-    def chunk_text(self, text: str, max_chars: int = 12000, overlap: int = 100):
-        words = text.split()
+    def count_tokens(self, text: str, cache: bool = True) -> int:
+        """
+        Counts the tokens of a text with the loaded llama_cpp tokenizer, or estimates them from its length
+        for remote providers. Counts are cached per text unless `cache` is False, e.g. for whole chunks.
+        """
+        count = self._token_counts.get(text) if cache else None
+        if count is None:
+            if self._is_llama():
+                count = len(self.model.tokenize(text.encode("utf-8"), add_bos=False, special=False))
+            else:
+                count = math.ceil(len(text) / CHARS_PER_TOKEN)
+            if not cache:
+                return count
+            if len(self._token_counts) >= TOKEN_COUNT_CACHE_SIZE:
+                self._token_counts.clear()
+            self._token_counts[text] = count
+        return count
+
+    def context_window(self) -> int:
+        if self._is_llama():
+            return self.model.n_ctx()
+        return GROQ_CONTEXT
+
+    def chunk_budget(self, system: Dict, prompt: str, output_tokens: int = RATING_OUTPUT_TOKENS) -> int:
+        """
+        Number of tweet tokens that fit in one rating request next to the system message, the prompt and the reply.
+        """
+        overhead = self.count_tokens(system["content"]) + self.count_tokens(prompt) + CHAT_TEMPLATE_TOKENS + output_tokens
+        budget = int((self.context_window() - overhead) * TOKEN_MARGIN)
+        if budget <= 0:
+            raise ValueError(f"The rating prompt does not fit in the context window of {self.context_window()} tokens")
+        return budget
+
+    def chunk_text(self, text: str, max_tokens: int) -> List[str]:
+        """
+        Packs the newline-separated tweets of a text into as few chunks as possible, each at most `max_tokens` tokens.
+        Tweets are never split unless a single tweet is longer than a whole chunk, in which case it is split on words.
+        ----------
+        Args:
+            text (str): The compiled tweets, one per line
+            max_tokens (int): The token budget of a chunk
+        Returns:
+            List[str]: The chunks, with tweets still separated by newlines
+        """
+        return [chunk for chunk, _, _ in self.chunk_lines(text, max_tokens)]
+
+    def chunk_lines(self, text: str, max_tokens: int) -> List[Tuple[str, int, int]]:
+        """
+        Same as `chunk_text`, with the first and last line of `text` (both inclusive) in every chunk.
+        A line split across chunks is the last line of one chunk and the first line of the next.
+        """
         chunks = []
         current_chunk = []
-        current_length = 0
-
-        for word in words:
-            if current_length + len(word) + 1 > max_chars and current_chunk:
-                chunks.append(' '.join(current_chunk))
-                overlap_words = current_chunk[-overlap:]
-                current_chunk = overlap_words
-                current_length = sum(len(w) + 1 for w in overlap_words) - 1
+        current_tokens = 0
+        first_line = 0
 
-            current_chunk.append(word)
-            current_length += len(word) + 1
+        for line, tweet in enumerate(text.split("\n")):
+            tokens = self.count_tokens(tweet) + 1  # including the newline separator
+            if tokens > max_tokens:
+                pieces = self._split_long_tweet(tweet, max_tokens)
+            else:
+                pieces = [(tweet, tokens)]
+            for piece, piece_tokens in pieces:
+                if current_chunk and current_tokens + piece_tokens > max_tokens:
+                    chunks.append(("\n".join(current_chunk), first_line, last_line))
+                    current_chunk = []
+                    current_tokens = 0
+                    first_line = line
+                current_chunk.append(piece)
+                current_tokens += piece_tokens
+                last_line = line
 
         if current_chunk:
-            chunks.append(' '.join(current_chunk))
+            chunks.append(("\n".join(current_chunk), first_line, last_line))
 
         return chunks
 
+    def _split_long_tweet(self, tweet: str, max_tokens: int) -> List[Tuple[str, int]]:
+        pieces = []
+        words = []
+        tokens = 1
+        for word in tweet.split():
+            word_tokens = self.count_tokens(" " + word)
+            if words and tokens + word_tokens > max_tokens:
+                pieces.append((" ".join(words), tokens))
+                words = []
+                tokens = 1
+            words.append(word)
+            tokens += word_tokens
+        if words:
+            pieces.append((" ".join(words), tokens))
+        return pieces
+
     def create_words(self, word: str):
         """
         This function generates the aspects of a word that can be put on a cartesian plane.
         The aspects are returned in a JSON format.
+        Pinned or previously generated aspects for the word, provider and model are reused from the axis memo.
         ----------
         Args:
             word (str): The word for which aspects are to be generated.
         Returns:
             dict: The aspects of the word in JSON format.
         """
+        memoized = self.axis_memo.get(word, self.provider or "", self.model_name or "")
+        if memoized is not None:
+            return memoized
+        return self._memoize_words(word, self._generate_words(word))
+
+    async def acreate_words(self, word: str):
+        """
+        Async counterpart of `create_words`. The LLM call runs on the async Groq client or the llama_cpp
+        inference executor, so the event loop is never blocked.
+        """
+        memoized = self.axis_memo.get(word, self.provider or "", self.model_name or "")
+        if memoized is not None:
+            return memoized
+        if self._is_groq() and self.async_model is not None:
+            content = await self._agroq_completion(self._words_messages(word), WORDS_REPLY_TOKENS, "words", schema=WORD_SCHEMA)
+            attributes = self._parse_words(content)
+        else:
+            attributes = await _run_in_executor(self._executor, self._generate_words, word)
+        return self._memoize_words(word, attributes)
+
+    @staticmethod
+    def _parse_words(content: str) -> Dict[str, str]:
+        """
+        Parses and validates the JSON axes returned by the model.
+        Without schema enforcement, some models wrap the object in the "properties" of the schema shown in the prompt.
+        ----------
+        Raises:
+            json.JSONDecodeError: If the output is not JSON.
+            ValueError: If the output does not hold every attribute of `Word`.
+        """
+        values = json.loads(content)
+        if isinstance(values, dict) and isinstance(values.get("properties"), dict):
+            values = values["properties"]
+        return Word.model_validate(values).model_dump()
+
+    def _memoize_words(self, word: str, attributes: Dict) -> Dict:
+        # Only memoize well-formed axes, so a bad generation is not reused.
+        Word.model_validate(attributes)
+        self.axis_memo.put(word, self.provider or "", self.model_name or "", attributes)
+        return attributes
+
+    @staticmethod
+    def _words_messages(word: str) -> List[Dict]:
         prompt = f"""You are given the word {word}. You must define the aspects of the word that can be put on a cartesian plane. Return the output in JSON format.
                          """
         messages = [
@@ -114,24 +534,26 @@ class Model:
                         "content": prompt
                     }
                 ]
-        response_format={"type": "json_object"}
-        if isinstance(self.model, llama_cpp.Llama):
-            response = self.model.create_chat_completion(
-                messages = messages,
-                response_format=response_format,
-                stream=False,
-            )
+        return messages
+
+    def _generate_words(self, word: str):
+        messages = self._words_messages(word)
+        if self._is_llama():
+            queued = time.perf_counter()
+            with self._llama_instance() as instance:
+                self.prefix_cache.forget(instance)
+                with LLMCall(self.provider, "words", queued) as call:
+                    response = instance.create_chat_completion(
+                        messages = messages,
+                        max_tokens=WORDS_REPLY_TOKENS,
+                        stream=False,
+                        **self._structured_output(WORD_SCHEMA),
+                    )
+                    call.usage(*_usage_tokens(response.get("usage")))
             
-            return json.loads(response["choices"][0]["message"]["content"])['properties']
-        elif isinstance(self.model, Groq):
-            response = self.model.chat.completions.create(
-                messages = messages,
-                model="llama3-8b-8192",
-                temperature=0.2,
-                stream=False,
-                response_format=response_format,
-            )
-            return json.loads(response.choices[0].message.content)['properties']
+            return self._parse_words(response["choices"][0]["message"]["content"])
+        elif self._is_groq():
+            return self._parse_words(self._groq_completion(messages, WORDS_REPLY_TOKENS, "words", schema=WORD_SCHEMA))
         else:
             raise ValueError(f"Model undefined : {type(self.model)}")
             
@@ -143,9 +565,318 @@ class Model:
         new_range = new_max - new_min
         return (((value - old_min) * new_range) / old_range) + new_min
 
+    def _rating_messages(self, word: str, x_aspect: str, x_positive: str, x_negative: str, y_aspect: str, y_positive: str, y_negative: str) -> Tuple[Dict, str]:
+        """
+        Builds the system message and the user prompt preamble for a rating request.
+        The tweet chunk is appended to the returned prompt, so everything before it is byte-identical
+        for all chunks rated against the same word and axes.
+        """
+        min_value, max_value = RATING_MIN, RATING_MAX
+        prompt = f"""You are a social media analyst. You are provided with a compiled list of tweets from a user and a cartesian plane and where each axis corresponds to an aspect of the main factor {word}.
+        The X aspect is "{x_aspect}" and the positive X axis is the factor {x_positive}, and the negative X axis is the factor {x_negative}
+        The Y aspect is "{y_aspect}" and the positive Y axis is the factor {y_positive}, and the negative Y axis is the factor {y_negative}.
+        Your job is to provide a coordinate for the combined tweets on the cartesian plane based on the factors provided.
+        Be creative with your ratings and be genuine. Provide the rating in JSON format.
+        Here are the tweets:
+        """.rstrip(" ")  # End the preamble on a newline so the tokens before the chunk do not depend on it.
+        system = {
+                    "role": "system",
+                    "content": f"""You are a social media analyst. You are provided with a compiled list of tweets from a user and a cartesian plane on which the tweets are to be ranked based on some defined factors.
+                    Each axis corresponds to an aspect of the tweet, and has two types of factors, positive and negative.
+                    Hence there is the x-axis with the factors x_positive and x_negative and the y-axis with the factors y_positive and y_negative.
+                    Your job is to provide a rating of the collected tweets, which will be a coordinate for the combined tweets on the cartesian plane.
+                    You will do this by evaluating the tweets and providing a rating for the bunch of tweets based on the factors provided.
+                    If a tweet is more positive towards the x_positive factor, you will rate it higher on the x-axis, and if it is more negative towards the x_negative factor, you will rate it lower on the x-axis.
+                    The X score is called x_value and the Y score is called y_value.
+                    The same goes for the y-axis.
+                    Each tweet is separated by a new line.
+                    The range for the X and Y axis is from {min_value} to {max_value}. Please provide a value for the text based on what you feel about the text.
+                    Provide your answer in JSON format.
+                    """
+                    f"The JSON object must use the schema: {json.dumps(Rating.model_json_schema(), indent=2)}",
+                }
+        return system, prompt
+
+    def _rating_chunks(self, text: str, system: Dict, prompt: str) -> List[Tuple[str, int, int]]:
+        return self.chunk_lines(text, self.chunk_budget(system, prompt))
+
+    @staticmethod
+    def _parse_rating(values_str: str) -> Tuple[int, int]:
+        """
+        Parses and validates the JSON rating returned by the model.
+        ----------
+        Raises:
+            json.JSONDecodeError: If the output is not JSON.
+            ValueError: If the output does not hold in-range x_value and y_value.
+        """
+        values = json.loads(values_str)
+        if not isinstance(values, dict) or 'x_value' not in values or 'y_value' not in values:
+            raise ValueError("Invalid response format from model")
+
+        x_value = values["x_value"]
+        y_value = values["y_value"]
+        if not (RATING_MIN <= x_value <= RATING_MAX) or not (RATING_MIN <= y_value <= RATING_MAX):
+            raise ValueError(f"x_value and y_value must be within the range of {RATING_MIN} to {RATING_MAX}")
+        return x_value, y_value
+
+    def _groq_request_tokens(self, messages: List[Dict], max_tokens: int) -> int:
+        return sum(self.count_tokens(message["content"], cache=False) for message in messages) + CHAT_TEMPLATE_TOKENS + max_tokens
+
+    def _structured_output(self, schema: Dict) -> Dict:
+        """
+        Returns the create_chat_completion arguments that constrain a llama_cpp reply to `schema`.
+        """
+        if self._backend == "llama_cpp":
+            return {"grammar": _import_llama_cpp().LlamaGrammar.from_string(_schema_grammar(json.dumps(schema)), verbose=False)}
+        # The mock follows the llama_cpp interface, where the schema of a JSON response format is compiled on each call.
+        return {"response_format": {"type": "json_object", "schema": schema}}
+
+    def _groq_request(self, messages: List[Dict], max_tokens: int, schema: Optional[Dict] = None) -> Dict:
+        if schema is not None and self.groq_json_schema:
+            response_format = {"type": "json_schema", "json_schema": {"name": schema.get("title", "response"), "schema": schema}}
+        else:
+            response_format = {"type": "json_object"}
+        return dict(
+            messages=messages,
+            model=GROQ_MODEL,
+            max_tokens=max_tokens,
+            temperature=0.2,
+            stream=False,
+            response_format=response_format,
+        )
+
+    def _schema_rejected(self, error: Exception, schema: Optional[Dict]) -> bool:
+        """
+        Turns schema-enforced output off if Groq rejected it for the model, and tells whether the request should be sent again.
+        """
+        if schema is None or not self.groq_json_schema or "json_schema" not in str(error):
+            return False
+        logger.warning("Groq model %s does not support schema-enforced output, falling back to JSON objects: %s", GROQ_MODEL, error)
+        self.groq_json_schema = False
+        return True
+
+    def _settle_groq(self, reservation: List, headers, completion, call: LLMCall) -> str:
+        self.rate_limiter.update(headers)
+        usage = getattr(completion, "usage", None)
+        self.rate_limiter.settle(reservation, usage.total_tokens if usage is not None else None)
+        call.usage(*_usage_tokens(usage))
+        return completion.choices[0].message.content
+
+    def _rate_limited_for(self, error: Exception) -> float:
+        """
+        Pauses the rate limiter for the retry-after of a rate-limited response and returns the pause, in seconds.
+        """
+        headers = error.response.headers
+        delay = parse_duration(headers.get("retry-after")) or parse_duration(headers.get("x-ratelimit-reset-tokens")) or 1.0
+        self.rate_limiter.update(headers)
+        self.rate_limiter.pause(delay)
+        return delay
+
+    def _groq_completion(self, messages: List[Dict], max_tokens: int, kind: str = "rating", queued: Optional[float] = None,
+                         schema: Optional[Dict] = None) -> str:
+        """
+        Sends a JSON completion request to Groq within the rate-limit budget and returns the message content.
+        The reply is constrained to `schema` when the model supports it.
+        Requests rejected with a 429 are queued again after the retry-after, up to `RATE_LIMIT_RETRIES` times.
+        The time from `queued` until the request is sent is recorded as queue wait.
+        """
+        groq = _import_groq()
+        tokens = self._groq_request_tokens(messages, max_tokens)
+        queued = queued if queued is not None else time.perf_counter()
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            reservation = self.rate_limiter.reserve(tokens)
+            try:
+                with LLMCall(self.provider, kind, queued) as call:
+                    raw = self.model.chat.completions.with_raw_response.create(**self._groq_request(messages, max_tokens, schema))
+                    return self._settle_groq(reservation, raw.headers, raw.parse(), call)
+            except groq.BadRequestError as e:
+                if attempt == RATE_LIMIT_RETRIES or not self._schema_rejected(e, schema):
+                    raise
+            except groq.RateLimitError as e:
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                self._rate_limited_for(e)
+                record_retry(self.provider)
+                queued = time.perf_counter()
+
+    async def _agroq_completion(self, messages: List[Dict], max_tokens: int, kind: str = "rating", queued: Optional[float] = None,
+                                schema: Optional[Dict] = None) -> str:
+        """
+        Async counterpart of `_groq_completion`, waiting for the budget without blocking the event loop.
+        """
+        groq = _import_groq()
+        tokens = self._groq_request_tokens(messages, max_tokens)
+        queued = queued if queued is not None else time.perf_counter()
+        for attempt in range(RATE_LIMIT_RETRIES + 1):
+            reservation = await self.rate_limiter.areserve(tokens)
+            try:
+                with LLMCall(self.provider, kind, queued) as call:
+                    raw = await self.async_model.chat.completions.with_raw_response.create(**self._groq_request(messages, max_tokens, schema))
+                    return self._settle_groq(reservation, raw.headers, await raw.parse(), call)
+            except groq.BadRequestError as e:
+                if attempt == RATE_LIMIT_RETRIES or not self._schema_rejected(e, schema):
+                    raise
+            except groq.RateLimitError as e:
+                if attempt == RATE_LIMIT_RETRIES:
+                    raise
+                self._rate_limited_for(e)
+                record_retry(self.provider)
+                queued = time.perf_counter()
+
+    def _complete_rating(self, messages: List[Dict], prefix: Optional[List[Dict]] = None, max_tokens: int = RATING_REPLY_TOKENS,
+                         queued: Optional[float] = None, schema: Dict = RATING_SCHEMA) -> str:
+        """
+        Runs a single blocking rating completion and returns the raw message content.
+        llama_cpp requests check an instance out of the worker pool for the duration of the call,
+        and restore the evaluated `prefix` messages from the prefix cache first.
+        The reply is constrained to `schema` and to `max_tokens` tokens, so decoding stops right after the JSON object.
+        Groq requests go through the rate limiter.
+        The time from `queued` (by default, now) until the model starts on the request is recorded as queue wait.
+        """
+        queued = queued if queued is not None else time.perf_counter()
+        if self._is_llama():
+            structured = self._structured_output(schema)
+            with self._llama_instance() as instance:
+                if prefix is not None:
+                    self.prefix_cache.prepare(instance, prefix)
+                with LLMCall(self.provider, "rating", queued) as call:
+                    response = instance.create_chat_completion(
+                        messages=messages,
+                        max_tokens=max_tokens,
+                        stream=False,
+                        **structured,
+                    )
+                    call.usage(*_usage_tokens(response.get("usage")))
+            return response["choices"][0]["message"]["content"]
+        elif self._is_groq():
+            return self._groq_completion(messages, max_tokens, "rating", queued, schema)
+        raise ValueError(f"Model undefined : {type(self.model)}")
+
+    async def _acomplete_rating(self, messages: List[Dict], prefix: Optional[List[Dict]] = None, max_tokens: int = RATING_REPLY_TOKENS,
+                                queued: Optional[float] = None, schema: Dict = RATING_SCHEMA) -> str:
+        """
+        Async counterpart of `_complete_rating`. Groq goes through the async client,
+        llama_cpp is handed to the worker pool so the event loop is never blocked.
+        """
+        if self._is_groq() and self.async_model is not None:
+            return await self._agroq_completion(messages, max_tokens, "rating", queued, schema)
+        return await _run_in_executor(self._executor, self._complete_rating, messages, prefix, max_tokens, queued, schema)
+
+    def _rating_failed(self, attempt: int, error: Exception):
+        # Unparseable or out-of-range replies are counted apart from failed calls, which LLMCall records itself.
+        if isinstance(error, ValueError):
+            record_invalid_reply(self.provider, "rating")
+        logger.warning("Rating attempt %d failed: %s", attempt + 1, error)
+        if attempt == 0:
+            record_retry(self.provider)
+
+    def _rating_fallback(self, count: int = 1):
+        logger.warning("Falling back to (0, 0) for a chunk that could not be rated")
+        for _ in range(count):
+            record_fallback(self.provider)
+
+    def _rate_chunk(self, messages: List[Dict], key: Optional[str] = None, prefix: Optional[List[Dict]] = None) -> Tuple[int, int]:
+        """
+        Rates a single chunk, retrying once. Falls back to (0, 0) if both attempts fail.
+        Successful ratings are stored in the rating cache under `key`.
+        """
+        for retry_count in range(2):  # Try up to 2 times (initial attempt + 1 retry)
+            try:
+                rating = self._parse_rating(self._complete_rating(messages, prefix))
+                self._remember_rating(key, rating)
+                return rating
+            except Exception as e:
+                self._rating_failed(retry_count, e)
+        self._rating_fallback()
+        return FALLBACK_RATING
+
+    async def _arate_chunk(self, messages: List[Dict], semaphore: asyncio.Semaphore, key: Optional[str] = None, prefix: Optional[List[Dict]] = None) -> Tuple[int, int]:
+        """
+        Async counterpart of `_rate_chunk`, bounded by `semaphore`.
+        """
+        queued = time.perf_counter()
+        async with semaphore:
+            for retry_count in range(2):
+                try:
+                    rating = self._parse_rating(await self._acomplete_rating(messages, prefix, queued=queued))
+                    self._remember_rating(key, rating)
+                    return rating
+                except Exception as e:
+                    self._rating_failed(retry_count, e)
+                queued = time.perf_counter()
+            self._rating_fallback()
+            return FALLBACK_RATING
+
+    def _prompt_version(self) -> str:
+        """
+        Hashes the single and multi-word rating prompts (system messages, preambles and the reply schemas they embed),
+        filled with placeholder axes, so that changing any of them invalidates the cached ratings.
+        """
+        placeholders = [f"{{{key}}}" for key in ATTRIBUTE_KEYS]
+        messages = [*self._rating_messages("{word}", *placeholders), *self._multi_rating_messages([("{word}", placeholders)])]
+        signature = json.dumps([RATING_PROMPT_VERSION, messages], sort_keys=True)
+        return hashlib.sha256(signature.encode("utf-8")).hexdigest()[:16]
+
+    def _rating_key(self, chunk: str, word: str, axes: List[str]) -> Optional[str]:
+        if self.rating_cache is None:
+            return None
+        return RatingCache.make_key(chunk, word, axes, self.provider or "", self.model_name or "", self.prompt_version)
+
+    def _period_key(self, text: str, word: str, axes: List[str]) -> Optional[str]:
+        if self.rating_cache is None:
+            return None
+        return RatingCache.make_period_key(text, word, axes, self.provider or "", self.model_name or "", self.prompt_version)
+
+    def _remember_rating(self, key: Optional[str], rating: Tuple[int, int]):
+        # Only real ratings are cached, the (0, 0) fallback is retried on the next run.
+        if key is not None and self.rating_cache is not None:
+            self.rating_cache.put(key, rating)
+
+    def _cached_ratings(self, keys: List[Optional[str]]) -> Dict[str, Tuple[int, int]]:
+        if self.rating_cache is None:
+            return {}
+        return self.rating_cache.get_many([key for key in keys if key is not None])
+
+    def _chunk_requests(self, text: str, word: str, axes: List[str], system: Dict, prompt: str) -> List[Tuple[List[Dict], Optional[str], Tuple[int, int]]]:
+        """
+        Splits a text into chunks and returns the messages, the cache key and the first and last line of each chunk.
+        """
+        return [
+            ([system, {"role": "user", "content": prompt + chunk}], self._rating_key(chunk, word, axes), (first_line, last_line))
+            for chunk, first_line, last_line in self._rating_chunks(text, system, prompt)
+        ]
+
+    def combine_ratings(self, chunk_ratings: List[Tuple[int, int]]) -> List[int]:
+        """
+        Combines the chunk ratings of one text into a single coordinate.
+        """
+        if not chunk_ratings:
+            raise ValueError("No ratings could be obtained from any chunk")
+
+        x_sum = sum(rating[0] for rating in chunk_ratings)
+        y_sum = sum(rating[1] for rating in chunk_ratings)
+
+        return [round(self.normalize_sum(0, x_sum)), round(self.normalize_sum(1, y_sum))]
+
+    def normalize_sum(self, axis: int, total: float) -> float:
+        """
+        Maps the sum of the chunk ratings of one text on an axis (0 for x, 1 for y) to the rating range, before rounding.
+        """
+        if axis == 0:
+            return self.normalize_value(total, min(total, RATING_MIN), max(total, RATING_MAX), RATING_MIN, RATING_MAX)
+        return self.normalize_value(total, min(total, -5), max(total, RATING_MAX), RATING_MIN, RATING_MAX)
+
+    @staticmethod
+    def _validate_rating_args(text: str, *words: str):
+        if not isinstance(text, str):
+            raise ValueError("text must be a string")
+        if not all(isinstance(w, str) for w in words):
+            raise ValueError("word, x_aspect, x_positive, x_negative, y_aspect, y_positive, and y_negative must be strings")
+
     def give_rating(self, text: str, word: str, x_aspect: str, x_positive: str, x_negative: str, y_aspect: str, y_positive: str, y_negative: str) -> List[int]:
         """
         Give a rating for the compiled tweets based on provided aspects and their positive and negative directions.
+        The chunks of the text are rated concurrently on the worker pool.
         ----------
         Args:
             text (str): The compiled tweets to rate
@@ -160,121 +891,358 @@ class Model:
         Returns:
             List[int]: The rating as a coordinate on the cartesian plane
         """
-        min_value = -10
-        max_value = 10
-        if not isinstance(text, str):
-            raise ValueError("text must be a string")
-        if not isinstance(word, str) or not isinstance(x_aspect, str) or not isinstance(x_positive, str) or not isinstance(x_negative, str) or not isinstance(y_aspect, str) or not isinstance(y_positive, str) or not isinstance(y_negative, str):
-            raise ValueError("word, x_aspect, x_positive, x_negative, y_aspect, y_positive, and y_negative must be strings")
+        axes = [x_aspect, x_positive, x_negative, y_aspect, y_positive, y_negative]
+        self._validate_rating_args(text, word, *axes)
+        system, prompt = self._rating_messages(word, *axes)
+        requests = self._chunk_requests(text, word, axes, system, prompt)
+        cached = self._cached_ratings([key for _, key, _ in requests])
+        prefix = [system, {"role": "user", "content": prompt}]
 
-        prompt = f"""You are a social media analyst. You are provided with a compiled list of tweets from a user and a cartesian plane and where each axis corresponds to an aspect of the main factor {word}.
+        def rate(request):
+            messages, key, _ = request
+            if key in cached:
+                return cached[key]
+            return self._rate_chunk(messages, key, prefix)
+
+        if self._executor is None:
+            chunk_ratings = [rate(request) for request in requests]
+        else:
+            chunk_ratings = list(self._executor.map(rate, requests))
+        return self.combine_ratings(chunk_ratings)
+
+    async def rate_texts(self, texts: List[str], word: str, attributes: Dict[str, str], progress: Optional[RatingProgress] = None) -> List[List[int]]:
+        """
+        Rates several compiled texts (e.g. one per period) at once.
+        Every chunk of every text is scheduled concurrently, so the wall-clock time follows the slowest
+        chunk rather than the number of chunks. Groq requests are bounded by `max_concurrency`,
+        llama_cpp requests by the size of the worker pool. Chunks found in the rating cache are not sent to the model,
+        and texts whose combined rating is cached are not even chunked, so only new or changed periods are rated.
+        ----------
+        Args:
+            texts (List[str]): The compiled tweets to rate, one entry per period
+            word (str): The main factor for the ratings
+            attributes (Dict[str, str]): The axis attributes returned by `create_words`
+            progress (Optional[RatingProgress]): Receives every chunk rating as soon as it is available
+        Returns:
+            List[List[int]]: One coordinate per text, in the same order as `texts`
+        """
+        progress = progress or RatingProgress()
+        axes = [attributes[key] for key in ATTRIBUTE_KEYS]
+        system, prompt = self._rating_messages(word, *axes)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        for text in texts:
+            self._validate_rating_args(text, word, *axes)
+
+        def prepare():
+            with stage("chunking"):
+                period_keys = [self._period_key(text, word, axes) for text in texts]
+                stored = self._cached_ratings(period_keys)
+                requests = [
+                    [] if key in stored else self._chunk_requests(text, word, axes, system, prompt)
+                    for text, key in zip(texts, period_keys)
+                ]
+                cached = self._cached_ratings([key for text_requests in requests for _, key, _ in text_requests])
+            record_cache_hits(len(stored), "period")
+            record_cache_hits(len(cached), "chunk")
+            return period_keys, stored, requests, cached
+
+        # Tokenizing and hashing a large archive is CPU work, keep it off the event loop.
+        period_keys, stored, requests, cached = await _run_in_executor(None, prepare)
+        prefix = [system, {"role": "user", "content": prompt}]
+
+        async def rate(text_index, chunk_index, messages, key):
+            if key in cached:
+                rating = cached[key]
+            else:
+                rating = await self._arate_chunk(messages, semaphore, key, prefix)
+            progress.chunk_done(text_index, rating, chunk_index)
+            return rating
+
+        progress.chunk_lines([[lines for _, _, lines in text_requests] for text_requests in requests])
+        progress.start([len(text_requests) for text_requests in requests])
+        for text_index, key in enumerate(period_keys):
+            if key in stored:
+                progress.text_cached(text_index, list(stored[key]))
+        flat = await asyncio.gather(*(
+            rate(text_index, chunk_index, messages, key)
+            for text_index, text_requests in enumerate(requests)
+            for chunk_index, (messages, key, _) in enumerate(text_requests)
+        ))
+
+        ratings = []
+        offset = 0
+        for key, text_requests in zip(period_keys, requests):
+            if key in stored:
+                ratings.append(list(stored[key]))
+                continue
+            chunk_ratings = list(flat[offset:offset + len(text_requests)])
+            offset += len(text_requests)
+            rating = self.combine_ratings(chunk_ratings)
+            # A period with an unrated chunk is rated again on the next run.
+            if not any(chunk_rating is FALLBACK_RATING for chunk_rating in chunk_ratings):
+                self._remember_rating(key, tuple(rating))
+            ratings.append(rating)
+        return ratings
+
+
+    async def rate_texts_sampled(self, texts: List[str], word: str, attributes: Dict[str, str], tolerance: float = 0.5,
+                                 max_chunks: Optional[int] = None, max_tokens: Optional[int] = None, max_seconds: Optional[float] = None,
+                                 seed: Optional[int] = None, progress: Optional[RatingProgress] = None) -> Dict:
+        """
+        Approximate counterpart of `rate_texts` for large archives.
+        Chunks are drawn as a stratified random sample across the texts (one stratum per period) and rated in waves
+        as wide as the model's concurrency. After every wave the estimate of what `rate_texts` would return (the mean
+        over the periods of their normalized chunk rating sums) and its 95% confidence interval are updated, and
+        sampling stops once the half-width of the interval is at most `tolerance` on both axes, or a budget is used up.
+        Chunks found in the rating cache are always included, at no cost.
+        ----------
+        Args:
+            texts (List[str]): The compiled tweets to rate, one entry per period
+            word (str): The main factor for the ratings
+            attributes (Dict[str, str]): The axis attributes returned by `create_words`
+            tolerance (float): The target half-width of the confidence interval, in rating units
+            max_chunks (Optional[int]): The largest number of chunks sent to the model
+            max_tokens (Optional[int]): The largest number of prompt tokens sent to the model
+            max_seconds (Optional[float]): The longest time spent rating
+            seed (Optional[int]): Seed of the random sample, for reproducible runs
+            progress (Optional[RatingProgress]): Receives every chunk rating and every updated estimate
+        Returns:
+            Dict: The estimated coordinate, the half-width of its confidence interval on each axis, the number of
+            chunks rated, failed (left out of the estimate) and in total, and why sampling stopped ("complete",
+            "partial" if every chunk was sent but some failed, "tolerance", "chunks", "tokens" or "time")
+        """
+        progress = progress or RatingProgress()
+        axes = [attributes[key] for key in ATTRIBUTE_KEYS]
+        system, prompt = self._rating_messages(word, *axes)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        wave_size = self.llama_workers if self._is_llama() else self.max_concurrency
+
+        for text in texts:
+            self._validate_rating_args(text, word, *axes)
+
+        def prepare():
+            with stage("chunking"):
+                requests = [self._chunk_requests(text, word, axes, system, prompt) for text in texts]
+                cached = self._cached_ratings([key for text_requests in requests for _, key, _ in text_requests])
+            record_cache_hits(len(cached), "chunk")
+            return requests, cached
+
+        requests, cached = await _run_in_executor(None, prepare)
+        prefix = [system, {"role": "user", "content": prompt}]
+        overhead = self.count_tokens(system["content"]) + self.count_tokens(prompt) + CHAT_TEMPLATE_TOKENS
+
+        rng = random.Random(seed)
+        orders = []
+        for text_requests in requests:
+            order = [i for i, (_, key, _) in enumerate(text_requests) if key not in cached]
+            rng.shuffle(order)
+            orders.append(order)
+        sample = StratifiedSample([len(text_requests) for text_requests in requests], orders, self.normalize_sum)
+
+        progress.chunk_lines([[lines for _, _, lines in text_requests] for text_requests in requests])
+        progress.start([len(text_requests) for text_requests in requests])
+        for text_index, text_requests in enumerate(requests):
+            for chunk_index, (_, key, _) in enumerate(text_requests):
+                if key in cached:
+                    sample.add(text_index, cached[key])
+                    progress.chunk_done(text_index, cached[key], chunk_index)
+
+        async def rate(text_index, chunk_index):
+            messages, key, _ = requests[text_index][chunk_index]
+            rating = await self._arate_chunk(messages, semaphore, key, prefix)
+            progress.chunk_done(text_index, rating, chunk_index)
+            return text_index, rating
+
+        def count_wave_tokens(wave):
+            return sum(overhead + self.count_tokens(requests[text_index][chunk_index][0][1]["content"][len(prompt):], cache=False)
+                       for text_index, chunk_index in wave)
+
+        started = time.monotonic()
+        chunks_sent = 0
+        chunks_failed = 0
+        tokens_sent = 0
+        while True:
+            half_width = sample.half_width()
+            if sample.rated == sample.total:
+                reason = "complete"
+                break
+            if half_width is not None and sample.covered and max(half_width) <= tolerance:
+                reason = "tolerance"
+                break
+            if max_chunks is not None and chunks_sent >= max_chunks:
+                reason = "chunks"
+                break
+            if max_tokens is not None and tokens_sent >= max_tokens:
+                reason = "tokens"
+                break
+            if max_seconds is not None and time.monotonic() - started >= max_seconds:
+                reason = "time"
+                break
+
+            wave = []
+            while len(wave) < wave_size and (max_chunks is None or chunks_sent < max_chunks):
+                picked = sample.take()
+                if picked is None:
+                    break
+                wave.append(picked)
+                chunks_sent += 1
+            # Tokenizing whole chunks is CPU work, keep it off the event loop.
+            tokens_sent += await _run_in_executor(None, count_wave_tokens, wave)
+            for text_index, rating in await asyncio.gather(*(rate(text_index, chunk_index) for text_index, chunk_index in wave)):
+                # Unrated chunks fall back to (0, 0), which would bias the estimate towards the origin.
+                if rating is FALLBACK_RATING:
+                    chunks_failed += 1
+                else:
+                    sample.add(text_index, rating)
+            progress.estimate(sample.mean(), sample.half_width(), sample.rated)
+            if not wave:
+                # Every chunk was sent, the failed ones are missing from the estimate.
+                reason = "partial" if chunks_failed else "complete"
+                break
+
+        return {
+            "coordinates": sample.mean(),
+            "confidence_interval": sample.half_width(),
+            "chunks_rated": sample.rated,
+            "chunks_failed": chunks_failed,
+            "chunks_total": sample.total,
+            "stopped": reason,
+        }
+
+    def _multi_rating_messages(self, words: List[Tuple[str, List[str]]]) -> Tuple[Dict, str]:
+        """
+        Builds the system message and the user prompt preamble for rating the same chunk on several planes at once,
+        one per (word, axes) pair. Like `_rating_messages`, the chunk is appended to the returned prompt.
+        """
+        min_value, max_value = RATING_MIN, RATING_MAX
+        planes = "".join(
+            f"""
+        Plane {number} is for the main factor {word}.
         The X aspect is "{x_aspect}" and the positive X axis is the factor {x_positive}, and the negative X axis is the factor {x_negative}
-        The Y aspect is "{y_aspect}" and the positive Y axis is the factor {y_positive}, and the negative Y axis is the factor {y_negative}.
-        Your job is to provide a coordinate for the combined tweets on the cartesian plane based on the factors provided.
-        Be creative with your ratings and be genuine. Provide the rating in JSON format.
+        The Y aspect is "{y_aspect}" and the positive Y axis is the factor {y_positive}, and the negative Y axis is the factor {y_negative}."""
+            for number, (word, (x_aspect, x_positive, x_negative, y_aspect, y_positive, y_negative)) in enumerate(words, 1)
+        )
+        prompt = f"""You are a social media analyst. You are provided with a compiled list of tweets from a user and {len(words)} cartesian planes, where each axis corresponds to an aspect of the main factor of the plane.{planes}
+        Your job is to provide a coordinate for the combined tweets on every cartesian plane based on the factors provided.
+        Be creative with your ratings and be genuine. Provide the ratings in JSON format, one per plane, in the order of the planes.
         Here are the tweets:
-        """
+        """.rstrip(" ")
         system = {
                     "role": "system",
-                    "content": f"""You are a social media analyst. You are provided with a compiled list of tweets from a user and a cartesian plane on which the tweets are to be ranked based on some defined factors.
-                    Each axis corresponds to an aspect of the tweet, and has two types of factors, positive and negative.
-                    Hence there is the x-axis with the factors x_positive and x_negative and the y-axis with the factors y_positive and y_negative.
-                    Your job is to provide a rating of the collected tweets, which will be a coordinate for the combined tweets on the cartesian plane.
-                    You will do this by evaluating the tweets and providing a rating for the bunch of tweets based on the factors provided.
-                    If a tweet is more positive towards the x_positive factor, you will rate it higher on the x-axis, and if it is more negative towards the x_negative factor, you will rate it lower on the x-axis.
+                    "content": f"""You are a social media analyst. You are provided with a compiled list of tweets from a user and several cartesian planes on which the tweets are to be ranked based on some defined factors.
+                    Each axis of a plane corresponds to an aspect of the tweet, and has two types of factors, positive and negative.
+                    Hence every plane has the x-axis with the factors x_positive and x_negative and the y-axis with the factors y_positive and y_negative.
+                    Your job is to provide a rating of the collected tweets on every plane, which will be a coordinate for the combined tweets on that plane.
+                    If the tweets are more positive towards the x_positive factor, you will rate them higher on the x-axis, and if they are more negative towards the x_negative factor, you will rate them lower on the x-axis.
                     The X score is called x_value and the Y score is called y_value.
                     The same goes for the y-axis.
                     Each tweet is separated by a new line.
-                    The range for the X and Y axis is from {min_value} to {max_value}. Please provide a value for the text based on what you feel about the text.
+                    The range for the X and Y axis is from {min_value} to {max_value}.
+                    The "ratings" list must hold exactly {len(words)} ratings, the first one for plane 1, the second one for plane 2, and so on.
                     Provide your answer in JSON format.
                     """
-                    f"The JSON object must use the schema: {json.dumps(Rating.model_json_schema(), indent=2)}",
+                    f"The JSON object must use the schema: {json.dumps(MultiRating.model_json_schema(), indent=2)}",
                 }
+        return system, prompt
 
-        if isinstance(self.model, llama_cpp.Llama):
-            max_chars = 12000
-        else:
-            max_chars = 20000
-        chunks = self.chunk_text(text, max_chars=max_chars)
-
-        x_values = []
-        y_values = []
+    @classmethod
+    def _parse_multi_rating(cls, values_str: str, count: int) -> List[Tuple[int, int]]:
+        """
+        Parses and validates the JSON ratings of a multi-word request.
+        ----------
+        Raises:
+            json.JSONDecodeError: If the output is not JSON.
+            ValueError: If the output does not hold exactly `count` in-range ratings.
+        """
+        values = json.loads(values_str)
+        if not isinstance(values, dict) or not isinstance(values.get("ratings"), list):
+            raise ValueError("Invalid response format from model")
+        if len(values["ratings"]) != count:
+            raise ValueError(f"Expected {count} ratings, got {len(values['ratings'])}")
+        return [cls._parse_rating(json.dumps(rating)) for rating in values["ratings"]]
 
-        for chunk in chunks:
-            retry_count = 0
-            chunk_processed = False
-            while retry_count < 2:  # Try up to 2 times (initial attempt + 1 retry)
+    async def _arate_multi_chunk(self, messages: List[Dict], count: int, semaphore: asyncio.Semaphore, keys: List[Optional[str]], prefix: Optional[List[Dict]] = None) -> List[Tuple[int, int]]:
+        """
+        Rates a single chunk on `count` planes at once, retrying once. Falls back to (0, 0) on every plane if both attempts fail.
+        """
+        queued = time.perf_counter()
+        async with semaphore:
+            for retry_count in range(2):
                 try:
-                    if isinstance(self.model, llama_cpp.Llama):
-                        response = self.model.create_chat_completion(
-                            messages=[
-                                system,
-                                {
-                                    "role": "user",
-                                    "content": prompt + chunk
-                                },
-                            ],
-                            response_format={
-                                "type": "json_object"
-                            },
-                            stream=False,
-                        )
-                        values_str = response["choices"][0]["message"]["content"]
-                    elif isinstance(self.model, Groq):
-                        response = self.model.chat.completions.create(
-                            messages=[
-                                system,
-                                {
-                                    "role": "user",
-                                    "content": prompt + chunk
-                                },
-                            ],
-                            model="llama3-8b-8192",
-                            max_tokens=8000,
-                            temperature=0.2,
-                            stream=False,
-                            response_format={
-                                "type": "json_object",
-                            },
-                        )
-                        values_str = response.choices[0].message.content
-                    
-                    values = json.loads(values_str)
-                    if not isinstance(values, dict) or 'x_value' not in values or 'y_value' not in values:
-                        raise ValueError("Invalid response format from model")
-                    
-                    x_value = values["x_value"]
-                    y_value = values["y_value"]
-                    if not (min_value <= x_value <= max_value) or not (min_value <= y_value <= max_value):
-                        raise ValueError(f"x_value and y_value must be within the range of {min_value} to {max_value}")
-                    
-                    x_values.append(x_value)
-                    y_values.append(y_value)
-                    chunk_processed = True
-                    break  # Successfully processed the chunk, exit the retry loop
-                
-                except json.JSONDecodeError:
-                    print(f"Error decoding JSON for chunk. Attempt {retry_count + 1}")
-                    retry_count += 1
+                    max_tokens = RATING_REPLY_TOKENS + RATING_OUTPUT_TOKENS_PER_WORD * (count - 1)
+                    content = await self._acomplete_rating(messages, prefix, max_tokens, queued, _multi_rating_schema(count))
+                    ratings = self._parse_multi_rating(content, count)
+                    for key, rating in zip(keys, ratings):
+                        self._remember_rating(key, rating)
+                    return ratings
                 except Exception as e:
-                    print(f"Error processing model response: {e}")
-                    retry_count += 1
+                    self._rating_failed(retry_count, e)
+                queued = time.perf_counter()
+            self._rating_fallback(count)
+            return [FALLBACK_RATING] * count
 
-            if not chunk_processed:
-                print(f"Failed to process chunk after retry. Appending 0 for this chunk.")
-                x_values.append(0)
-                y_values.append(0)
+    async def rate_texts_multi(self, texts: List[str], words: Dict[str, Dict[str, str]]) -> Dict[str, List[List[int]]]:
+        """
+        Rates several compiled texts against several words in one pass.
+        Words are rated together, up to `MAX_BATCH_WORDS` per request, so every chunk is sent to the model once per batch
+        instead of once per word. Chunks are cached per word, and a chunk is only sent if one of its words is not cached.
+        ----------
+        Args:
+            texts (List[str]): The compiled tweets to rate, one entry per period
+            words (Dict[str, Dict[str, str]]): The axis attributes returned by `create_words`, by word
+        Returns:
+            Dict[str, List[List[int]]]: For every word, one coordinate per text, in the same order as `texts`
+        """
+        names = list(words)
+        batches = [names[i:i + MAX_BATCH_WORDS] for i in range(0, len(names), MAX_BATCH_WORDS)]
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        for text in texts:
+            for word in names:
+                self._validate_rating_args(text, word, *(words[word][key] for key in ATTRIBUTE_KEYS))
 
-        if not x_values or not y_values:
-            raise ValueError("No ratings could be obtained from any chunk")
+        def prepare(batch):
+            axes = [[words[word][key] for key in ATTRIBUTE_KEYS] for word in batch]
+            system, prompt = self._multi_rating_messages(list(zip(batch, axes)))
+            with stage("chunking"):
+                budget = self.chunk_budget(system, prompt, RATING_OUTPUT_TOKENS + RATING_OUTPUT_TOKENS_PER_WORD * (len(batch) - 1))
+                requests = [
+                    [
+                        ([system, {"role": "user", "content": prompt + chunk}], [self._rating_key(chunk, word, word_axes) for word, word_axes in zip(batch, axes)])
+                        for chunk in self.chunk_text(text, budget)
+                    ]
+                    for text in texts
+                ]
+                cached = self._cached_ratings([key for text_requests in requests for _, keys in text_requests for key in keys])
+            record_cache_hits(len(cached), "chunk")
+            return requests, cached, [system, {"role": "user", "content": prompt}]
 
-        x_sum = sum(x_values)
-        y_sum = sum(y_values)
+        async def rate(messages, keys, cached, prefix):
+            if all(key in cached for key in keys):
+                return [cached[key] for key in keys]
+            return await self._arate_multi_chunk(messages, len(keys), semaphore, keys, prefix)
 
-        x_normalized = self.normalize_value(x_sum, min(x_sum, min_value), max(x_sum, max_value), min_value, max_value)
-        y_normalized = self.normalize_value(y_sum, min(y_sum, -5), max(y_sum, max_value), min_value, max_value)
+        async def rate_batch(batch):
+            # Tokenizing and hashing a large archive is CPU work, keep it off the event loop.
+            requests, cached, prefix = await _run_in_executor(None, prepare, batch)
+            flat = await asyncio.gather(*(
+                rate(messages, keys, cached, prefix)
+                for text_requests in requests
+                for messages, keys in text_requests
+            ))
+            ratings = {word: [] for word in batch}
+            offset = 0
+            for text_requests in requests:
+                chunk_ratings = flat[offset:offset + len(text_requests)]
+                offset += len(text_requests)
+                for position, word in enumerate(batch):
+                    ratings[word].append(self.combine_ratings([chunk[position] for chunk in chunk_ratings]))
+            return ratings
 
-        return [round(x_normalized), round(y_normalized)]
+        results = {}
+        for ratings in await asyncio.gather(*(rate_batch(batch) for batch in batches)):
+            results.update(ratings)
+        return results
 
 
     ### UNIMPLEMENTED FUNCTIONS ###
@@ -291,14 +1259,14 @@ class Model:
             str: The meaning of the word in context of a person in a single line.
         """
         prompt = "You are a professional in language and culture. Define the given word in context of a person in a single line only. The word could be of pop culture origin or internet slang."
-        if self.provider == 'llama_cpp' and isinstance(self.model, llama_cpp.Llama):
+        if self._is_llama():
             response = self.model(
                 prompt=prompt + "Here is the word: " + word,
                 max_tokens=100,
                 stream=False,
             )
             return response["choices"][0]["text"]
-        if self.provider == 'groq' and isinstance(self.model, Groq):
+        if self._is_groq():
             response = self.model.chat.completions.create(
                 messages=[
                     {
@@ -310,7 +1278,7 @@ class Model:
                         "content": "I have a word and you must give me its meaning. Here is the word: " + word
                     }
                 ],
-                model="llama3-8b-8192",
+                model=GROQ_MODEL,
                 stream=False,
                 max_tokens=120
             )
@@ -330,7 +1298,7 @@ class Model:
         Returns:
             str: The context for the word based on the aspects provided.
         """
-        if isinstance(self.model, llama_cpp.Llama): 
+        if self._is_llama(): 
 
             response = self.model.create_chat_completion(
                 messages=[
@@ -346,7 +1314,7 @@ class Model:
                 },
             )
             return response
-        if isinstance(self.model, Groq):
+        if self._is_groq():
             response = self.model.chat.completions.create(
                 messages=[
                     {
@@ -366,7 +1334,7 @@ class Model:
 
                     }
                 ],
-                model="llama3-8b-8192",
+                model=GROQ_MODEL,
                 stream=False
             )
             return response
@@ -382,7 +1350,7 @@ class Model:
         Returns:
             bool: True if the word is internet slang, False
         """
-        if self.provider == 'llama_cpp' and isinstance(self.model, llama_cpp.Llama):
+        if self._is_llama():
             response = self.model.create_chat_completion(
                 messages=[
                     {
@@ -405,7 +1373,7 @@ class Model:
             )
             return json.loads(response["choices"][0]["message"]["content"])["is_internet_slang"]
 
-        elif self.provider == 'groq' and isinstance(self.model, Groq):
+        elif self._is_groq():
             response = self.model.chat.completions.create(
                 messages=[
                     {
@@ -418,7 +1386,7 @@ class Model:
                         "content": f"Is this word {word} slang or not?",
                     },
                 ],
-                model="llama3-8b-8192",
+                model=GROQ_MODEL,
                 temperature=0,
                 stream=False,
                 response_format={"type": "json_object"},
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Chat completions of the mock provider follow the llama_cpp.Llama interface, so it runs through the local code path
+# (worker pool, prefix cache, tokenizer-based chunking) without loading any weights.
+MOCK_CHARS_PER_TOKEN = 4
+MOCK_ATTRIBUTES = ("x_aspect", "x_positive", "x_negative", "y_aspect", "y_positive", "y_negative")
+MOCK_WORDS = ("alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliett", "kilo", "lima")
+
+
+def _digest(*parts: str) -> int:
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\x00")
+    return int.from_bytes(h.digest()[:8], "big")
+
+
+class MockState:
+    """Stand-in for llama_cpp.LlamaState."""
+
+    def __init__(self, calls: int):
+        self.calls = calls
+
+
+class MockLlama:
+    """
+    Deterministic offline stand-in for a llama_cpp.Llama model.
+    Replies are schema-valid Rating, MultiRating and Word JSON derived from a hash of the prompt, so the same prompt
+    always gets the same answer. Every completion sleeps `latency` seconds plus `latency_per_token` per prompt token,
+    and a fraction `failure_rate` of the completions return invalid JSON. Failures are decided per prompt and attempt,
+    so a retried request can succeed.
+    """
+
+    def __init__(self, latency: Optional[float] = None, latency_per_token: Optional[float] = None, failure_rate: Optional[float] = None,
+                 seed: Optional[int] = None, n_ctx: Optional[int] = None):
+        self.latency = latency if latency is not None else float(os.getenv("MOCK_LATENCY", 0.0))
+        self.latency_per_token = latency_per_token if latency_per_token is not None else float(os.getenv("MOCK_LATENCY_PER_TOKEN", 0.0))
+        self.failure_rate = failure_rate if failure_rate is not None else float(os.getenv("MOCK_FAILURE_RATE", 0.0))
+        self.seed = str(seed if seed is not None else os.getenv("MOCK_SEED", 0))
+        self._n_ctx = n_ctx or int(os.getenv("MOCK_N_CTX", 4096))
+        self.model_path = "mock"
+        self._lock = threading.Lock()
+        self._attempts: Dict[int, int] = {}
+        self.calls = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+
+    def n_ctx(self) -> int:
+        return self._n_ctx
+
+    def tokenize(self, text: bytes, add_bos: bool = True, special: bool = False) -> range:
+        return range(len(text) // MOCK_CHARS_PER_TOKEN + (1 if add_bos else 0))
+
+    def save_state(self) -> MockState:
+        return MockState(self.calls)
+
+    def load_state(self, state: MockState):
+        pass
+
+    def create_chat_completion(self, messages: List[Dict], max_tokens: Optional[int] = None, **kwargs) -> Dict:
+        prompt = "\n".join(message["content"] for message in messages)
+        prompt_tokens = len(self.tokenize(prompt.encode("utf-8"), add_bos=False))
+        key = _digest(self.seed, prompt)
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+        time.sleep(self.latency + self.latency_per_token * prompt_tokens)
+
+        if _digest(self.seed, prompt, str(attempt)) % 10000 < self.failure_rate * 10000:
+            with self._lock:
+                self.failures += 1
+            content = "{not json"
+        else:
+            content = json.dumps(self._reply(messages[0]["content"], key))
+        return {
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // MOCK_CHARS_PER_TOKEN},
+        }
+
+    @staticmethod
+    def _rating(key: int) -> Dict[str, int]:
+        return {"x_value": key % 21 - 10, "y_value": (key // 21) % 21 - 10}
+
+    def _reply(self, system: str, key: int) -> Dict:
+        # The schema embedded in the system message tells which object is expected.
+        if '"title": "MultiRating"' in system:
+            match = re.search(r"exactly (\d+) ratings", system)
+            count = int(match.group(1)) if match else 1
+            return {"ratings": [self._rating(_digest(str(key), str(i))) for i in range(count)]}
+        if '"title": "Word"' in system:
+            return {name: MOCK_WORDS[(key >> (4 * i)) % len(MOCK_WORDS)] for i, name in enumerate(MOCK_ATTRIBUTES)}
+        return self._rating(key)
@@ -0,0 +1,168 @@
+import re
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Literal, Optional, Tuple
+
+from pydantic import BaseModel
+
+_URL = re.compile(r"https?://([^/\s]+)\S*")
+# Two or more mentions in a row, e.g. the reply chain "@alice @bob @carol" in front of a reply.
+_MENTION_RUN = re.compile(r"@\w+(?:\s+@\w+)+")
+_LEADING_MENTIONS = re.compile(r"^(?:@\w+\s*)+")
+_MENTION = re.compile(r"@\w+")
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+class TextRules(BaseModel):
+    """
+    Rules applied to the tweets of every period before they are rated. Every rule can be switched off on its own.
+    The defaults are the recommended rules, requests that do not ask for rules use `TextRules.off()`.
+    ----------
+    Args:
+        urls: "keep" as exported, "shorten" to the host name (t.co links become "t.co"), or "strip"
+        mentions: "keep", "shorten" runs of mentions to the first one and a count ("@alice +2"),
+            or "strip" the reply chain at the start of a tweet and shorten the other runs
+        drop_retweets: Whether to leave out retweets ("RT @...")
+        dedupe: "off", "exact" to collapse identical tweets of a period, or "near" to also collapse tweets that only
+            differ in case, punctuation, links and mentions. Collapsed tweets are kept once with their count ("(x3)")
+        whitespace: Whether to collapse runs of whitespace, including newlines inside a tweet
+    """
+    urls: Literal["keep", "shorten", "strip"] = "shorten"
+    mentions: Literal["keep", "shorten", "strip"] = "shorten"
+    drop_retweets: bool = False
+    dedupe: Literal["off", "exact", "near"] = "exact"
+    whitespace: bool = True
+
+    @classmethod
+    def off(cls) -> "TextRules":
+        return cls(urls="keep", mentions="keep", drop_retweets=False, dedupe="off", whitespace=False)
+
+    @property
+    def active(self) -> bool:
+        return self != TextRules.off()
+
+
+def _shorten_mentions(match: re.Match) -> str:
+    mentions = _MENTION.findall(match.group(0))
+    return f"{mentions[0]} +{len(mentions) - 1}"
+
+
+def _near_duplicate_key(text: str) -> str:
+    text = _MENTION.sub(" ", _URL.sub(" ", text.lower()))
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+class TextPreprocessor:
+    """
+    Normalizes and deduplicates the tweets of each period, and keeps count of what was removed.
+    Duplicates are only collapsed within a period, so every period is still rated on its own tweets.
+    """
+
+    def __init__(self, rules: TextRules, count_tokens: Optional[Callable[[str], int]] = None):
+        """
+        Starts with empty counts.
+        ----------
+        Args:
+            rules (TextRules): The rules to apply
+            count_tokens (Optional[Callable[[str], int]]): Counts the tokens of a text, to report the token savings
+        """
+        self.rules = rules
+        self.count_tokens = count_tokens
+        self.tweets_in = 0
+        self.tweets_out = 0
+        self.retweets_dropped = 0
+        self.empty_dropped = 0
+        self.duplicates_collapsed = 0
+        self.chars_in = 0
+        self.chars_out = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def normalize(self, text: str) -> Optional[str]:
+        """
+        Applies the rules to a single tweet. Returns None if the tweet is dropped.
+        """
+        rules = self.rules
+        if rules.drop_retweets and text.startswith("RT @"):
+            self.retweets_dropped += 1
+            return None
+        if rules.urls == "shorten":
+            text = _URL.sub(lambda match: match.group(1).removeprefix("www."), text)
+        elif rules.urls == "strip":
+            text = _URL.sub("", text)
+        if rules.mentions == "strip":
+            text = _LEADING_MENTIONS.sub("", text)
+        if rules.mentions != "keep":
+            text = _MENTION_RUN.sub(_shorten_mentions, text)
+        if rules.whitespace:
+            text = " ".join(text.split())
+        if not text.strip():
+            self.empty_dropped += 1
+            return None
+        return text
+
+    def period_text(self, texts: Iterable[str]) -> str:
+        """
+        Returns the preprocessed tweets of one period, one per line, in their original order.
+        """
+        return "\n".join(line for line, _ in self.period_lines(texts))
+
+    def period_lines(self, texts: Iterable[str]) -> List[Tuple[str, List[int]]]:
+        """
+        Same as `period_text`, keeping every preprocessed tweet apart with the positions in `texts` of the tweets
+        it stands for (several once duplicates are collapsed).
+        """
+        texts = list(texts)
+        raw = "\n".join(texts)
+        # Text of every kept tweet and the positions of the tweets it stands for, by deduplication key.
+        kept: "OrderedDict[str, List]" = OrderedDict()
+        for i, original in enumerate(texts):
+            text = self.normalize(original)
+            if text is None:
+                continue
+            if self.rules.dedupe == "near":
+                # Keyed on the exported text, since shortened links no longer look like links.
+                key = _near_duplicate_key(original) or text
+            elif self.rules.dedupe == "exact":
+                key = text
+            else:
+                key = i
+            entry = kept.get(key)
+            if entry is None:
+                kept[key] = [text, [i]]
+            else:
+                entry[1].append(i)
+                self.duplicates_collapsed += 1
+        lines = [(text if len(sources) == 1 else f"{text} (x{len(sources)})", sources) for text, sources in kept.values()]
+        text = "\n".join(line for line, _ in lines)
+
+        self.tweets_in += len(texts)
+        self.tweets_out += len(kept)
+        self.chars_in += len(raw)
+        self.chars_out += len(text)
+        if self.count_tokens is not None:
+            self.tokens_in += self.count_tokens(raw)
+            self.tokens_out += self.count_tokens(text)
+        return lines
+
+    def report(self) -> Dict:
+        """
+        What the rules removed across every period processed so far.
+        """
+        report = {
+            "rules": self.rules.model_dump(),
+            "tweets_in": self.tweets_in,
+            "tweets_out": self.tweets_out,
+            "retweets_dropped": self.retweets_dropped,
+            "empty_dropped": self.empty_dropped,
+            "duplicates_collapsed": self.duplicates_collapsed,
+            "chars_in": self.chars_in,
+            "chars_out": self.chars_out,
+        }
+        if self.count_tokens is not None:
+            report.update(
+                tokens_in=self.tokens_in,
+                tokens_out=self.tokens_out,
+                tokens_saved=self.tokens_in - self.tokens_out,
+                saved_fraction=(self.tokens_in - self.tokens_out) / self.tokens_in if self.tokens_in else 0.0,
+            )
+        return report
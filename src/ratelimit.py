@@ -0,0 +1,192 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Mapping, Optional
+
+# Groq's default free-tier limits for the rating model; refined from the response headers once requests are made.
+DEFAULT_RPM = 30
+DEFAULT_TPM = 30000
+WINDOW_SECONDS = 60.0
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a rate-limit reset duration such as '7.66s', '2m59.56s' or '120ms' (or a plain number of seconds) into seconds.
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+class RateLimiter:
+    """
+    Paces requests so that they stay within a requests-per-minute and a tokens-per-minute budget.
+    Every request reserves its estimated tokens (prompt and maximum reply) in a sliding one-minute window before it
+    is sent, and waits while the window is full instead of being rejected by the provider. The reservation is settled
+    with the real usage once the reply arrives. The limits and remaining quota reported in the provider's
+    x-ratelimit-* headers, and the retry-after of a rejected request, take precedence over the local estimate.
+    """
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.rpm = rpm or int(os.getenv("GROQ_RPM", DEFAULT_RPM))
+        self.tpm = tpm or int(os.getenv("GROQ_TPM", DEFAULT_TPM))
+        self._lock = threading.Lock()
+        # [sent_at, tokens] of every request in the current window, oldest first.
+        self._window: Deque[List] = deque()
+        self._window_tokens = 0
+        self._paused_until = 0.0
+        # Quota reported by the provider, valid until the matching reset time.
+        self._remaining_requests: Optional[int] = None
+        self._requests_reset_at = 0.0
+        self._remaining_tokens: Optional[int] = None
+        self._tokens_reset_at = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.waited_seconds = 0.0
+
+    def _expire(self, now: float):
+        while self._window and self._window[0][0] <= now - WINDOW_SECONDS:
+            self._window_tokens -= self._window.popleft()[1]
+
+    def _delay(self, tokens: int, now: float) -> float:
+        delays = [self._paused_until - now]
+        if len(self._window) >= self.rpm:
+            delays.append(self._window[len(self._window) - self.rpm][0] + WINDOW_SECONDS - now)
+        if self._window_tokens + tokens > self.tpm:
+            # Wait until enough of the oldest requests have left the window.
+            excess = self._window_tokens + tokens - self.tpm
+            for sent_at, sent_tokens in self._window:
+                excess -= sent_tokens
+                if excess <= 0:
+                    delays.append(sent_at + WINDOW_SECONDS - now)
+                    break
+        if self._remaining_requests is not None and self._remaining_requests < 1 and now < self._requests_reset_at:
+            delays.append(self._requests_reset_at - now)
+        if self._remaining_tokens is not None and self._remaining_tokens < tokens and now < self._tokens_reset_at:
+            delays.append(self._tokens_reset_at - now)
+        return max(delays)
+
+    def _try_reserve(self, tokens: int):
+        # A single request larger than the whole budget is let through once the window is empty.
+        tokens = min(tokens, self.tpm)
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            delay = self._delay(tokens, now)
+            if delay > 0:
+                return delay, None
+            reservation = [now, tokens]
+            self._window.append(reservation)
+            self._window_tokens += tokens
+            if self._remaining_requests is not None:
+                self._remaining_requests -= 1
+            if self._remaining_tokens is not None:
+                self._remaining_tokens -= tokens
+            self.requests += 1
+            return 0.0, reservation
+
+    def reserve(self, tokens: int) -> List:
+        """
+        Blocks until a request of `tokens` tokens fits in the budget and reserves it.
+        ----------
+        Returns:
+            List: The reservation, to pass to `settle` once the real usage is known
+        """
+        throttled = False
+        while True:
+            delay, reservation = self._try_reserve(tokens)
+            if reservation is not None:
+                return reservation
+            throttled = self._count_wait(delay, throttled)
+            time.sleep(delay)
+
+    async def areserve(self, tokens: int) -> List:
+        """
+        Async counterpart of `reserve`, waiting without blocking the event loop.
+        """
+        throttled = False
+        while True:
+            delay, reservation = self._try_reserve(tokens)
+            if reservation is not None:
+                return reservation
+            throttled = self._count_wait(delay, throttled)
+            await asyncio.sleep(delay)
+
+    def _count_wait(self, delay: float, throttled: bool) -> bool:
+        with self._lock:
+            if not throttled:
+                self.throttled += 1
+            self.waited_seconds += delay
+        return True
+
+    def settle(self, reservation: List, tokens: Optional[int]):
+        """
+        Replaces the estimated tokens of a reservation with the tokens actually used.
+        """
+        if tokens is None:
+            return
+        with self._lock:
+            if any(entry is reservation for entry in self._window):
+                self._window_tokens += tokens - reservation[1]
+            reservation[1] = tokens
+
+    def pause(self, seconds: float):
+        """
+        Holds every request for `seconds`, e.g. after the provider rejected one with a retry-after.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def update(self, headers: Mapping[str, str]):
+        """
+        Reads the x-ratelimit-* headers of a provider response.
+        Groq reports requests per day and tokens per minute, so only the token limit replaces the local one.
+        """
+        now = time.monotonic()
+        with self._lock:
+            limit_tokens = headers.get("x-ratelimit-limit-tokens")
+            if limit_tokens:
+                self.tpm = int(limit_tokens)
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            if remaining_requests:
+                self._remaining_requests = int(remaining_requests)
+                self._requests_reset_at = now + (parse_duration(headers.get("x-ratelimit-reset-requests")) or WINDOW_SECONDS)
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            if remaining_tokens:
+                self._remaining_tokens = int(remaining_tokens)
+                self._tokens_reset_at = now + (parse_duration(headers.get("x-ratelimit-reset-tokens")) or WINDOW_SECONDS)
+
+    def status(self) -> Dict:
+        """
+        Current utilisation of the budgets over the last minute.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "requests_last_minute": len(self._window),
+                "tokens_last_minute": self._window_tokens,
+                "request_utilisation": len(self._window) / self.rpm,
+                "token_utilisation": self._window_tokens / self.tpm,
+                "remaining_requests": self._remaining_requests,
+                "remaining_tokens": self._remaining_tokens,
+                "paused_for": max(0.0, self._paused_until - now),
+                "requests": self.requests,
+                "throttled": self.throttled,
+                "waited_seconds": self.waited_seconds,
+            }
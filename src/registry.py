@@ -0,0 +1,124 @@
+import asyncio
+import os
+import time
+from typing import Dict, Optional, Set
+
+from .cache import AxisMemo, RatingCache
+from .metric import Model
+
+
+class ModelRegistry:
+    """
+    Shared, reference-counted pool of loaded models, one per provider.
+    Sessions acquire the model of their provider and release it when they switch provider, reset or expire,
+    so N sessions on the same provider share a single loaded instance. A model nobody holds stays warm for
+    `idle_unload_seconds` before it is unloaded (0 unloads at once, a negative value keeps it forever),
+    so a reset followed by a new run does not pay for loading the model again.
+    """
+
+    def __init__(self, rating_cache: Optional[RatingCache] = None, axis_memo: Optional[AxisMemo] = None, idle_unload_seconds: Optional[float] = None):
+        self.rating_cache = rating_cache
+        self.axis_memo = axis_memo if axis_memo is not None else AxisMemo()
+        if idle_unload_seconds is None:
+            idle_unload_seconds = float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", 900))
+        self.idle_unload_seconds = idle_unload_seconds
+        self._models: Dict[str, Model] = {}
+        self._refs: Dict[str, int] = {}
+        self._idle_since: Dict[str, float] = {}
+        self._keep_warm: Set[str] = set()
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def _new_model(self, provider: str) -> Model:
+        model = Model(rating_cache=self.rating_cache, axis_memo=self.axis_memo)
+        model.provider = provider
+        return model
+
+    async def acquire(self, provider: str) -> Model:
+        """
+        Returns the loaded model for `provider`, loading it if needed, and takes a reference on it.
+        ----------
+        Raises:
+            ValueError: If the provider is not supported.
+        """
+        lock = self._locks.setdefault(provider, asyncio.Lock())
+        async with lock:
+            model = self._models.get(provider)
+            if model is None or model.model is None:
+                model = self._new_model(provider)
+                await model.aload_model()
+                self._models[provider] = model
+            self._refs[provider] = self._refs.get(provider, 0) + 1
+            self._idle_since.pop(provider, None)
+            return model
+
+    async def preload(self, provider: str):
+        """
+        Loads the model for `provider` ahead of the first request and keeps it warm regardless of the idle timeout.
+        """
+        await self.acquire(provider)
+        self._keep_warm.add(provider)
+        self.release(provider)
+
+    def retain(self, provider: Optional[str]) -> Optional[Model]:
+        """
+        Takes another reference on an already loaded model, e.g. for the duration of a job.
+        Returns None, without taking a reference, if no model is loaded for `provider`.
+        """
+        model = self.get(provider)
+        if model is None:
+            return None
+        self._refs[provider] = self._refs.get(provider, 0) + 1
+        self._idle_since.pop(provider, None)
+        return model
+
+    def release(self, provider: Optional[str]):
+        """
+        Drops a reference on the model for `provider`. Once no session holds it, it is kept warm until it has been
+        idle for `idle_unload_seconds`.
+        """
+        if provider is None or provider not in self._refs:
+            return
+        self._refs[provider] -= 1
+        if self._refs[provider] <= 0:
+            del self._refs[provider]
+            self._idle_since[provider] = time.time()
+            self.unload_idle()
+
+    def unload_idle(self):
+        """
+        Unloads every model that nobody has held for longer than `idle_unload_seconds`.
+        """
+        if self.idle_unload_seconds < 0:
+            return
+        cutoff = time.time() - self.idle_unload_seconds
+        for provider, idle_since in list(self._idle_since.items()):
+            if provider in self._keep_warm or idle_since > cutoff:
+                continue
+            del self._idle_since[provider]
+            model = self._models.pop(provider, None)
+            if model is not None:
+                model.unload_model()
+
+    async def unload_idle_forever(self, interval: float = 60):
+        while True:
+            await asyncio.sleep(interval)
+            self.unload_idle()
+
+    def get(self, provider: Optional[str]) -> Optional[Model]:
+        if provider is None:
+            return None
+        return self._models.get(provider)
+
+    def status(self) -> Dict[str, Dict]:
+        """
+        References held on every loaded model, by provider, and for how long idle models have been unused.
+        """
+        now = time.time()
+        return {
+            provider: {
+                "references": self._refs.get(provider, 0),
+                "idle_seconds": now - self._idle_since[provider] if provider in self._idle_since else None,
+                "keep_warm": provider in self._keep_warm,
+            }
+            for provider in self._models
+        }
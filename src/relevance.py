@@ -0,0 +1,197 @@
+import math
+import re
+import threading
+import weakref
+from array import array
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field, model_validator
+
+from .instrumentation import stage
+from .store import TweetStore
+
+_TERM = re.compile(r"[^\W_]+")
+# Term frequencies and tweet lengths are stored as unsigned shorts.
+MAX_COUNT = 0xFFFF
+# Attributes of `create_words` that the tweets are scored against, next to the word itself.
+FACTOR_KEYS = ("x_positive", "x_negative", "y_positive", "y_negative")
+
+
+def terms(text: str) -> List[str]:
+    return _TERM.findall(text.lower())
+
+
+class RelevanceFilter(BaseModel):
+    """
+    Keeps only the tweets of every period that are most relevant to the word and its factors.
+    At least one of the two limits is required, a filter without limits would index the archive and keep everything.
+    ----------
+    Args:
+        top_k: The number of tweets kept per period
+        max_tokens: The number of tweet tokens kept per period, most relevant tweets first
+    """
+    top_k: Optional[int] = Field(default=None, gt=0)
+    max_tokens: Optional[int] = Field(default=None, gt=0)
+
+    @model_validator(mode="after")
+    def _check_limits(self) -> "RelevanceFilter":
+        if self.top_k is None and self.max_tokens is None:
+            raise ValueError("relevance needs top_k, max_tokens or both")
+        return self
+
+
+class BM25Index:
+    """
+    Okapi BM25 inverted index of the tweets of a store.
+    Postings are held in flat arrays (tweet positions and term frequencies, grouped by term), so an index costs
+    a few bytes per distinct term of every tweet. Scoring a query only reads the postings of its terms.
+    Indexes are built once per store and shared by every query, see `for_store`.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    _indexes: "weakref.WeakKeyDictionary[TweetStore, BM25Index]" = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
+
+    def __init__(self, store: TweetStore):
+        postings: Dict[str, tuple] = {}
+        self.lengths = array("H")
+        for i in range(len(store)):
+            counts = Counter(terms(store.text(i)))
+            self.lengths.append(min(sum(counts.values()), MAX_COUNT))
+            for term, count in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = (array("I"), array("H"))
+                entry[0].append(i)
+                entry[1].append(min(count, MAX_COUNT))
+
+        # Compact the postings: term -> id, and the postings of term t in [offsets[t], offsets[t + 1]).
+        self._term_ids: Dict[str, int] = {}
+        self._docs = array("I")
+        self._frequencies = array("H")
+        self._offsets = array("Q", [0])
+        for term_id, (term, (docs, frequencies)) in enumerate(postings.items()):
+            self._term_ids[term] = term_id
+            self._docs.extend(docs)
+            self._frequencies.extend(frequencies)
+            self._offsets.append(len(self._docs))
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+
+    @classmethod
+    def for_store(cls, store: TweetStore) -> "BM25Index":
+        """
+        Returns the index of a store, building it on first use. The index lives as long as the store.
+        """
+        with cls._lock:
+            index = cls._indexes.get(store)
+            if index is None:
+                with stage("relevance_index"):
+                    index = cls._indexes[store] = cls(store)
+            return index
+
+    @classmethod
+    def cached_nbytes(cls, store: TweetStore) -> int:
+        index = cls._indexes.get(store)
+        return index.nbytes if index is not None else 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Approximate size of the index, in bytes, counting about 64 bytes per dictionary entry.
+        """
+        arrays = (self.lengths, self._docs, self._frequencies, self._offsets)
+        return sum(a.itemsize * len(a) for a in arrays) + 64 * len(self._term_ids)
+
+    def scores(self, query: str) -> array:
+        """
+        Scores every tweet of the store against `query`.
+        ----------
+        Returns:
+            array: The BM25 score of every tweet, by position in the store
+        """
+        n = len(self)
+        scores = array("d", bytes(8 * n))
+        for term in set(terms(query)):
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                continue
+            lo, hi = self._offsets[term_id], self._offsets[term_id + 1]
+            idf = math.log(1 + (n - (hi - lo) + 0.5) / (hi - lo + 0.5))
+            for doc, frequency in zip(self._docs[lo:hi], self._frequencies[lo:hi]):
+                norm = self.K1 * (1 - self.B + self.B * self.lengths[doc] / self.average_length)
+                scores[doc] += idf * frequency * (self.K1 + 1) / (frequency + norm)
+        return scores
+
+
+class RelevanceSelector:
+    """
+    Selects the most relevant tweets of every period of a store (or of a view of it) for a query.
+    The index of the store is built, and the query scored, on the first selection, so that this heavy work runs
+    wherever the periods are split.
+    """
+
+    def __init__(self, store: TweetStore, query: str, relevance: RelevanceFilter, count_tokens: Optional[Callable[[str], int]] = None):
+        """
+        Starts with empty counts.
+        ----------
+        Args:
+            store (TweetStore): The store that is indexed. Periods may come from any view of it
+            query (str): The word and its factors
+            relevance (RelevanceFilter): How many tweets to keep per period
+            count_tokens (Optional[Callable[[str], int]]): Counts the tokens of a tweet, required with `max_tokens`
+        """
+        if relevance.max_tokens is not None and count_tokens is None:
+            raise ValueError("count_tokens is required to select tweets by token budget")
+        self.store = store
+        self.query = query
+        self.relevance = relevance
+        self.count_tokens = count_tokens
+        self._scores: Optional[array] = None
+        self.tweets_in = 0
+        self.tweets_out = 0
+        self.matching = 0
+
+    def select(self, view: TweetStore, start: int, end: int) -> List[int]:
+        """
+        Returns the positions in `view` of the tweets of [start, end) to keep, in chronological order.
+        Tweets without any query term only make the cut if the period has fewer matching tweets than the limit.
+        """
+        if self._scores is None:
+            index = BM25Index.for_store(self.store)
+            with stage("relevance_scoring"):
+                self._scores = index.scores(self.query)
+        scores = self._scores
+        offset = view.start - self.store.start
+        ranked = sorted(range(start, end), key=lambda i: (-scores[offset + i], i))
+        if self.relevance.top_k is not None:
+            ranked = ranked[:self.relevance.top_k]
+        if self.relevance.max_tokens is not None:
+            kept = []
+            tokens = 0
+            for i in ranked:
+                tweet_tokens = self.count_tokens(view.text(i)) + 1  # including the newline separator
+                # The most relevant tweet is always kept, so no period is left empty.
+                if kept and tokens + tweet_tokens > self.relevance.max_tokens:
+                    continue
+                kept.append(i)
+                tokens += tweet_tokens
+            ranked = kept
+        self.tweets_in += end - start
+        self.tweets_out += len(ranked)
+        self.matching += sum(1 for i in range(start, end) if scores[offset + i] > 0)
+        return sorted(ranked)
+
+    def report(self) -> Dict:
+        return {
+            "top_k": self.relevance.top_k,
+            "max_tokens": self.relevance.max_tokens,
+            "tweets_in": self.tweets_in,
+            "tweets_out": self.tweets_out,
+            "matching": self.matching,
+        }
@@ -0,0 +1,121 @@
+import math
+from typing import Callable, List, Optional, Tuple
+
+# z-score of the two-sided 95% confidence interval.
+CONFIDENCE_Z = 1.96
+
+
+class StratifiedSample:
+    """
+    Stratified random sample of chunk ratings, with one stratum per period.
+    Chunks are handed out so that every period is sampled once before any period is sampled twice, and then in
+    proportion to the number of chunks of each period. The estimate follows full rating, which sums the chunk ratings
+    of every period, normalizes the sum and averages the periods: the sum of every period is estimated as its number
+    of chunks times its mean sampled rating, normalized, and averaged over the periods. Its confidence interval comes
+    from the variance of every estimated sum under sampling without replacement, scaled by the slope of the
+    normalization across the interval of that sum.
+    """
+
+    def __init__(self, sizes: List[int], orders: List[List[int]], normalize: Optional[Callable[[int, float], float]] = None):
+        """
+        Starts an empty sample. Chunks missing from `orders` (e.g. found in the rating cache) count as already scheduled.
+        ----------
+        Args:
+            sizes (List[int]): The number of chunks of every stratum
+            orders (List[List[int]]): For every stratum, the indices of the chunks left to rate, in random order
+            normalize (Optional[Callable[[int, float], float]]): Maps the sum of the chunk ratings of a period on an
+                axis (0 for x, 1 for y) to the rating of the period, e.g. `Model.normalize_sum`. Identity if None.
+        """
+        self.sizes = sizes
+        self.total = sum(sizes)
+        self.normalize = normalize or (lambda axis, total: total)
+        self._orders = orders
+        # Chunks of every stratum that are rated or being rated.
+        self._scheduled = [size - len(order) for size, order in zip(sizes, orders)]
+        self.ratings: List[List[Tuple[int, int]]] = [[] for _ in sizes]
+
+    def take(self) -> Optional[Tuple[int, int]]:
+        """
+        Returns the (stratum, chunk index) of the next chunk to rate, or None once every chunk has been handed out.
+        """
+        best = None
+        for stratum, order in enumerate(self._orders):
+            if not order:
+                continue
+            # Unsampled strata first, then the stratum with the smallest sampled fraction.
+            priority = (self._scheduled[stratum] > 0, self._scheduled[stratum] / self.sizes[stratum])
+            if best is None or priority < best[0]:
+                best = (priority, stratum)
+        if best is None:
+            return None
+        stratum = best[1]
+        self._scheduled[stratum] += 1
+        return stratum, self._orders[stratum].pop()
+
+    def add(self, stratum: int, rating: Tuple[int, int]):
+        self.ratings[stratum].append(rating)
+
+    @property
+    def rated(self) -> int:
+        return sum(len(ratings) for ratings in self.ratings)
+
+    @property
+    def covered(self) -> bool:
+        """Whether every non-empty stratum has at least one rating."""
+        return all(ratings or not size for ratings, size in zip(self.ratings, self.sizes))
+
+    def _pooled(self, axis: int) -> Tuple[float, float]:
+        values = [rating[axis] for ratings in self.ratings for rating in ratings]
+        mean = sum(values) / len(values)
+        variance = sum((v - mean) ** 2 for v in values) / (len(values) - 1) if len(values) > 1 else 0.0
+        return mean, variance
+
+    def mean(self) -> Optional[List[float]]:
+        """
+        The estimated (x, y), the mean of the normalized period sums. Strata without ratings are imputed with the mean
+        of all ratings.
+        """
+        if not self.rated:
+            return None
+        return [self._axis_estimate(axis)[0] for axis in (0, 1)]
+
+    def half_width(self) -> Optional[List[float]]:
+        """
+        Half-width (x, y) of the confidence interval of the estimate, or None until two chunks have been rated.
+        """
+        if self.rated < 2:
+            return None
+        return [CONFIDENCE_Z * math.sqrt(self._axis_estimate(axis)[1]) for axis in (0, 1)]
+
+    def _axis_estimate(self, axis: int) -> Tuple[float, float]:
+        pooled_mean, pooled_variance = self._pooled(axis)
+        mean = 0.0
+        variance = 0.0
+        periods = 0
+        for ratings, size in zip(self.ratings, self.sizes):
+            if not size:
+                continue
+            periods += 1
+            n = len(ratings)
+            if n == size:
+                # Fully rated, the period is rated exactly like `Model.combine_ratings` does.
+                mean += round(self.normalize(axis, sum(rating[axis] for rating in ratings)))
+                continue
+            if n == 0:
+                # Count an unsampled stratum as a single draw from the pooled ratings.
+                stratum_mean, sum_variance = pooled_mean, size ** 2 * pooled_variance
+            else:
+                values = [rating[axis] for rating in ratings]
+                stratum_mean = sum(values) / n
+                stratum_variance = sum((v - stratum_mean) ** 2 for v in values) / (n - 1) if n > 1 else pooled_variance
+                sum_variance = size ** 2 * (1 - n / size) * stratum_variance / n
+            estimate = size * stratum_mean
+            mean += self.normalize(axis, estimate)
+            # The normalization clips the sum, so a period whose whole interval is saturated adds no uncertainty.
+            spread = CONFIDENCE_Z * math.sqrt(sum_variance)
+            if spread > 0:
+                slope = (self.normalize(axis, estimate + spread) - self.normalize(axis, estimate - spread)) / (2 * spread)
+                variance += slope ** 2 * sum_variance
+        if not periods:
+            return 0.0, 0.0
+        return mean / periods, variance / periods ** 2
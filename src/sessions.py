@@ -0,0 +1,132 @@
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from .relevance import BM25Index
+from .store import TweetStore
+from .trajectory import Trajectory
+
+DEFAULT_SESSION = "default"
+
+
+class Session:
+    """
+    State of one client: its uploaded archive, the labelled archives it compares, the provider of the model it uses,
+    and the trajectory of every word rated on the archive.
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.tweets = TweetStore.from_records([])
+        self.archives: Dict[str, TweetStore] = {}
+        self.provider: Optional[str] = None
+        self.trajectories: Dict[str, Trajectory] = {}
+        self.last_access = time.time()
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the archives of the session, including the relevance indexes built for them, and of its trajectories.
+        """
+        stores = [self.tweets, *self.archives.values()]
+        return (sum(store.nbytes + BM25Index.cached_nbytes(store) for store in stores)
+                + sum(trajectory.nbytes for trajectory in self.trajectories.values()))
+
+
+class SessionStore:
+    """
+    Bounded store of sessions.
+    The archives of all sessions together are kept under `max_bytes`, evicting the least recently used sessions first,
+    and sessions idle for longer than `idle_seconds` are dropped. `on_evict` is called for every dropped session,
+    and `on_create` for every new one, e.g. to restore its archives from disk.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, idle_seconds: Optional[float] = None, on_evict: Optional[Callable[[Session], None]] = None,
+                 on_create: Optional[Callable[[Session], None]] = None):
+        self.max_bytes = max_bytes or int(os.getenv("SESSION_MAX_BYTES", 1 << 30))
+        self.idle_seconds = idle_seconds or float(os.getenv("SESSION_IDLE_SECONDS", 3600))
+        self.on_evict = on_evict
+        self.on_create = on_create
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    @staticmethod
+    def new_id() -> str:
+        return uuid.uuid4().hex
+
+    def get(self, session_id: str) -> Session:
+        """
+        Returns the session with this id, creating it if needed, and marks it as recently used.
+        """
+        self.evict_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = Session(session_id)
+            self._sessions[session_id] = session
+            if self.on_create is not None:
+                self.on_create(session)
+        session.last_access = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def set_tweets(self, session: Session, tweets: TweetStore):
+        """
+        Replaces the archive of a session, evicting other sessions if the budget is exceeded.
+        The trajectories rated on the previous archive are dropped.
+        ----------
+        Raises:
+            MemoryError: If the archive alone is larger than the whole budget.
+        """
+        if tweets.nbytes > self.max_bytes:
+            raise MemoryError(f"Archive of {tweets.nbytes} bytes exceeds the session budget of {self.max_bytes} bytes")
+        session.tweets = tweets
+        session.trajectories.clear()
+        self._enforce_budget(session)
+
+    def set_archive(self, session: Session, label: str, tweets: TweetStore):
+        """
+        Adds or replaces a labelled archive of a session, evicting other sessions if the budget is exceeded.
+        ----------
+        Raises:
+            MemoryError: If the archives of the session alone would be larger than the whole budget.
+        """
+        replaced = session.archives.get(label)
+        size = session.nbytes - (replaced.nbytes if replaced is not None else 0) + tweets.nbytes
+        if size > self.max_bytes:
+            raise MemoryError(f"Archives of {size} bytes exceed the session budget of {self.max_bytes} bytes")
+        session.archives[label] = tweets
+        self._enforce_budget(session)
+
+    def _enforce_budget(self, session: Session):
+        for other in list(self._sessions.values()):
+            if self.nbytes <= self.max_bytes:
+                break
+            if other is not session:
+                self.drop(other.id)
+
+    def drop(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is not None and self.on_evict is not None:
+            self.on_evict(session)
+
+    def evict_idle(self):
+        cutoff = time.time() - self.idle_seconds
+        # Sessions are ordered from least to most recently used.
+        for session in list(self._sessions.values()):
+            if session.last_access >= cutoff:
+                break
+            self.drop(session.id)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(session.nbytes for session in self._sessions.values())
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def status(self) -> List[Dict]:
+        return [
+            {"session_id": s.id, "tweets": len(s.tweets), "archives": len(s.archives), "bytes": s.nbytes, "provider": s.provider, "last_access": s.last_access}
+            for s in self._sessions.values()
+        ]
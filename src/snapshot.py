@@ -0,0 +1,225 @@
+import hashlib
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from .cache import _connect, default_cache_path
+from .data import load_archive
+from .instrumentation import SNAPSHOT_HITS, TWEETS_PARSED, stage
+from .store import TweetStore
+
+# Magic and format version of a snapshot file.
+SNAPSHOT_MAGIC = b"XCSNAP01"
+# Magic, byte order of the columns, number of tweets and size of the text arena. 32 bytes, so columns stay 8-byte aligned.
+_HEADER = struct.Struct("<8s8sqq")
+_BYTE_ORDER = sys.byteorder.encode("ascii").ljust(8, b"\x00")
+# Size of the blocks hashed at a time.
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def content_digest(f: BinaryIO, block_size: int = HASH_BLOCK_SIZE) -> str:
+    """
+    Returns the SHA-256 hex digest of the rest of a binary file.
+    """
+    h = hashlib.sha256()
+    while True:
+        block = f.read(block_size)
+        if not block:
+            return h.hexdigest()
+        h.update(block)
+
+
+def file_digest(path: str) -> str:
+    with open(path, "rb") as f:
+        return content_digest(f)
+
+
+def write_snapshot(store: TweetStore, f: BinaryIO):
+    """
+    Writes a store to a binary file: the header, then the timestamps, ids and offsets as int64 columns, then the text arena.
+    """
+    offsets = store.offsets
+    if len(offsets) and offsets[0] != 0:
+        # A view of a larger store, rebase its offsets on the start of its own texts.
+        offsets = array("q", (offset - store.offsets[0] for offset in store.offsets))
+    arena = store.arena[store.offsets[0]:store.offsets[-1]] if len(store.offsets) else b""
+    f.write(_HEADER.pack(SNAPSHOT_MAGIC, _BYTE_ORDER, len(store), len(arena)))
+    f.write(store.timestamps)
+    f.write(store.ids)
+    f.write(offsets)
+    f.write(arena)
+
+
+def map_snapshot(path: str) -> TweetStore:
+    """
+    Maps a snapshot file read-only and returns a store over it, without copying or parsing anything.
+    Pages are loaded on first access and shared by every process that maps the same file.
+    ----------
+    Raises:
+        ValueError: If the file is not a snapshot of this format and byte order, or its header does not match its size.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _HEADER.size:
+            raise ValueError(f"Snapshot {path} is truncated")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    magic, byte_order, count, arena_size = _HEADER.unpack(view[:_HEADER.size])
+    if magic != SNAPSHOT_MAGIC or byte_order != _BYTE_ORDER:
+        raise ValueError(f"Snapshot {path} has an unsupported format")
+    # The header is checked against the file before any column is sliced, a bad length would read the wrong bytes.
+    if count < 0 or arena_size < 0:
+        raise ValueError(f"Snapshot {path} has a corrupt header")
+    column = 8 * count
+    start = _HEADER.size
+    if size != start + 3 * column + 8 + arena_size:
+        raise ValueError(f"Snapshot {path} is truncated or has a corrupt header")
+    timestamps = view[start:start + column].cast("q")
+    ids = view[start + column:start + 2 * column].cast("q")
+    offsets = view[start + 2 * column:start + 3 * column + 8].cast("q")
+    arena = view[start + 3 * column + 8:]
+    # Only the ends of the offsets are checked, reading them all would load every page of the column.
+    if offsets[0] != 0 or offsets[-1] != arena_size:
+        raise ValueError(f"Snapshot {path} has offsets outside its text arena")
+    return TweetStore(timestamps, ids, arena, offsets)
+
+
+class SnapshotStore:
+    """
+    On-disk snapshots of parsed archives, keyed by the SHA-256 of the uploaded file, so that an archive that was
+    already uploaded is mapped back in milliseconds instead of being parsed again.
+    The archive of every session is recorded too, so that sessions are restored after a restart.
+    Snapshots are evicted least-recently-used first once they take more than `max_bytes`.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: Optional[int] = None):
+        self.directory = directory or os.getenv("SNAPSHOT_DIR") or default_cache_path("snapshots")
+        self.max_bytes = max_bytes or int(os.getenv("SNAPSHOT_MAX_BYTES", 4 << 30))
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = _connect(os.path.join(self.directory, "snapshots.db"))
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            " digest TEXT PRIMARY KEY,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS bindings ("
+            " session_id TEXT NOT NULL,"
+            " label TEXT NOT NULL,"
+            " digest TEXT NOT NULL,"
+            " PRIMARY KEY (session_id, label))"
+        )
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.snap")
+
+    def load(self, digest: str) -> Optional[TweetStore]:
+        """
+        Returns the store of a known archive, or None if it has no (valid) snapshot.
+        """
+        try:
+            store = map_snapshot(self.path(digest))
+        except (OSError, ValueError):
+            return None
+        with self._lock:
+            self._conn.execute("UPDATE snapshots SET last_access = ? WHERE digest = ?", (time.time(), digest))
+        return store
+
+    def save(self, digest: str, store: TweetStore) -> TweetStore:
+        """
+        Writes the snapshot of an archive and returns the store mapped from it, so the parsed copy can be freed.
+        The file is written under a temporary name and renamed, so concurrent writers and readers never see half of it.
+        """
+        path = self.path(digest)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write_snapshot(store, f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO snapshots (digest, size, last_access) VALUES (?, ?, ?)",
+                (digest, os.path.getsize(path), time.time()),
+            )
+            self._evict(keep=digest)
+        return map_snapshot(path)
+
+    def _evict(self, keep: str):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM snapshots").fetchone()[0]
+        rows = self._conn.execute("SELECT digest, size FROM snapshots WHERE digest != ? ORDER BY last_access", (keep,))
+        for digest, size in rows.fetchall():
+            if total <= self.max_bytes:
+                break
+            # Stores already mapped from the file stay readable, the file is only removed from the directory.
+            try:
+                os.unlink(self.path(digest))
+            except FileNotFoundError:
+                pass
+            self._conn.execute("DELETE FROM snapshots WHERE digest = ?", (digest,))
+            total -= size
+
+    def bind(self, session_id: str, label: Optional[str], digest: str):
+        """
+        Records the archive of a session, or one of its labelled archives.
+        """
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO bindings (session_id, label, digest) VALUES (?, ?, ?)",
+                (session_id, label or "", digest),
+            )
+
+    def unbind(self, session_id: str, label: Optional[str] = None):
+        """
+        Forgets one labelled archive of a session, or every archive of the session if no label is given.
+        """
+        with self._lock:
+            if label is None:
+                self._conn.execute("DELETE FROM bindings WHERE session_id = ?", (session_id,))
+            else:
+                self._conn.execute("DELETE FROM bindings WHERE session_id = ? AND label = ?", (session_id, label))
+
+    def bindings(self, session_id: str) -> Dict[str, str]:
+        """
+        Returns the digest of every archive of a session, by label. The unlabelled archive has the empty label.
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT label, digest FROM bindings WHERE session_id = ?", (session_id,)).fetchall()
+        return dict(rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def load_archive_file(path: str, snapshots: Optional[SnapshotStore] = None) -> Tuple[TweetStore, Optional[str]]:
+    """
+    Returns the tweets of an archive file with its content hash, mapped from its snapshot if it was loaded before.
+    Without a snapshot store, the archive is always parsed and no hash is computed.
+    """
+    if snapshots is None:
+        with stage("upload_parse"):
+            tweets = load_archive(path)
+        TWEETS_PARSED.inc(len(tweets))
+        return tweets, None
+    digest = file_digest(path)
+    with stage("snapshot_load"):
+        tweets = snapshots.load(digest)
+    if tweets is not None:
+        SNAPSHOT_HITS.inc()
+        return tweets, digest
+    with stage("upload_parse"):
+        tweets = load_archive(path)
+    TWEETS_PARSED.inc(len(tweets))
+    with stage("snapshot_save"):
+        return snapshots.save(digest, tweets), digest
@@ -0,0 +1,173 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from calendar import timegm
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+CREATED_AT_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+_MONTHS = {m: i for i, m in enumerate(("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1)}
+
+
+def parse_created_at(created_at: str) -> int:
+    """
+    Parses a Twitter `created_at` string (e.g. 'Wed Oct 10 20:19:24 +0000 2018') into epoch seconds.
+    Falls back to strptime for anything that does not follow the archive layout exactly.
+    """
+    parts = created_at.split()
+    try:
+        _, month, day, clock, offset, year = parts
+        hours, minutes, seconds = clock.split(":")
+        ts = timegm((int(year), _MONTHS[month], int(day), int(hours), int(minutes), int(seconds)))
+        sign = -1 if offset[0] == "-" else 1
+        return ts - sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+    except (ValueError, KeyError, IndexError):
+        return int(datetime.strptime(created_at, CREATED_AT_FORMAT).timestamp())
+
+
+def format_created_at(ts: int) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime(CREATED_AT_FORMAT)
+
+
+class TweetStore:
+    """
+    Compact, columnar store of tweets sorted by creation time.
+    Timestamps (epoch seconds) and ids are int64 columns. Texts live in a single UTF-8 arena where every tweet
+    is followed by a newline, so the texts of consecutive tweets can be read back as one slice.
+    Columns are held as memoryviews, so slicing a store returns a zero-copy view over the same buffers.
+    """
+
+    def __init__(self, timestamps, ids, arena, offsets, start: int = 0):
+        self.timestamps = memoryview(timestamps)
+        self.ids = memoryview(ids)
+        self.arena = memoryview(arena)
+        # offsets[i] is the start of tweet i in the arena, offsets[len(self)] is the end of the last tweet.
+        self.offsets = memoryview(offsets)
+        # Position of the first tweet in the store this view was sliced from, 0 for a whole store.
+        self.start = start
+
+    @classmethod
+    def from_records(cls, records: Iterable[Dict]) -> "TweetStore":
+        """
+        Builds a store from dictionaries with 'id', 'text', and 'created_at' keys.
+        """
+        builder = TweetStoreBuilder()
+        builder.extend(records)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i: int) -> Dict:
+        return {"id": str(self.ids[i]), "text": self.text(i), "created_at": format_created_at(self.timestamps[i])}
+
+    def text(self, i: int) -> str:
+        return str(self.arena[self.offsets[i]:self.offsets[i + 1] - 1], "utf-8")
+
+    def joined_text(self, start: int, end: int) -> str:
+        """
+        Returns the texts of tweets [start, end) separated by newlines.
+        """
+        if start >= end:
+            return ""
+        return str(self.arena[self.offsets[start]:self.offsets[end] - 1], "utf-8")
+
+    def index_range(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Returns the [lo, hi) index range of the tweets created between `start_ts` and `end_ts` (both inclusive).
+        """
+        lo = 0 if start_ts is None else bisect_left(self.timestamps, start_ts)
+        hi = len(self) if end_ts is None else bisect_right(self.timestamps, end_ts)
+        return lo, max(lo, hi)
+
+    def between(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> "TweetStore":
+        """
+        Returns a zero-copy view of the tweets created between `start_ts` and `end_ts` (both inclusive).
+        The store itself is never modified, so it can be queried again with any other window.
+        """
+        return self.view(*self.index_range(start_ts, end_ts))
+
+    def view(self, lo: int, hi: int) -> "TweetStore":
+        return TweetStore(self.timestamps[lo:hi], self.ids[lo:hi], self.arena, self.offsets[lo:hi + 1], self.start + lo)
+
+    def period_bounds(self, period_seconds: int, epoch: Optional[int] = None) -> List[int]:
+        """
+        Splits the store into periods of `period_seconds`. With an `epoch`, periods are aligned to it, so a tweet
+        always falls in the same period whatever the other tweets of the store. Without one, every period starts
+        at the first tweet that did not fit the previous one. Empty periods are skipped.
+        ----------
+        Returns:
+            List[int]: The index of the first tweet of every period, followed by len(self)
+        """
+        bounds = []
+        i = 0
+        n = len(self)
+        while i < n:
+            bounds.append(i)
+            start = self.timestamps[i]
+            if epoch is not None:
+                start -= (start - epoch) % period_seconds
+            i = bisect_left(self.timestamps, start + period_seconds, i)
+        bounds.append(n)
+        return bounds
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the data covered by this store (or view), in bytes.
+        """
+        text_bytes = self.offsets[-1] - self.offsets[0] if len(self.offsets) else 0
+        return self.timestamps.nbytes + self.ids.nbytes + self.offsets.nbytes + text_bytes
+
+
+class TweetStoreBuilder:
+    """
+    Accumulates tweets in arrival order and sorts them once when the store is built.
+    """
+
+    def __init__(self):
+        self._timestamps = array("q")
+        self._ids = array("q")
+        self._arena = bytearray()
+        self._offsets = array("q")
+
+    def append(self, record: Dict):
+        text = record["text"].encode("utf-8")
+        self._timestamps.append(parse_created_at(record["created_at"]))
+        self._ids.append(int(record["id"]))
+        self._offsets.append(len(self._arena))
+        self._arena += text
+        self._arena += b"\n"
+
+    def extend(self, records: Iterable[Dict]):
+        for record in records:
+            self.append(record)
+
+    def __len__(self) -> int:
+        return len(self._timestamps)
+
+    def build(self) -> TweetStore:
+        n = len(self._timestamps)
+        timestamps, ids, starts, arena = self._timestamps, self._ids, self._offsets, self._arena
+        starts.append(len(arena))
+        if n == 0:
+            return TweetStore(timestamps, ids, b"", starts)
+        if all(timestamps[i] <= timestamps[i + 1] for i in range(n - 1)):
+            return TweetStore(timestamps, ids, arena, starts)
+
+        order = sorted(range(n), key=timestamps.__getitem__)
+        sorted_arena = bytearray()
+        offsets = array("q")
+        for i in order:
+            offsets.append(len(sorted_arena))
+            sorted_arena += arena[starts[i]:starts[i + 1]]
+        offsets.append(len(sorted_arena))
+        return TweetStore(
+            array("q", (timestamps[i] for i in order)),
+            array("q", (ids[i] for i in order)),
+            sorted_arena,
+            offsets,
+        )
@@ -0,0 +1,182 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from itertools import accumulate
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .metric import RatingProgress
+
+
+class TrajectoryRecorder(RatingProgress):
+    """
+    Keeps the rating and the lines of every chunk of every text, in text order, while forwarding all updates to `progress`.
+    """
+
+    def __init__(self, progress: Optional[RatingProgress] = None):
+        self.progress = progress or RatingProgress()
+        self.chunks: List[List[Optional[Tuple[int, int]]]] = []
+        self.lines: List[List[Tuple[int, int]]] = []
+
+    def chunk_lines(self, lines: List[List[Tuple[int, int]]]):
+        self.lines = lines
+        self.progress.chunk_lines(lines)
+
+    def start(self, chunk_counts: List[int]):
+        self.chunks = [[None] * count for count in chunk_counts]
+        self.progress.start(chunk_counts)
+
+    def chunk_done(self, text_index: int, rating: Tuple[int, int], chunk_index: Optional[int] = None):
+        # Chunks complete in any order, every rating goes to the slot of its chunk.
+        if chunk_index is None:
+            chunk_index = self.chunks[text_index].index(None)
+        self.chunks[text_index][chunk_index] = tuple(rating)
+        self.progress.chunk_done(text_index, rating, chunk_index)
+
+    def text_cached(self, text_index: int, rating: List[int]):
+        self.progress.text_cached(text_index, rating)
+
+    def estimate(self, mean: List[float], half_width: Optional[List[float]], rated: int):
+        self.progress.estimate(mean, half_width, rated)
+
+
+def _timestamp(ts: int) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).isoformat()
+
+
+def _chunk_spans(section: Dict, lines: List[Tuple[int, int]]) -> List[Tuple[int, int, int]]:
+    """
+    Returns the timestamps of the first and last tweets of every chunk of a section and its number of tweets,
+    from the first and last line of every chunk and the 'line_*' arrays of `period_sections`.
+    A line split across two chunks is counted in the first one only.
+    """
+    if "line_starts" not in section:
+        return [(section["start"], section["end"], 0) for _ in lines]
+    starts, ends, tweets = section["line_starts"], section["line_ends"], section["line_tweets"]
+    spans = []
+    previous = -1
+    for first, last in lines:
+        count = sum(tweets[first:last + 1]) - (tweets[first] if first == previous else 0)
+        spans.append((min(starts[first:last + 1]), max(ends[first:last + 1]), count))
+        previous = last
+    return spans
+
+
+def _rolling(values: Sequence[float], weights: Sequence[float], window: int) -> List[float]:
+    """
+    Trailing weighted mean of `values` over `window` items, from prefix sums so every item costs O(1).
+    """
+    weighted = [0.0, *accumulate(v * w for v, w in zip(values, weights))]
+    total = [0.0, *accumulate(weights)]
+    return [
+        (weighted[i + 1] - weighted[max(0, i + 1 - window)]) / (total[i + 1] - total[max(0, i + 1 - window)])
+        for i in range(len(values))
+    ]
+
+
+class Trajectory:
+    """
+    Per-period ratings of one word over an archive, kept after rating so that the drift of the account can be
+    queried again, over any date window, without calling the model.
+    Columns are flat arrays sorted by period. The chunks of period i, in time order, are
+    chunk_x[chunk_offsets[i]:chunk_offsets[i + 1]] (and chunk_y, chunk_starts, chunk_ends and chunk_tweets);
+    periods found in the rating cache have none.
+    """
+
+    def __init__(self, word: str, attributes: Dict, sections: List[Dict], ratings: List[List[int]],
+                 chunks: Optional[List[List[Tuple[int, int]]]] = None,
+                 chunk_lines: Optional[List[List[Tuple[int, int]]]] = None):
+        """
+        Stores the partial results of a rating run.
+        ----------
+        Args:
+            word (str): The word the periods were rated on
+            attributes (Dict): The axis attributes returned by `create_words`
+            sections (List[Dict]): The rated periods, as returned by `period_sections`
+            ratings (List[List[int]]): The rating of every period, in the same order
+            chunks (Optional[List[List[Tuple[int, int]]]]): The chunk ratings of every period, if recorded
+            chunk_lines (Optional[List[List[Tuple[int, int]]]]): The first and last line of the text of every chunk,
+                used with the 'line_*' arrays of the sections to find the time span and tweets of every chunk
+        """
+        self.word = word
+        self.attributes = attributes
+        self.starts = array("q", (section["start"] for section in sections))
+        self.ends = array("q", (section["end"] for section in sections))
+        self.tweets = array("q", (section["tweets"] for section in sections))
+        self.x = array("d", (rating[0] for rating in ratings))
+        self.y = array("d", (rating[1] for rating in ratings))
+        chunks = chunks or [[] for _ in sections]
+        self.chunk_offsets = array("q", [0, *accumulate(len(period) for period in chunks)])
+        self.chunk_x = array("d", (rating[0] for period in chunks for rating in period))
+        self.chunk_y = array("d", (rating[1] for period in chunks for rating in period))
+        chunk_lines = chunk_lines or [[(0, 0)] * len(period) for period in chunks]
+        spans = [span for section, lines in zip(sections, chunk_lines) for span in _chunk_spans(section, lines)]
+        self.chunk_starts = array("q", (span[0] for span in spans))
+        self.chunk_ends = array("q", (span[1] for span in spans))
+        self.chunk_tweets = array("q", (span[2] for span in spans))
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    @property
+    def nbytes(self) -> int:
+        columns = (self.starts, self.ends, self.tweets, self.x, self.y, self.chunk_offsets, self.chunk_x, self.chunk_y,
+                   self.chunk_starts, self.chunk_ends, self.chunk_tweets)
+        return sum(column.itemsize * len(column) for column in columns)
+
+    def index_range(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None) -> Tuple[int, int]:
+        """
+        Returns the [lo, hi) range of the periods whose tweets all fall between `start_ts` and `end_ts` (both inclusive).
+        """
+        lo = 0 if start_ts is None else bisect_left(self.starts, start_ts)
+        hi = len(self) if end_ts is None else bisect_right(self.ends, end_ts)
+        return lo, max(lo, hi)
+
+    def summary(self, start_ts: Optional[int] = None, end_ts: Optional[int] = None, window: int = 3,
+                weighted: bool = True, chunks: bool = False) -> Dict:
+        """
+        Returns the periods between `start_ts` and `end_ts` with the rolling and overall means of their ratings.
+        ----------
+        Args:
+            start_ts (Optional[int]): Only keep the periods starting at or after this timestamp
+            end_ts (Optional[int]): Only keep the periods ending at or before this timestamp
+            window (int): Number of periods of the trailing rolling mean
+            weighted (bool): Whether the rolling mean weighs every period by its number of tweets
+            chunks (bool): Whether to include the rating, time span and number of tweets of every chunk of every period
+        Returns:
+            Dict: The periods, the rolling mean after every period, and the mean and tweet-weighted mean of the window
+        """
+        lo, hi = self.index_range(start_ts, end_ts)
+        x, y, tweets = self.x[lo:hi], self.y[lo:hi], self.tweets[lo:hi]
+        weights = tweets if weighted else [1] * len(tweets)
+        periods = []
+        for i in range(lo, hi):
+            period = {
+                "start": _timestamp(self.starts[i]),
+                "end": _timestamp(self.ends[i]),
+                "tweets": self.tweets[i],
+                "coordinates": (self.x[i], self.y[i]),
+            }
+            if chunks:
+                begin, stop = self.chunk_offsets[i], self.chunk_offsets[i + 1]
+                period["chunks"] = [
+                    {
+                        "start": _timestamp(self.chunk_starts[j]),
+                        "end": _timestamp(self.chunk_ends[j]),
+                        "tweets": self.chunk_tweets[j],
+                        "coordinates": (self.chunk_x[j], self.chunk_y[j]),
+                    }
+                    for j in range(begin, stop)
+                ]
+            periods.append(period)
+        total = sum(tweets)
+        return {
+            "word": self.word,
+            "attributes": self.attributes,
+            "periods": periods,
+            "rolling": list(zip(_rolling(x, weights, window), _rolling(y, weights, window))),
+            "mean": (sum(x) / len(x), sum(y) / len(y)) if periods else None,
+            "weighted_mean": (
+                sum(v * w for v, w in zip(x, tweets)) / total,
+                sum(v * w for v, w in zip(y, tweets)) / total,
+            ) if periods else None,
+        }
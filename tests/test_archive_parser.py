@@ -0,0 +1,100 @@
+import io
+import json
+
+import pytest
+
+from src.data import ArchiveParser, extract_info, iter_archive, load_archive, parse_archive
+from src.store import format_created_at
+
+EXPORT_PREFIX = "window.YTD.tweet.part0 = "
+
+
+def _entries():
+    texts = [
+        "plain tweet",
+        "brackets ] [ and, commas } {",
+        'quotes " and escapes \\ \n newline',
+        "ünïcödé ✓ and emoji 🎉🎉",
+        "",
+    ]
+    entries = [
+        {"tweet": {"id": str(100 + i), "full_text": text, "created_at": format_created_at(1_500_000_000 + i * 60), "lang": "en"}}
+        for i, text in enumerate(texts)
+    ]
+    # Bare tweet objects are accepted too.
+    entries.append({"id": "200", "full_text": "bare", "created_at": format_created_at(1_600_000_000)})
+    return entries
+
+
+def _parse(data: bytes, block_size: int):
+    parser = ArchiveParser()
+    records = []
+    for i in range(0, len(data), block_size):
+        records.extend(parser.feed(data[i:i + block_size]))
+    records.extend(parser.close())
+    return records, parser
+
+
+@pytest.mark.parametrize("prefix", ["", EXPORT_PREFIX])
+@pytest.mark.parametrize("block_size", [1, 2, 3, 7, 64, 1 << 16])
+def test_any_block_size(prefix, block_size):
+    entries = _entries()
+    data = (prefix + json.dumps(entries, indent=2, ensure_ascii=False)).encode("utf-8")
+
+    records, parser = _parse(data, block_size)
+
+    assert records == extract_info(entries)
+    assert parser.count == len(entries)
+
+
+def test_records_are_returned_as_soon_as_complete():
+    entries = _entries()
+    first = json.dumps(entries[0])
+    parser = ArchiveParser()
+
+    # An element split across blocks is held back until its closing brace arrives.
+    assert parser.feed(f"[{first[:-1]}".encode("utf-8")) == []
+    assert parser.feed(first[-1:].encode("utf-8")) == extract_info(entries[:1])
+    assert parser.feed(b", ]") == []
+    assert parser.close() == []
+
+
+def test_empty_array():
+    assert _parse(b"[]", 1)[0] == []
+    assert _parse((EXPORT_PREFIX + "[ \n ]").encode("utf-8"), 3)[0] == []
+
+
+@pytest.mark.parametrize("data", [b"", b"[", EXPORT_PREFIX.encode("utf-8"), b'[{"tweet": {"id": "1"'])
+def test_unclosed_archive(data):
+    with pytest.raises(ValueError):
+        _parse(data, 4)
+
+
+def test_invalid_json():
+    with pytest.raises(json.JSONDecodeError):
+        _parse(b"[{not json}]", 4)
+
+
+def test_missing_fields():
+    with pytest.raises(KeyError):
+        _parse(b'[{"id": "1"}]', 4)
+
+
+def test_archive_files(tmp_path):
+    entries = _entries()
+    path = tmp_path / "tweets.js"
+    path.write_text(EXPORT_PREFIX + json.dumps(entries), encoding="utf-8")
+
+    assert list(iter_archive(str(path), block_size=5)) == extract_info(entries)
+    store = load_archive(str(path))
+    # The store is sorted by creation time, the entries already are.
+    assert [store.text(i) for i in range(len(store))] == [entry.get("tweet", entry)["full_text"] for entry in entries]
+
+
+def test_parse_archive_stream():
+    entries = list(reversed(_entries()))
+    store = parse_archive(io.BytesIO((EXPORT_PREFIX + json.dumps(entries)).encode("utf-8")))
+
+    # Built out of order, the store comes back sorted by creation time.
+    assert list(store.timestamps) == sorted(store.timestamps)
+    assert sorted(store.text(i) for i in range(len(store))) == sorted(entry.get("tweet", entry)["full_text"] for entry in entries)
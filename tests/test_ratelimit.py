@@ -0,0 +1,148 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from src import ratelimit
+from src.ratelimit import WINDOW_SECONDS, RateLimiter, parse_duration
+
+
+class FakeClock:
+    """
+    Stands in for the `time` and `asyncio` modules of the rate limiter, so waits advance a counter instead of sleeping.
+    """
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.slept.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds: float):
+        self.sleep(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    monkeypatch.setattr(ratelimit, "asyncio", SimpleNamespace(sleep=clock.async_sleep))
+    return clock
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("7.66s", 7.66),
+    ("2m59.56s", 179.56),
+    ("120ms", 0.12),
+    ("1h2m", 3720.0),
+    ("3", 3.0),
+    ("0.5", 0.5),
+    ("", None),
+    (None, None),
+    ("soon", None),
+])
+def test_parse_duration(value, seconds):
+    if seconds is None:
+        assert parse_duration(value) is None
+    else:
+        assert parse_duration(value) == pytest.approx(seconds)
+
+
+def test_requests_per_minute(clock):
+    limiter = RateLimiter(rpm=2, tpm=10**6)
+    start = clock.now
+
+    limiter.reserve(10)
+    clock.now += 1
+    limiter.reserve(10)
+    assert clock.slept == []
+    # The third request waits until the first one leaves the window.
+    limiter.reserve(10)
+    assert clock.now == start + WINDOW_SECONDS
+    assert limiter.throttled == 1
+    assert limiter.requests == 3
+
+
+def test_tokens_per_minute(clock):
+    limiter = RateLimiter(rpm=100, tpm=100)
+    start = clock.now
+
+    limiter.reserve(60)
+    clock.now += 10
+    limiter.reserve(30)
+    assert clock.slept == []
+    limiter.reserve(30)
+    assert clock.now == start + WINDOW_SECONDS
+    assert limiter.status()["tokens_last_minute"] == 60
+
+
+def test_settle_frees_unused_tokens(clock):
+    limiter = RateLimiter(rpm=100, tpm=100)
+
+    reservation = limiter.reserve(80)
+    limiter.settle(reservation, 20)
+    limiter.reserve(80)
+    assert clock.slept == []
+    assert limiter.status()["tokens_last_minute"] == 100
+    # Unknown usage keeps the estimate.
+    limiter.settle(reservation, None)
+    assert reservation[1] == 20
+
+
+def test_oversized_request_waits_for_an_empty_window(clock):
+    limiter = RateLimiter(rpm=100, tpm=100)
+    start = clock.now
+
+    limiter.reserve(500)
+    assert clock.slept == []
+    limiter.reserve(500)
+    assert clock.now == start + WINDOW_SECONDS
+
+
+def test_pause(clock):
+    limiter = RateLimiter(rpm=100, tpm=1000)
+    start = clock.now
+
+    limiter.pause(5)
+    limiter.reserve(10)
+    assert clock.now == start + 5
+    assert limiter.waited_seconds == 5
+
+
+def test_provider_headers(clock):
+    limiter = RateLimiter(rpm=100, tpm=1000)
+    start = clock.now
+
+    limiter.update({
+        "x-ratelimit-limit-tokens": "5000",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "2.5s",
+    })
+    assert limiter.tpm == 5000
+    limiter.reserve(10)
+    assert clock.now == start + 2.5
+
+    limiter.update({"x-ratelimit-remaining-tokens": "50", "x-ratelimit-reset-tokens": "1m"})
+    limiter.reserve(40)
+    assert clock.now == start + 2.5
+    # The local count of the remaining quota went down by 40, the next request does not fit before the reset.
+    limiter.reserve(40)
+    assert clock.now == start + 2.5 + 60
+
+
+def test_areserve_waits_without_blocking(clock):
+    limiter = RateLimiter(rpm=1, tpm=1000)
+    start = clock.now
+
+    async def run():
+        await limiter.areserve(10)
+        await limiter.areserve(10)
+
+    asyncio.run(run())
+    assert clock.now == start + WINDOW_SECONDS
+    assert limiter.status()["requests"] == 2
@@ -0,0 +1,43 @@
+import asyncio
+
+from src.metric import FALLBACK_RATING, Model
+
+ATTRIBUTES = {
+    "x_aspect": "x", "x_positive": "left", "x_negative": "right",
+    "y_aspect": "y", "y_positive": "up", "y_negative": "down",
+}
+
+
+def _model(monkeypatch, fail_every=None):
+    monkeypatch.setenv("RATING_CACHE", "0")
+    model = Model()
+    calls = []
+
+    async def rate_chunk(messages, semaphore, key, prefix):
+        calls.append(key)
+        if fail_every is not None and len(calls) % fail_every == 0:
+            return FALLBACK_RATING
+        return [2, -2]
+
+    model._arate_chunk = rate_chunk
+    return model
+
+
+def _texts():
+    return ["\n".join(f"period {p} tweet {i} " + "word " * 30 for i in range(40)) for p in range(3)]
+
+
+def test_sampled_complete(monkeypatch):
+    model = _model(monkeypatch)
+    result = asyncio.run(model.rate_texts_sampled(_texts(), "w", ATTRIBUTES, tolerance=0, seed=1))
+    assert result["stopped"] == "complete"
+    assert result["chunks_failed"] == 0
+    assert result["chunks_rated"] == result["chunks_total"]
+
+
+def test_sampled_partial_when_chunks_fail(monkeypatch):
+    model = _model(monkeypatch, fail_every=3)
+    result = asyncio.run(model.rate_texts_sampled(_texts(), "w", ATTRIBUTES, tolerance=0, seed=1))
+    assert result["stopped"] == "partial"
+    assert result["chunks_failed"] > 0
+    assert result["chunks_rated"] + result["chunks_failed"] == result["chunks_total"]
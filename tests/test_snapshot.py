@@ -0,0 +1,107 @@
+import struct
+
+import pytest
+
+from src.snapshot import SNAPSHOT_MAGIC, SnapshotStore, map_snapshot, write_snapshot
+from src.store import TweetStore, format_created_at
+
+BASE = 1_500_000_000
+
+
+def _records():
+    # Out of order, with multi-byte texts and an empty one, so sorting and byte offsets are both exercised.
+    texts = ["first", "ünïcödé ✓", "", "line\nbreak", "last one", "émoji 🎉", "plain"]
+    return [
+        {"id": str(1000 + i), "text": text, "created_at": format_created_at(BASE + ((i * 5) % 7) * 86400)}
+        for i, text in enumerate(texts)
+    ]
+
+
+def _columns(store: TweetStore):
+    return list(store.timestamps), list(store.ids), [store.text(i) for i in range(len(store))]
+
+
+def _write(store: TweetStore, path) -> TweetStore:
+    with open(path, "wb") as f:
+        write_snapshot(store, f)
+    return map_snapshot(str(path))
+
+
+def test_round_trip(tmp_path):
+    source = TweetStore.from_records(_records())
+    mapped = _write(source, tmp_path / "a.snap")
+
+    assert len(mapped) == len(source)
+    assert _columns(mapped) == _columns(source)
+    assert mapped.joined_text(0, len(mapped)) == source.joined_text(0, len(source))
+    assert mapped.nbytes == source.nbytes
+    for start, end in [(None, None), (BASE, BASE + 2 * 86400), (BASE + 86400, None), (None, BASE + 3 * 86400), (BASE + 10**9, None)]:
+        assert _columns(mapped.between(start, end)) == _columns(source.between(start, end))
+
+
+def test_round_trip_of_a_view(tmp_path):
+    # A view starts in the middle of the arena of its store, its offsets are rebased on write.
+    source = TweetStore.from_records(_records()).view(2, 5)
+    mapped = _write(source, tmp_path / "view.snap")
+
+    assert _columns(mapped) == _columns(source)
+    assert mapped.offsets[0] == 0
+
+
+def test_round_trip_of_an_empty_store(tmp_path):
+    mapped = _write(TweetStore.from_records([]), tmp_path / "empty.snap")
+
+    assert len(mapped) == 0
+    assert len(mapped.between(BASE, None)) == 0
+
+
+def _rewrite_header(path, count=None, arena_size=None, magic=SNAPSHOT_MAGIC):
+    data = bytearray(path.read_bytes())
+    header = struct.Struct("<8s8sqq")
+    _, byte_order, old_count, old_arena_size = header.unpack_from(data)
+    header.pack_into(data, 0, magic, byte_order, old_count if count is None else count,
+                     old_arena_size if arena_size is None else arena_size)
+    path.write_bytes(bytes(data))
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda path: path.write_bytes(path.read_bytes()[:-1]),
+    lambda path: path.write_bytes(path.read_bytes() + b"\x00"),
+    lambda path: path.write_bytes(path.read_bytes()[:16]),
+    lambda path: path.write_bytes(b""),
+    lambda path: _rewrite_header(path, magic=b"NOTASNAP"),
+    lambda path: _rewrite_header(path, count=-1),
+    lambda path: _rewrite_header(path, count=10**12),
+    lambda path: _rewrite_header(path, arena_size=-8),
+    # Moves 8 bytes from the arena to the columns, so the size still matches but the offsets do not.
+    lambda path: _rewrite_header(path, count=8, arena_size=struct.unpack_from("<q", path.read_bytes(), 24)[0] - 24),
+])
+def test_rejects_corrupt_snapshots(tmp_path, corrupt):
+    path = tmp_path / "bad.snap"
+    _write(TweetStore.from_records(_records()), path)
+    corrupt(path)
+
+    with pytest.raises(ValueError):
+        map_snapshot(str(path))
+
+
+def test_snapshot_store(tmp_path):
+    snapshots = SnapshotStore(str(tmp_path))
+    source = TweetStore.from_records(_records())
+    try:
+        assert snapshots.load("0" * 64) is None
+        saved = snapshots.save("a" * 64, source)
+        assert _columns(saved) == _columns(source)
+        assert _columns(snapshots.load("a" * 64)) == _columns(source)
+
+        with open(snapshots.path("b" * 64), "wb") as f:
+            f.write(b"garbage")
+        assert snapshots.load("b" * 64) is None
+
+        snapshots.bind("session", None, "a" * 64)
+        snapshots.bind("session", "alice", "a" * 64)
+        assert snapshots.bindings("session") == {"": "a" * 64, "alice": "a" * 64}
+        snapshots.unbind("session", "alice")
+        assert snapshots.bindings("session") == {"": "a" * 64}
+    finally:
+        snapshots.close()
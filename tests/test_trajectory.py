@@ -0,0 +1,71 @@
+from src.data import period_sections
+from src.metric import Model
+from src.preprocess import TextPreprocessor, TextRules
+from src.store import TweetStore, format_created_at
+from src.trajectory import Trajectory, TrajectoryRecorder
+
+BASE = 1_500_000_000
+
+
+def _store(texts):
+    return TweetStore.from_records(
+        {"id": str(1000 + i), "text": text, "created_at": format_created_at(BASE + i * 60)}
+        for i, text in enumerate(texts)
+    )
+
+
+def test_period_sections_lines():
+    tweets = _store(["one", "two\nlines", "three"])
+    section, = period_sections(tweets, 1, epoch=None, lines=True)
+    assert section["text"] == "one\ntwo\nlines\nthree"
+    assert list(section["line_starts"]) == [BASE, BASE + 60, BASE + 60, BASE + 120]
+    assert list(section["line_ends"]) == [BASE, BASE + 60, BASE + 60, BASE + 120]
+    # A tweet over several lines is counted on its first line only.
+    assert list(section["line_tweets"]) == [1, 1, 0, 1]
+    assert period_sections(tweets, 1, epoch=None)[0]["text"] == section["text"]
+
+
+def test_period_sections_lines_collapsed_duplicates():
+    tweets = _store(["same", "other", "same"])
+    rules = TextRules.off().model_copy(update={"dedupe": "exact"})
+    section, = period_sections(tweets, 1, epoch=None, preprocessor=TextPreprocessor(rules), lines=True)
+    assert section["text"] == "same (x2)\nother"
+    assert list(section["line_starts"]) == [BASE, BASE + 60]
+    assert list(section["line_ends"]) == [BASE + 120, BASE + 60]
+    assert list(section["line_tweets"]) == [2, 1]
+
+
+def test_chunk_lines_match_chunk_text(monkeypatch):
+    monkeypatch.setenv("RATING_CACHE", "0")
+    model = Model()
+    text = "\n".join(f"tweet number {i} " + "word " * (i % 7) for i in range(40)) + "\n" + "long " * 200
+    chunks = model.chunk_lines(text, 40)
+    assert [chunk for chunk, _, _ in chunks] == model.chunk_text(text, 40)
+    lines = text.split("\n")
+    for chunk, first, last in chunks:
+        assert chunk.split("\n")[0] in lines[first]
+        assert chunk.split("\n")[-1] in lines[last]
+    assert chunks[0][1] == 0 and chunks[-1][2] == len(lines) - 1
+
+
+def test_recorder_keeps_chunk_order():
+    recorder = TrajectoryRecorder()
+    recorder.chunk_lines([[(0, 1), (1, 2), (3, 3)]])
+    recorder.start([3])
+    # Chunks complete out of order.
+    recorder.chunk_done(0, (3, 3), 2)
+    recorder.chunk_done(0, (1, 1), 0)
+    recorder.chunk_done(0, (2, 2), 1)
+    assert recorder.chunks == [[(1, 1), (2, 2), (3, 3)]]
+
+
+def test_trajectory_chunk_spans():
+    tweets = _store(["a", "b", "c", "d"])
+    sections = period_sections(tweets, 1, epoch=None, lines=True)
+    # The second line is split across the first two chunks, so it is counted once.
+    trajectory = Trajectory("w", {}, sections, [[0, 0]], [[(1, 1), (2, 2), (3, 3)]], [[(0, 1), (1, 2), (3, 3)]])
+    chunks = trajectory.summary(chunks=True)["periods"][0]["chunks"]
+    assert [chunk["coordinates"] for chunk in chunks] == [(1, 1), (2, 2), (3, 3)]
+    assert [chunk["tweets"] for chunk in chunks] == [2, 1, 1]
+    assert list(trajectory.chunk_starts) == [BASE, BASE + 60, BASE + 180]
+    assert list(trajectory.chunk_ends) == [BASE + 60, BASE + 120, BASE + 180]
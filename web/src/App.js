@@ -4,6 +4,17 @@ import ProviderSelection from './components/ProviderSelection';
 import axios from 'axios';
 import XCompass from './components/XCompass.jsx';
 
+// Each browser tab gets its own server-side session, so tabs do not overwrite each other's archive.
+const getSessionId = () => {
+  let sessionId = sessionStorage.getItem('xcompass-session-id');
+  if (!sessionId) {
+    sessionId = window.crypto.randomUUID();
+    sessionStorage.setItem('xcompass-session-id', sessionId);
+  }
+  return sessionId;
+};
+axios.defaults.headers.common['X-Session-Id'] = getSessionId();
+
 function App() {
   const [apiKey, setApiKey] = useState('');
   const [provider, setProvider] = useState('');
@@ -50,6 +61,7 @@ function App() {
       // Reset the state on unmount
       fetch('http://localhost:8000/reset', {
         method: 'POST',
+        headers: { 'X-Session-Id': getSessionId() },
       }).then(response => response.json())
         .then(data => console.log(data.message))
         .catch(error => console.error('Error resetting state:', error));
@@ -1,7 +1,7 @@
 import React, { useRef } from 'react';
 import html2canvas from 'html2canvas';
 
-const CartesianPlot = ({ coords, attributes }) => {
+const CartesianPlot = ({ coords, attributes, points = [], path = [] }) => {
   const data = { x: coords.x, y: coords.y };
   const rangeValue = 5;
   const scaleCoordinate = (value, rangeValue) => ((value + rangeValue) / (2 * rangeValue)) * 100;
@@ -45,16 +45,41 @@ const CartesianPlot = ({ coords, attributes }) => {
             <text x="3" y="53" textAnchor="start" fontSize="3">{attributes.x_negative}</text>
             <text x="51" y="3" textAnchor="start" fontSize="3">{attributes.y_positive}</text>
             <text x="51" y="98" textAnchor="start" fontSize="3">{attributes.y_negative}</text>
+
+            {/* Trajectory of the account over time, from its first period to its last */}
+            {path.length > 1 && (
+              <polyline
+                points={path.map((p) => `${scaleCoordinate(p.x, rangeValue)},${100 - scaleCoordinate(p.y, rangeValue)}`).join(' ')}
+                fill="none" stroke="#1DA1F2" strokeWidth="0.4" strokeOpacity="0.7"
+              />
+            )}
+            {path.map((p, i) => (
+              <circle key={i} cx={scaleCoordinate(p.x, rangeValue)} cy={100 - scaleCoordinate(p.y, rangeValue)}
+                r={i === path.length - 1 ? 0.9 : 0.5} fill="#1DA1F2" fillOpacity={0.3 + (0.7 * (i + 1)) / path.length}>
+                <title>{p.label}</title>
+              </circle>
+            ))}
           </svg>
           
-          {/* Point */}
-          <div className="absolute" style={{
-            left: `${scaleCoordinate(data.x, rangeValue)}%`,
-            top: `${100 - scaleCoordinate(data.y, rangeValue)}%`,
-            transform: 'translate(-50%, -50%)'
-          }}>
-            <div className="w-2 h-2 bg-[#1DA1F2] rounded-full" />
-          </div>
+          {/* Point, or one labelled point per archive in comparison mode */}
+          {points.length === 0 ? (
+            <div className="absolute" style={{
+              left: `${scaleCoordinate(data.x, rangeValue)}%`,
+              top: `${100 - scaleCoordinate(data.y, rangeValue)}%`,
+              transform: 'translate(-50%, -50%)'
+            }}>
+              <div className="w-2 h-2 bg-[#1DA1F2] rounded-full" />
+            </div>
+          ) : points.map((point) => (
+            <div key={point.label} className="absolute flex flex-col items-center" style={{
+              left: `${scaleCoordinate(point.x, rangeValue)}%`,
+              top: `${100 - scaleCoordinate(point.y, rangeValue)}%`,
+              transform: 'translate(-50%, -50%)'
+            }}>
+              <div className="w-2 h-2 bg-[#1DA1F2] rounded-full" />
+              <span className="text-xs mt-1 whitespace-nowrap">{point.label}</span>
+            </div>
+          ))}
         </div>
       </div>
       <button
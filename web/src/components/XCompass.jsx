@@ -12,7 +12,13 @@ const XCompass = ({ provider }) => {
   const [uploadStatus, setUploadStatus] = useState(null);
   const [panelWidth, setPanelWidth] = useState(400);
   const [isLoading, setIsLoading] = useState(false);
+  const [progress, setProgress] = useState(null);
+  const [compareMode, setCompareMode] = useState(false);
+  const [points, setPoints] = useState([]);
+  const [showPath, setShowPath] = useState(false);
+  const [path, setPath] = useState([]);
   const resizeRef = useRef(null);
+  const jobRef = useRef(null);
 
   const [attributes, setAttributes] = useState({
     x_positive: '',
@@ -45,18 +51,21 @@ const handleMouseMove = useCallback((e) => {
   };
 
 
-  const onDrop = useCallback((acceptedFiles) => {
-    const selectedFile = acceptedFiles[0];
-    setUploadStatus({
-      name: selectedFile.name,
-      size: selectedFile.size,
-      progress: 0,
-      status: 'uploading'
-    });
-    
-    // Start upload process
-    handleUpload(selectedFile);
-  }, []);
+  const onDrop = useCallback(async (acceptedFiles) => {
+    // In comparison mode every file is uploaded as a separate archive, labelled with its name.
+    const selectedFiles = compareMode ? Array.from(acceptedFiles) : [acceptedFiles[0]];
+    for (const selectedFile of selectedFiles) {
+      setUploadStatus({
+        name: selectedFile.name,
+        size: selectedFile.size,
+        progress: 0,
+        status: 'uploading'
+      });
+
+      // Start upload process
+      await handleUpload(selectedFile, compareMode ? selectedFile.name.replace(/\.(json|js)$/, '') : null);
+    }
+  }, [compareMode]);
 
 
   const handleDragOver = (e) => {
@@ -68,13 +77,16 @@ const handleMouseMove = useCallback((e) => {
     onDrop(Array.from(e.dataTransfer.files));
   };
 
-  const handleUpload = async (fileToUpload) => {
+  const handleUpload = async (fileToUpload, label) => {
     if (!fileToUpload) {
       setFileMessage({text: 'Please select a file first.', type: 'error'});
       return;
     }
     const formData = new FormData();
     formData.append('file', fileToUpload);
+    if (label) {
+      formData.append('label', label);
+    }
     try {
       const response = await axios.post('http://localhost:8000/upload-tweets', formData, {
         headers: {
@@ -93,6 +105,35 @@ const handleMouseMove = useCallback((e) => {
     }
   };
 
+  const toPlotCoords = ([x, y]) => ({ x: (x + 1) / 2, y: 1 - (y + 1) / 2 }); // Invert Y-axis
+  const toPlotPoints = (points) => points.map(({ label, coordinates }) => ({ label, ...toPlotCoords(coordinates) }));
+
+  // The trajectory is computed from the ratings kept by the server, so fetching it costs no model call.
+  const fetchTrajectory = useCallback(async (word) => {
+    try {
+      const response = await axios.get('http://localhost:8000/trajectory', { params: { word } });
+      const { periods, rolling } = response.data;
+      setPath(rolling.map((coordinates, i) => ({ label: periods[i].start.slice(0, 10), ...toPlotCoords(coordinates) })));
+    } catch (error) {
+      console.error('Error fetching trajectory:', error);
+      setPath([]);
+    }
+  }, []);
+
+  const cancelJob = useCallback(async () => {
+    if (!jobRef.current) return;
+    const { id, source } = jobRef.current;
+    source.close();
+    jobRef.current = null;
+    setIsLoading(false);
+    setProgress(null);
+    try {
+      await axios.delete(`http://localhost:8000/jobs/${id}`);
+    } catch (error) {
+      console.error('Error cancelling job:', error);
+    }
+  }, []);
+
   const fetchCoordinates = useCallback(async () => {
     if (!word) {
       setWordMessage('Please enter a word');
@@ -101,19 +142,62 @@ const handleMouseMove = useCallback((e) => {
     setError(null);
     setFileMessage({ text: '', type: '' });
     setIsLoading(true);
+    setProgress(null);
 
     try {
-      const response = await axios.post('http://localhost:8000/get-coords', {
+      const response = await axios.post(compareMode ? 'http://localhost:8000/compare' : 'http://localhost:8000/jobs', {
         word,
         provider,
+        // Opt in to the recommended text rules: shortened links and mentions, collapsed whitespace, deduplicated tweets.
+        text_rules: {},
       });
 
-      const data = response.data;
-      const [x, y] = data.coordinates;
-      const normalizedX = (x + 1) / 2;
-      const normalizedY = 1 - (y + 1) / 2; // Invert Y-axis
-      setCoords({ x: normalizedX, y: normalizedY });
-      setAttributes(data.attributes);
+      const jobId = response.data.job_id;
+      // The browser reconnects on its own and resumes from the last event id.
+      // EventSource cannot send the session header, so the session goes in the query string.
+      const sessionId = encodeURIComponent(axios.defaults.headers.common['X-Session-Id']);
+      const source = new EventSource(`http://localhost:8000/jobs/${jobId}/events?session_id=${sessionId}`);
+      jobRef.current = { id: jobId, source };
+
+      const finish = () => {
+        source.close();
+        jobRef.current = null;
+        setIsLoading(false);
+        setProgress(null);
+      };
+
+      source.addEventListener('started', (e) => {
+        const data = JSON.parse(e.data);
+        setProgress({ done: 0, total: data.total });
+      });
+      source.addEventListener('progress', (e) => {
+        const data = JSON.parse(e.data);
+        setProgress({ done: data.done, total: data.total });
+        if (data.running_mean && !compareMode) {
+          setCoords(toPlotCoords(data.running_mean));
+        }
+      });
+      source.addEventListener('done', (e) => {
+        const data = JSON.parse(e.data);
+        if (data.points) {
+          setPoints(toPlotPoints(data.points));
+        } else {
+          setPoints([]);
+          setCoords(toPlotCoords(data.coordinates));
+          fetchTrajectory(word);
+        }
+        setAttributes(data.attributes);
+        finish();
+      });
+      source.addEventListener('error', (e) => {
+        // Server-side job errors carry data, connection errors do not and are retried by the browser.
+        if (e.data) {
+          console.error('Failed to fetch coordinates:', JSON.parse(e.data).error);
+          setError('Failed to fetch coordinates');
+          finish();
+        }
+      });
+      source.addEventListener('cancelled', finish);
     } catch (error) {
       if (error.response) {
         const errorData = error.response.data;
@@ -127,11 +211,9 @@ const handleMouseMove = useCallback((e) => {
         console.error('Error fetching coordinates:', error);
         setError('Failed to fetch coordinates');
       }
-    } finally {
       setIsLoading(false);
     }
-  }, [word, provider]);
-
+  }, [word, provider, compareMode, fetchTrajectory]);
 
   const handleReload = () => {
     window.location.reload();
@@ -141,7 +223,7 @@ const handleMouseMove = useCallback((e) => {
     <div className="flex h-screen overflow-hidden">
       {/* Left side - Cartesian Plot */}
       <div className="flex-grow bg-white p-4 relative flex items-center justify-center">
-        <CartesianPlot coords={coords} attributes={attributes}/>
+        <CartesianPlot coords={coords} attributes={attributes} points={points} path={showPath && !compareMode ? path : []}/>
       </div>
 
       {/* Resizer */}
@@ -169,7 +251,8 @@ const handleMouseMove = useCallback((e) => {
               <p className="text-sm text-black mb-4">or</p>
               <input
                 type="file"
-                accept=".json"
+                accept=".json,.js"
+                multiple={compareMode}
                 onChange={(e) => onDrop(e.target.files)}
                 className="hidden"
                 id="fileInput"
@@ -182,8 +265,26 @@ const handleMouseMove = useCallback((e) => {
             <p className="text-sm text-gray-500 mt-4">
             </p>
             <p className="text-sm text-gray-500">
-              Supported file type: JSON
+              Supported file types: JSON, tweets.js
             </p>
+            <label className="flex items-center text-sm text-gray-700 mt-2">
+              <input
+                type="checkbox"
+                checked={compareMode}
+                onChange={(e) => setCompareMode(e.target.checked)}
+                className="mr-2"
+              />
+              Compare several accounts (each file is plotted as its own point)
+            </label>
+            <label className="flex items-center text-sm text-gray-700 mt-2">
+              <input
+                type="checkbox"
+                checked={showPath}
+                onChange={(e) => setShowPath(e.target.checked)}
+                className="mr-2"
+              />
+              Show how the account moved over time
+            </label>
             
             {uploadStatus && (
               <div className="mt-6">
@@ -244,9 +345,24 @@ const handleMouseMove = useCallback((e) => {
             </button>
           </div>
               {isLoading && (
-                <div className="flex justify-center items-center mt-4">
-                  <Loader className="animate-spin text-blue-500" size={24} />
-                  <span className="ml-2 text-blue-500">Loading...</span>
+                <div className="mt-4">
+                  <div className="flex justify-center items-center">
+                    <Loader className="animate-spin text-blue-500" size={24} />
+                    <span className="ml-2 text-blue-500">
+                      {progress && progress.total ? `Rated ${progress.done} of ${progress.total} chunks` : 'Loading...'}
+                    </span>
+                    <button onClick={cancelJob} className="ml-4 text-sm text-gray-500 hover:text-red-500">
+                      Cancel
+                    </button>
+                  </div>
+                  {progress && progress.total > 0 && (
+                    <div className="bg-gray-100 rounded-full overflow-hidden mt-2">
+                      <div
+                        className="bg-[#1DA1F2] h-2"
+                        style={{ width: `${Math.round((progress.done * 100) / progress.total)}%` }}
+                      />
+                    </div>
+                  )}
                 </div>
               )}
             {error && <p className="text-red-500 mt-4">{error}</p>}